@@ -1,13 +1,38 @@
-from flask import Flask, render_template, request, send_from_directory, jsonify, url_for, send_file, abort
+from flask import Flask, render_template, request, jsonify, url_for, abort, has_request_context
 import mysql.connector
-from mysql.connector import pooling
-from vars import db_name, db_passwd, db_user, themes, search_conditions, IS_PRIVATE
+from mysql.connector import errorcode
+from vars import db_name, db_passwd, db_user, themes, search_conditions, IS_PRIVATE, MOVIES_BASE_DIRS
 import math
 import os
 import random
 import logging
 import time
 import hashlib
+import threading
+import json
+import base64
+import re
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode
+
+from db_pool import BlockingPool, PoolTimeout
+from facet_index import FacetIndex, MEDIA_FIELDS
+from search_index import SearchIndex
+from autocomplete_index import AutocompleteIndex
+from filter_query import FilterQuery
+from movie_details import load_movie_detail
+from theme_pools import ThemePoolIndex
+from media_index import MediaIndex
+from image_manifests import ManifestCache, Manifest
+from file_offload import FileOffload
+from subtitles import SubtitleCache
+from range_streaming import stream_file, video_mimetype
+from image_derivatives import DerivativeCache, FORMATS as IMAGE_FORMATS, width_bucket
+import movie_summary
+import library_scanner
+import migrations
+from response_cache import ResponseCache, conditional
 
 from flask_caching import Cache  # Import Cache
 
@@ -24,34 +49,31 @@ db_config = {
     'database': db_name
 }
 
-import os
-
-# Define the base directory relative to the script's location
-MOVIES_BASE_DIRS = [
-    r"E:\Movies\Katalog",
-    r"F:\Katalog",
-    r"e:\Format_FV\_Movies\_Movies_Fertig",
-]
-
 
 # Initialize the cache with SimpleCache
 app.config['CACHE_TYPE'] = 'SimpleCache'
 app.config['CACHE_DEFAULT_TIMEOUT'] = 300  # Cache timeout in seconds
 cache = Cache(app)
+response_cache = ResponseCache(cache)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-# Initialize MySQL Connection Pool
-try:
-    connection_pool = pooling.MySQLConnectionPool(pool_name="mypool",
-                                                  pool_size=10,
-                                                  **db_config)
-    logging.info("MySQL connection pool created successfully.")
-except mysql.connector.Error as err:
-    logging.error(f"Error creating connection pool: {err}")
-    connection_pool = None
+# Initialize MySQL Connection Pool. Size it per worker process: with several
+# workers, DB_POOL_SIZE * workers must stay below MySQL's max_connections.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_WAIT_TIMEOUT = 10  # Seconds a request waits for a free connection before giving up
+DB_POOL_PING_AFTER = 30  # Idle seconds after which a connection is pinged before reuse
+DB_POOL_MAX_LIFETIME = 3600  # Connections older than this are replaced on checkout
+DB_LEAK_THRESHOLD = 30  # Seconds a connection may be held before the holder is logged as a likely leak
+connection_pool = BlockingPool(DB_POOL_SIZE, wait_timeout=DB_POOL_WAIT_TIMEOUT, ping_after=DB_POOL_PING_AFTER,
+                               max_lifetime=DB_POOL_MAX_LIFETIME, leak_threshold=DB_LEAK_THRESHOLD, **db_config)
+logging.info(f"MySQL connection pool created (size {DB_POOL_SIZE}).")
+
+
+class DatabaseUnavailable(Exception):
+    """No connection could be checked out of the pool."""
 
 
 def connect_to_db():
@@ -59,14 +81,341 @@ def connect_to_db():
     if not connection_pool:
         logging.error("Connection pool is not initialized.")
         return None
+    # The leak warnings name the route (or background thread) that checked the connection out
+    owner = request.endpoint if has_request_context() else threading.current_thread().name
     try:
-        connection = connection_pool.get_connection()
+        connection = connection_pool.get_connection(owner=owner)
         logging.info("Successfully connected to the database via pool.")
         return connection
+    except PoolTimeout as err:
+        logging.error(f"Database pool exhausted: {err}")
+        return None
     except mysql.connector.Error as err:
         logging.error(f"Error getting connection from pool: {err}")
         return None
-    
+
+
+@contextmanager
+def db_session():
+    """
+    A pooled connection for the `with` block, returned to the pool however the
+    block is left. Raises DatabaseUnavailable if there is none.
+    """
+    connection = connect_to_db()
+    if not connection:
+        raise DatabaseUnavailable("Database connection failed")
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+@contextmanager
+def db_cursor():
+    """A dictionary cursor on a db_session(); cursor and connection are closed when the block ends."""
+    with db_session() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+def check_schema_version():
+    """Warn at startup if migrations.py has migrations the database doesn't have yet."""
+    try:
+        with db_session() as connection:
+            cursor = connection.cursor()
+            try:
+                pending = migrations.pending_migrations(cursor)
+            finally:
+                cursor.close()
+    except (DatabaseUnavailable, mysql.connector.Error) as err:
+        logging.error(f"Error checking the schema version: {err}")
+        return
+    if pending:
+        logging.warning(f"Pending schema migrations {[migration.version for migration in pending]}; "
+                        f"run `python migrations.py`")
+
+
+check_schema_version()
+
+
+JSON_ENDPOINTS = {'filter_movies', 'autocomplete'}
+
+
+@app.errorhandler(DatabaseUnavailable)
+def database_unavailable(error):
+    if request.endpoint in JSON_ENDPOINTS:
+        return jsonify({'error': str(error)}), 503
+    return str(error), 503
+
+
+# -------------------------------------------------------------------------
+# IN-MEMORY INDEXES (facet counts and search for /filter_movies, /autocomplete)
+# -------------------------------------------------------------------------
+
+INDEX_MAX_AGE = 900  # Rebuild the in-memory indexes in the background after this many seconds
+SHUFFLE_CACHE_TIMEOUT = 1800  # How long a seeded "Zufall" permutation is kept in the cache
+SERVER_SEED_INTERVAL = 3600  # Seedless "Zufall" requests share one seed for this many seconds
+facet_index = FacetIndex()
+search_index = SearchIndex()
+autocomplete_index = AutocompleteIndex()
+theme_pools = ThemePoolIndex(themes)
+memory_indexes = [facet_index, search_index, autocomplete_index, theme_pools]
+
+
+def _build_index_locked(index):
+    """Build an index whose build_lock the caller has already acquired."""
+    try:
+        with db_session() as connection:
+            index.build(connection)
+    except (DatabaseUnavailable, mysql.connector.Error) as err:
+        logging.error(f"Error building {index.name}: {err}")
+    finally:
+        index.build_lock.release()
+
+
+def build_index(index):
+    """Build (or rebuild) an in-memory index from the database, unless a build is already running."""
+    if index.build_lock.acquire(blocking=False):
+        _build_index_locked(index)
+
+
+def rebuild_indexes():
+    """
+    Rebuild all in-memory indexes now, waiting for a build that is already running
+    (it may have read the database before the change being applied).
+    """
+    for index in memory_indexes:
+        index.build_lock.acquire()
+        _build_index_locked(index)
+
+
+def refresh_index_if_stale(index):
+    """Kick off a background rebuild once the index is older than INDEX_MAX_AGE."""
+    age = index.age()
+    if age is not None and age > INDEX_MAX_AGE and index.build_lock.acquire(blocking=False):
+        threading.Thread(target=_build_index_locked, args=(index,), daemon=True).start()
+
+
+for _index in memory_indexes:
+    build_index(_index)
+
+
+# The movie folders on the base dirs are indexed the same way, but from the file system.
+# It starts from the library scanner's snapshot, so only folders changed since are listed.
+MEDIA_INDEX_CHECK_INTERVAL = 300  # Seconds between mtime checks of the movie folders
+LIBRARY_SYNC_ON_REFRESH = True  # Write the file facts of changed folders to `movies` (see library_scanner.py)
+media_index = MediaIndex(MOVIES_BASE_DIRS)
+media_index.load_snapshot(library_scanner.SNAPSHOT_FILE)
+
+IMAGE_MANIFEST_CACHE_SIZE = 4096  # (folder, image type) manifests kept in memory
+IMAGE_MANIFEST_NEGATIVE_TTL = 600  # Seconds a missing poster/backdrop dir is remembered (without media index)
+image_manifests = ManifestCache(IMAGE_MANIFEST_CACHE_SIZE)
+
+
+def apply_media_changes(changes):
+    """Evict the image manifests of changed folders and sync their movies' file facts."""
+    folder_names = changes.folder_names
+    evicted = image_manifests.discard(folder_names)
+    logging.info(f"Media folders: {changes}; evicted {evicted} image manifests")
+    if not LIBRARY_SYNC_ON_REFRESH:
+        return
+    try:
+        with db_session() as connection:
+            summary = library_scanner.sync(connection, media_index, folder_names)
+        logging.info(f"Library sync: {len(summary['new'])} new, {len(summary['missing'])} missing, "
+                     f"{len(summary['moved'])} moved, {len(summary['unreachable'])} unreachable, "
+                     f"{summary['updated']} movies updated")
+    except (DatabaseUnavailable, mysql.connector.Error) as err:
+        logging.error(f"Error syncing the library facts: {err}")
+
+
+def _build_media_index_locked():
+    try:
+        had_state = media_index.ready
+        changes = media_index.refresh()
+        # The very first scan (no snapshot) has nothing to compare against; that's a full library_scanner run
+        if had_state and changes:
+            apply_media_changes(changes)
+        if changes or not had_state:
+            os.makedirs(os.path.dirname(library_scanner.SNAPSHOT_FILE), exist_ok=True)
+            media_index.save_snapshot(library_scanner.SNAPSHOT_FILE)
+    except Exception as e:
+        logging.error(f"Error building {media_index.name}: {e}")
+    finally:
+        media_index.build_lock.release()
+
+
+def refresh_media_index_if_due():
+    """Build the media index in the background, and re-check the folder mtimes every MEDIA_INDEX_CHECK_INTERVAL seconds."""
+    age = media_index.age()
+    if (age is None or age > MEDIA_INDEX_CHECK_INTERVAL) and media_index.build_lock.acquire(blocking=False):
+        threading.Thread(target=_build_media_index_locked, daemon=True).start()
+
+
+@app.before_request
+def refresh_media_index():
+    refresh_media_index_if_due()
+
+
+refresh_media_index_if_due()
+
+
+# -------------------------------------------------------------------------
+# MOVIE SUMMARY READ TABLE (precomputed card fields for the list views)
+# -------------------------------------------------------------------------
+
+MOVIE_SUMMARY_REFRESH_INTERVAL = 60  # Seconds between applying queued summary changes
+
+# Card columns of the list views: plain movie columns plus the movie_summary fields
+MOVIE_CARD_COLUMNS = """
+    m.movie_id,
+    COALESCE(m.format_titel, m.title) AS main_title,
+    m.original_title,
+    m.release_date,
+    m.runtime,
+    m.imdb_id,
+    m.rating,
+    m.fsk,
+    m.folder_name,
+    m.poster_images,
+    m.overview,
+    m.standort,
+    m.format_inhalt,
+    ms.countries,
+    ms.genres,
+    ms.director,
+    ms.actors,
+    ms.formats
+"""
+MOVIE_CARD_FROM = "movies m LEFT JOIN movie_summary ms ON ms.movie_id = m.movie_id"
+
+_movie_summary_lock = threading.Lock()
+_movie_summary_refreshed_at = 0
+
+
+def _refresh_movie_summary_locked():
+    """Apply the queued movie_summary changes; the caller holds _movie_summary_lock."""
+    global _movie_summary_refreshed_at
+    try:
+        with db_session() as connection:
+            changed_ids = movie_summary.refresh_dirty(connection)
+            _movie_summary_refreshed_at = time.time()
+            if changed_ids:
+                # Tags first, they include the facet values the old index still has. Evicting only
+                # after the rebuild also drops responses rendered from the old indexes meanwhile.
+                tags = movie_cache_tags(connection, changed_ids)
+        if changed_ids:
+            rebuild_indexes()
+            evicted = response_cache.invalidate(tags)
+            logging.info(f"Evicted {evicted} cached responses for {len(changed_ids)} changed movies")
+    except (DatabaseUnavailable, mysql.connector.Error) as err:
+        logging.error(f"Error refreshing movie_summary: {err}")
+    finally:
+        _movie_summary_lock.release()
+
+
+def refresh_movie_summary_if_due():
+    """Apply queued movie_summary changes in the background every MOVIE_SUMMARY_REFRESH_INTERVAL seconds."""
+    if time.time() - _movie_summary_refreshed_at > MOVIE_SUMMARY_REFRESH_INTERVAL and _movie_summary_lock.acquire(blocking=False):
+        threading.Thread(target=_refresh_movie_summary_locked, daemon=True).start()
+
+
+@app.before_request
+def apply_movie_changes():
+    # Runs before the cache lookup, so cached responses of changed movies get evicted too
+    refresh_movie_summary_if_due()
+
+
+# -------------------------------------------------------------------------
+# RESPONSE CACHE TAGS
+# -------------------------------------------------------------------------
+
+RESPONSE_CACHE_TIMEOUT = 300
+FEATURED_CACHE_TIMEOUT = 300  # How long a theme's featured sample is kept
+
+
+def facet_cache_tags(years=(), genres=(), countries=(), standorte=(), media=()):
+    """
+    Cache tags for a filter combination. Responses without any facet filter
+    depend on every movie and get 'facet:all'.
+    """
+    tags = set()
+    for year in years:
+        year = str(year)
+        if "..." in year:
+            tags.add(f"decade:{year.split('...')[0]}")
+        else:
+            tags.add(f"year:{year}")
+    tags.update(f"genre:{genre}" for genre in genres)
+    tags.update(f"country:{country}" for country in countries)
+    tags.update(f"standort:{standort}" for standort in standorte)
+    tags.update(f"media:{field}" for field in media)
+    return tags or {'facet:all'}
+
+
+def movie_cache_tags(connection, movie_ids):
+    """
+    Tags of all cached responses a change of these movies can affect: their own
+    pages, unfiltered and search listings, and every facet value the movies had
+    before (facet index) or have now (database).
+    """
+    movie_ids = list(movie_ids)
+    tags = {'facet:all', 'search', 'autocomplete'}
+    tags.update(f"movie:{movie_id}" for movie_id in movie_ids)
+
+    values = {'years': set(), 'genres': set(), 'countries': set(), 'standorte': set(), 'media': set()}
+    if facet_index.ready:
+        for movie_id in movie_ids:
+            for facet, facet_values in facet_index.facet_values(movie_id).items():
+                values[facet] |= facet_values
+
+    placeholders = ','.join(['%s'] * len(movie_ids))
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(f"""
+            SELECT release_date, standort, {', '.join(MEDIA_FIELDS)}
+            FROM movies WHERE movie_id IN ({placeholders})
+        """, tuple(movie_ids))
+        for row in cursor.fetchall():
+            if row['release_date']:
+                values['years'].add(row['release_date'])
+            if row['standort']:
+                values['standorte'].add(row['standort'])
+            values['media'].update(field for field in MEDIA_FIELDS if (row[field] or 0) > 0)
+        cursor.execute(f"SELECT DISTINCT genre FROM genres WHERE movie_id IN ({placeholders})", tuple(movie_ids))
+        values['genres'].update(row['genre'] for row in cursor.fetchall())
+        cursor.execute(f"SELECT DISTINCT country FROM countries WHERE movie_id IN ({placeholders})", tuple(movie_ids))
+        values['countries'].update(row['country'] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+    # A year also invalidates the decade filters containing it
+    years = set()
+    for year in values.pop('years'):
+        decade_start = int(year) // 10 * 10
+        years.update([str(year), f"{decade_start}...{decade_start + 9}"])
+    return tags | facet_cache_tags(years=years, **values)
+
+
+@app.route('/pool_stats')
+def pool_stats():
+    """Gauges of the database connection pool: connections in use, waiting requests, wait times."""
+    return jsonify(connection_pool.stats())
+
+
+@app.route('/cache_stats')
+def cache_stats():
+    """Hit/miss counters of the response cache and the image manifest cache."""
+    stats = response_cache.stats()
+    stats['image_manifests'] = image_manifests.stats()
+    stats['image_derivatives'] = image_derivatives.stats()
+    stats['subtitles'] = subtitle_cache.stats()
+    return jsonify(stats)
+
+
 # -------------------------------------------------------------------------
 # HELPER FUNCTIONS FOR MULTIPLE DIRECTORIES
 # -------------------------------------------------------------------------
@@ -77,6 +426,8 @@ def find_movie_file_in_folder(folder_name: str, valid_extensions=('.mp4', '.mkv'
     append the folder_name, and search for a file that ends with one of the valid extensions.
     Return the absolute file path of the first match, or None if not found.
     """
+    if media_index.ready:
+        return media_index.movie_file(folder_name, valid_extensions)
     for base_dir in MOVIES_BASE_DIRS:
         candidate_folder = os.path.join(base_dir, folder_name)
         # Log the candidate folder for debugging
@@ -95,6 +446,8 @@ def find_file_in_base_dirs(rel_path: str) -> str:
     search each directory in MOVIES_BASE_DIRS and return the absolute file path
     if it exists. Otherwise return None.
     """
+    if media_index.ready:
+        return media_index.find_file(rel_path)
     for base_dir in MOVIES_BASE_DIRS:
         candidate = os.path.join(base_dir, rel_path)
         if os.path.isfile(candidate):
@@ -105,24 +458,139 @@ def find_folder_in_base_dirs(rel_path: str) -> str:
     Similar to find_file_in_base_dirs, but checks for a directory.
     Return the first matching directory path or None if not found.
     """
+    if media_index.ready:
+        return media_index.find_folder(rel_path)
     for base_dir in MOVIES_BASE_DIRS:
         candidate = os.path.join(base_dir, rel_path)
         if os.path.isdir(candidate):
             return candidate
     return None
 
+# -------------------------------------------------------------------------
+# IMAGES (originals and resized derivatives)
+# -------------------------------------------------------------------------
+
+IMAGE_DERIVATIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'images')
+IMAGE_DERIVATIVE_WORKERS = 2
+IMAGE_DERIVATIVE_MAX_PENDING = 64  # Renderings queued at once; beyond that requests get the original
+IMAGE_DERIVATIVE_WAIT = 10  # Seconds a request waits for its derivative before falling back to the original
+IMAGE_IMMUTABLE_MAX_AGE = 31536000  # Versioned image URLs (?v=...) never change
+IMAGE_MAX_AGE = 3600  # Unversioned image URLs may get a new file behind them
+POSTER_CARD_WIDTH = 320  # Catalog cards and featured carousels
+BACKDROP_CARD_WIDTH = 780  # Backdrops of the list view
+IMAGE_PREGENERATE_ON_STARTUP = True
+image_derivatives = DerivativeCache(IMAGE_DERIVATIVE_DIR, IMAGE_DERIVATIVE_WORKERS, IMAGE_DERIVATIVE_MAX_PENDING)
+
+SUBTITLE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'subtitles')
+subtitle_cache = SubtitleCache(SUBTITLE_CACHE_DIR)  # .srt files converted to WebVTT
+
+# None: files are sent by Python. 'x-accel' (nginx, see doc/nginx_offload.conf) or 'x-sendfile'
+# (Apache/lighttpd): the front proxy sends them. The x-accel locations mirror MOVIES_BASE_DIRS.
+FILE_OFFLOAD_MODE = os.environ.get('FILE_OFFLOAD_MODE') or None
+file_offload = FileOffload(
+    FILE_OFFLOAD_MODE,
+    [(base_dir, f"/_protected/{i}") for i, base_dir in enumerate(MOVIES_BASE_DIRS)]
+    + [(IMAGE_DERIVATIVE_DIR, "/_protected/derivatives"), (SUBTITLE_CACHE_DIR, "/_protected/subtitles")],
+)
+
+
+def image_version(rel_path):
+    """Version of a movie image from the media index (no disk access), or None before its first scan."""
+    return media_index.image_version(rel_path) if media_index.ready else None
+
+
+@app.template_global()
+def image_url(rel_path, width=None):
+    """
+    URL of a movie image, e.g. image_url(folder + '/poster/poster_1.avif', 320).
+    It carries the source version, so the response may be cached forever.
+    """
+    params = {}
+    if width:
+        params['w'] = width_bucket(width)
+    version = image_version(rel_path)
+    if version:
+        params['v'] = version
+    return url_for('movie_images', filename=rel_path, **params)
+
+
+@app.template_filter()
+def image_width(url, width):
+    """Ask for a resized derivative of an image URL: {{ url | image_width(480) }}."""
+    return f"{url}{'&' if '?' in url else '?'}w={width_bucket(width)}"
+
+
+def add_card_image_urls(movies):
+    """Set the versioned poster_url/backdrop_url of catalog cards (None without a folder)."""
+    for movie in movies:
+        folder_name = movie.get('folder_name')
+        movie['poster_url'] = image_url(f"{folder_name}/poster/poster_1.avif", POSTER_CARD_WIDTH) if folder_name else None
+        movie['backdrop_url'] = image_url(f"{folder_name}/backdrop/backdrop_1.avif", BACKDROP_CARD_WIDTH) if folder_name else None
+
+
+def resolve_movie_file(path: str) -> str:
+    """
+    Absolute path of a movie file given by its absolute path, or None unless it
+    is an existing file inside one of the MOVIES_BASE_DIRS.
+    """
+    path = os.path.abspath(path)
+    if media_index.ready:
+        folder = media_index.folder_for_path(os.path.dirname(path))
+        return path if folder and os.path.basename(path) in folder.files else None
+    for base_dir in MOVIES_BASE_DIRS:
+        base_dir = os.path.abspath(base_dir)
+        if os.path.normcase(path).startswith(os.path.normcase(base_dir) + os.sep) and os.path.isfile(path):
+            return path
+    return None
+
+
 @app.route('/movie_images/<path:filename>')
 def movie_images(filename):
     """
     Serve movie images from whichever base directory they exist in.
     The `filename` is a relative path: e.g. "SomeFolder/poster/poster_1.jpg".
+    With `?w=<width>` a resized derivative is served, in the best format the
+    client accepts (AVIF, WebP, JPEG).
     """
     abs_path = find_file_in_base_dirs(filename)
     if not abs_path:
         abort(404, description="Image file not found in any base directory.")
-    
-    # We can send the file directly:
-    return send_file(abs_path)
+
+    version = image_version(filename)
+    immutable = bool(version) and request.args.get('v') == version
+    max_age = IMAGE_IMMUTABLE_MAX_AGE if immutable else IMAGE_MAX_AGE
+    width = request.args.get('w', type=int)
+    if width and image_derivatives.available:
+        fmt = image_derivatives.negotiate(request.accept_mimetypes)
+        derivative = image_derivatives.get(abs_path, width_bucket(width), fmt, IMAGE_DERIVATIVE_WAIT, version)
+        if derivative:
+            response = file_offload.send(derivative, IMAGE_FORMATS[fmt][1], max_age, immutable)
+            response.vary.add('Accept')
+            return response
+        # Served in place of a derivative, so it must not be cached as one
+        return file_offload.send(abs_path, max_age=IMAGE_MAX_AGE)
+
+    return file_offload.send(abs_path, max_age=max_age, immutable=immutable)
+
+
+def pregenerate_image_derivatives():
+    """Render the card-sized first poster and backdrop of every movie folder in the background."""
+    with media_index.build_lock:  # Held by the initial scan; wait for it to finish
+        pass
+    if not (media_index.ready and image_derivatives.available):
+        return
+    start_time = time.time()
+    for image_type, width in (('poster', POSTER_CARD_WIDTH), ('backdrop', BACKDROP_CARD_WIDTH)):
+        rel_paths = [f"{folder_name}/{image_type}/{image_type}_1.avif" for folder_name in media_index.folder_names()]
+        sources = [(media_index.find_file(rel_path), media_index.image_version(rel_path)) for rel_path in rel_paths]
+        sources = [(path, version) for path, version in sources if path and version]
+        rendered, failed = image_derivatives.pregenerate(sources, [width])
+        logging.info(f"Pregenerated {rendered - failed} {image_type} derivatives ({failed} failed)")
+    logging.info(f"Image derivatives pregenerated in {time.time() - start_time:.2f} seconds")
+
+
+if IMAGE_PREGENERATE_ON_STARTUP:
+    threading.Thread(target=pregenerate_image_derivatives, daemon=True).start()
 
 
 @app.route('/')
@@ -132,141 +600,62 @@ def index():
     return render_template('index.html')
 
 
-@cache.cached(timeout=300)  # Cache this route
 @app.route('/movie/<int:movie_id>')
+@response_cache.cached(timeout=RESPONSE_CACHE_TIMEOUT)
 def get_movie_details(movie_id):
+    response_cache.tag(f"movie:{movie_id}")
     try:
-        connection = connect_to_db()
-        cursor = connection.cursor(dictionary=True)
-        
-        # Fetch movie details
-        movie_query = """
-        SELECT 
-            m.*,
-            GROUP_CONCAT(DISTINCT g.genre SEPARATOR ', ') AS genres,
-            GROUP_CONCAT(DISTINCT c.country SEPARATOR ', ') AS countries,
-            GROUP_CONCAT(DISTINCT p.company_name SEPARATOR ', ') AS production_companies
-        FROM movies m
-        LEFT JOIN genres g ON m.movie_id = g.movie_id
-        LEFT JOIN countries c ON m.movie_id = c.movie_id
-        LEFT JOIN production_companies p ON m.movie_id = p.movie_id
-        WHERE m.movie_id = %s
-        GROUP BY m.movie_id;"""
-
-        cursor.execute(movie_query, (movie_id,))
-        movie = cursor.fetchone()
-        
-        if movie:
-            # Split genres and countries into lists
-            movie['genres'] = movie['genres'].split(', ') if movie['genres'] else []
-            movie['countries'] = movie['countries'].split(', ') if movie['countries'] else []
-            movie['production_companies'] = movie['production_companies'].split(', ') if movie['production_companies'] else []
-
-            # Fetch directors with tmdb_id
-            director_query = """
-            SELECT name, tmdb_id
-            FROM crew
-            WHERE movie_id = %s AND job = 'Director'
-            """
-            cursor.execute(director_query, (movie_id,))
-            directors = cursor.fetchall()
-            movie['directors'] = [{'name': d['name'], 'tmdb_id': d['tmdb_id']} for d in directors]
-            
-            # Fetch actors with tmdb_id
-            actor_query = """
-            SELECT name, tmdb_id
-            FROM movie_cast
-            WHERE movie_id = %s
-            ORDER BY popularity DESC
-            LIMIT 10
-            """
-            cursor.execute(actor_query, (movie_id,))
-            actors = cursor.fetchall()
-            movie['actors'] = [{'name': a['name'], 'tmdb_id': a['tmdb_id']} for a in actors]
-            
-            # Fetch awards
-            award_query = """
-            SELECT award
-            FROM awards
-            WHERE movie_id = %s
-            """
-            cursor.execute(award_query, (movie_id,))
-            awards = cursor.fetchall()
-            movie['awards'] = [a['award'] for a in awards]
-            
-            # Fetch spoken languages
-            lang_query = """
-            SELECT language
-            FROM spoken_languages
-            WHERE movie_id = %s
-            """
-            cursor.execute(lang_query, (movie_id,))
-            languages = cursor.fetchall()
-            movie['spoken_languages'] = [l['language'] for l in languages]
-            
-            # Fetch video links
-            video_query = """
-            SELECT video_link
-            FROM video_links
-            WHERE movie_id = %s LIMIT 1
-            """
-            cursor.execute(video_query, (movie_id,))
-            video_link = cursor.fetchone()
-            movie['video_link'] = video_link['video_link'] if video_link else None
-
-            # Add formats
-            formats = []
-
-            # Safely get values and handle None
-            format_vhs = movie.get('format_vhs') or 0
-            format_dvd = movie.get('format_dvd') or 0
-            format_blu = movie.get('format_blu') or 0
-            format_blu3 = movie.get('format_blu3') or 0
-
-            # Ensure values are integers
-            format_vhs = int(format_vhs)
-            format_dvd = int(format_dvd)
-            format_blu = int(format_blu)
-            format_blu3 = int(format_blu3)
-
-            if format_vhs > 0:
-                formats.append(f"VHS ({format_vhs})")
-            if format_dvd > 0:
-                formats.append(f"DVD ({format_dvd})")
-            if format_blu > 0:
-                formats.append(f"Blu-ray ({format_blu})")
-            if format_blu3 > 0:
-                formats.append(f"Blu-ray 3D ({format_blu3})")
-            movie['formats'] = ', '.join(formats)
-            # Fetch posters and backdrops
-            movie['posters'] = get_poster_images(movie['folder_name'])
-            movie['backdrops'] = get_backdrop_images(movie['folder_name'])
-            # movie_folder_path = os.path.join(MOVIES_BASE_DIR, movie['folder_name'], movie['moviefilename'])
-            cursor.close()
-            connection.close()
-            movie_file_path = validate_movie_file(movie)  # Returns the full file path or None
-            movie['movie_file_path'] = movie_file_path
-            if movie_file_path:
-                # Include the validated file path as a query parameter
-                movie['movie_file_url'] = url_for('serve_movie_file', file_path=movie_file_path)
-                
-            else:
-                movie['movie_file_url'] = None
+        # Movie row plus all child collections in one round trip
+        with db_session() as connection:
+            movie = load_movie_detail(connection, movie_id)
+    except mysql.connector.Error as e:
+        logging.error(f"An error occurred while fetching movie details: {e}")
+        abort(500)
+
+    if not movie:
+        abort(404)
+
+    # Add formats
+    formats = []
+
+    # Safely get values and handle None
+    format_vhs = movie.get('format_vhs') or 0
+    format_dvd = movie.get('format_dvd') or 0
+    format_blu = movie.get('format_blu') or 0
+    format_blu3 = movie.get('format_blu3') or 0
+
+    # Ensure values are integers
+    format_vhs = int(format_vhs)
+    format_dvd = int(format_dvd)
+    format_blu = int(format_blu)
+    format_blu3 = int(format_blu3)
+
+    if format_vhs > 0:
+        formats.append(f"VHS ({format_vhs})")
+    if format_dvd > 0:
+        formats.append(f"DVD ({format_dvd})")
+    if format_blu > 0:
+        formats.append(f"Blu-ray ({format_blu})")
+    if format_blu3 > 0:
+        formats.append(f"Blu-ray 3D ({format_blu3})")
+    movie['formats'] = ', '.join(formats)
+    # Fetch posters and backdrops (not at all if the library scan found none)
+    scanned = movie.get('movie_exist') is not None
+    movie['posters'] = get_poster_images(movie['folder_name']) if not scanned or movie['poster_images'] else []
+    movie['backdrops'] = get_backdrop_images(movie['folder_name']) if not scanned or movie['backdrop_images'] else []
+    # movie_folder_path = os.path.join(MOVIES_BASE_DIR, movie['folder_name'], movie['moviefilename'])
+    movie_file_path = validate_movie_file(movie)  # Returns the full file path or None
+    movie['movie_file_path'] = movie_file_path
+    if movie_file_path:
+        # Include the validated file path as a query parameter
+        movie['movie_file_url'] = url_for('serve_movie_file', file_path=movie_file_path)
+    else:
+        movie['movie_file_url'] = None
 
-            print(f"movie_file_url: {movie['movie_file_url']}")
-            print(movie)
+    logging.debug(f"movie_file_url: {movie['movie_file_url']}")
 
+    return render_template('movie_details.html', movie=movie)
 
-            return render_template('movie_details.html', movie=movie)
-        else:
-            cursor.close()
-            connection.close()
-            return None
-    except Exception as e:
-        logging.error(f"An error occurred while fetching movie details: {e}")
-        cursor.close()
-        connection.close()
-        return None
 
 def get_movie_awards(cursor, movie_id):
     query = """
@@ -342,16 +731,18 @@ def get_spoken_languages(cursor, movie_id):
     return [lang['language'] for lang in languages] if languages else []
 
 @app.route('/get_backdrop_images/<path:movie_folder>')
+@conditional
 def get_backdrop_images_route(movie_folder):
     """API endpoint to retrieve backdrop images."""
     backdrops = get_backdrop_images(movie_folder)
-    return jsonify({"images": [os.path.basename(url) for url in backdrops]})
+    return jsonify({"images": [os.path.basename(url.split('?')[0]) for url in backdrops], "urls": backdrops})
 
 @app.route('/get_poster_images/<path:movie_folder>')
+@conditional
 def get_poster_images_route(movie_folder):
     """API endpoint to retrieve poster images."""
     posters = get_poster_images(movie_folder)
-    return jsonify({"images": [os.path.basename(url) for url in posters]})
+    return jsonify({"images": [os.path.basename(url.split('?')[0]) for url in posters], "urls": posters})
 
 def get_poster_images(movie_folder):
     """Retrieve poster image URLs for a specific movie folder."""
@@ -362,32 +753,75 @@ def get_backdrop_images(movie_folder):
     # If you want to only include '.avif' files for backdrops, specify the extensions parameter
     return get_images(movie_folder, 'backdrop', extensions=('.avif',))
 
+def _image_dir_version(movie_folder, image_type):
+    """Version of an image dir as recorded by the media index: (folder path, dir mtime)."""
+    folder = media_index.folder(movie_folder)
+    if folder is None:
+        return None
+    return folder.path, folder.mtimes[1].get(image_type)
+
+
+def _dir_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
 def get_images(movie_folder, image_type, extensions=('.avif', '.jpg', '.jpeg', '.png', '.webp')):
     """
     Retrieve image URLs for a specific movie folder & subdir type
     ('poster' or 'backdrop'). We look for the subdirectory across all base dirs.
+    The URL lists are cached per folder and reused while the directory is unchanged;
+    with the media index they carry the image version (?v=...).
     """
+    key = (movie_folder, image_type, extensions)
+    manifest = image_manifests.get(key)
+
+    # 0) Reuse the cached manifest if its directory hasn't changed
+    if media_index.ready:
+        version = _image_dir_version(movie_folder, image_type)
+        if manifest is not None and manifest.version == version:
+            image_manifests.record(hit=True)
+            return list(manifest.urls)
+    elif manifest is not None:
+        if manifest.subdir is None and time.time() < manifest.expires:
+            image_manifests.record(hit=True)
+            return []
+        if manifest.subdir is not None and _dir_mtime(manifest.subdir) == manifest.version:
+            image_manifests.record(hit=True)
+            return list(manifest.urls)
+    image_manifests.record(hit=False)
+
     images = []
-    # 1) Find a matching subfolder in any of the base directories
-    subdir = find_folder_in_base_dirs(os.path.join(movie_folder, image_type))
-    if not subdir:
+    # 1) Find a matching subfolder in any of the base directories (the media index already has its listing)
+    if media_index.ready:
+        filenames = media_index.images(movie_folder, image_type)
+        subdir = None
+    else:
+        subdir = find_folder_in_base_dirs(os.path.join(movie_folder, image_type))
+        version = _dir_mtime(subdir) if subdir else None
+        filenames = sorted(os.listdir(subdir)) if subdir else None
+    if filenames is None:
+        # Remembered as a negative entry, so this is logged once and not on every request
         logging.warning(f"No {image_type} directory found for folder: {movie_folder}")
+        image_manifests.put(key, Manifest(version, None, (), time.time() + IMAGE_MANIFEST_NEGATIVE_TTL))
         return images
 
     # 2) List all files in that subdir matching the given extensions
-    for filename in sorted(os.listdir(subdir)):
+    for filename in filenames:
         if filename.lower().endswith(extensions):
             # The relative path needed by the `movie_images` route:
             rel_path = os.path.join(movie_folder, image_type, filename).replace("\\","/")
-            # Use `url_for('movie_images', filename=rel_path)`
-            image_url = url_for('movie_images', filename=rel_path)
-            images.append(image_url)
+            # Versioned `movie_images` URL, valid as long as this manifest is
+            images.append(image_url(rel_path))
 
+    image_manifests.put(key, Manifest(version, subdir, tuple(images), None))
     return images
 
 
-@cache.cached(timeout=300, query_string=True)  # Cache this route with query string parameters
 @app.route('/catalog')
+@response_cache.cached(timeout=RESPONSE_CACHE_TIMEOUT)
 def catalog():
     """Render the catalog page with movies and featured movies based on filters."""
     search_query = request.args.get('search', '')
@@ -398,54 +832,21 @@ def catalog():
     offset = (page - 1) * per_page
 
     logging.info("Rendering catalog page")
+    response_cache.tag(*facet_cache_tags(years=[year_filter] if year_filter else [],
+                                         genres=[genre_filter] if genre_filter else []))
+    if search_query:
+        response_cache.tag('search')
     logging.info(f"Search Query: {search_query}, Genre Filter: {genre_filter}, Year Filter: {year_filter}, Page: {page}")
 
-    # Establish database connection
-    connection = connect_to_db()
-    if not connection:
-        return "Database connection failed", 500
-
-    cursor = connection.cursor(dictionary=True)
-
     # Construct the base query to retrieve movies with the applied filters
-    base_query = """
-        SELECT 
-            m.movie_id, 
-            COALESCE(m.format_titel, m.title) AS main_title,  
-            m.original_title, 
-            m.release_date, 
-            m.runtime, 
-            m.imdb_id, 
-            m.rating, 
-            m.fsk, 
-            m.folder_name, 
-            m.overview, 
-            m.standort,  
-            m.format_inhalt,  
-            GROUP_CONCAT(DISTINCT CONCAT(c.country, ' (', c.country_code, ')') SEPARATOR ', ') AS countries,
-            GROUP_CONCAT(DISTINCT g.genre SEPARATOR ', ') AS genres,
-            (SELECT name FROM crew WHERE crew.movie_id = m.movie_id AND job = 'Director' LIMIT 1) AS director,
-            (SELECT GROUP_CONCAT(DISTINCT movie_cast.name ORDER BY movie_cast.popularity DESC SEPARATOR ', ') 
-                FROM movie_cast WHERE movie_cast.movie_id = m.movie_id LIMIT 3) AS actors,
-            TRIM(BOTH ', ' FROM CONCAT_WS(', ',
-                CASE WHEN m.format_vhs > 0 THEN CONCAT('VHS (', m.format_vhs, ')') ELSE NULL END, 
-                CASE WHEN m.format_dvd > 0 THEN CONCAT('DVD (', m.format_dvd, ')') ELSE NULL END, 
-                CASE WHEN m.format_blu > 0 THEN CONCAT('Blu-ray (', m.format_blu, ')') ELSE NULL END, 
-                CASE WHEN m.format_blu3 > 0 THEN CONCAT('Blu-ray 3D (', m.format_blu3, ')') ELSE NULL END
-            )) AS formats
-        FROM 
-            movies m
-            LEFT JOIN genres g ON m.movie_id = g.movie_id
-            LEFT JOIN countries c ON m.movie_id = c.movie_id
+    base_query = f"""
+        SELECT {MOVIE_CARD_COLUMNS}
+        FROM {MOVIE_CARD_FROM}
     """
 
     # Construct the count query to get the total count of movies
-    count_query = """
-        SELECT COUNT(DISTINCT m.movie_id) as total 
-        FROM movies m 
-        LEFT JOIN genres g ON m.movie_id = g.movie_id
-        LEFT JOIN countries c ON m.movie_id = c.movie_id
-    """
+    # The filters are semi-joins on movies, so the count needs no joins
+    count_query = "SELECT COUNT(*) AS total FROM movies m"
 
     params = []
 
@@ -476,105 +877,56 @@ def catalog():
         base_query += " WHERE 1=1"
         count_query += " WHERE 1=1"
 
-    # Finalize the base query with pagination and grouping
-    base_query += " GROUP BY m.movie_id ORDER BY m.release_date DESC LIMIT %s OFFSET %s"
+    # Finalize the base query with pagination
+    base_query += " ORDER BY m.release_date DESC LIMIT %s OFFSET %s"
     pag_params = params + [per_page, offset]
 
     try:
         start_time = time.time()
 
-        # Execute the base query to get the filtered movie data
-        logging.info("Executing base query for movies")
-        cursor.execute(base_query, pag_params)
-        movies = cursor.fetchall()
-
-        # Convert 'countries' and 'genres' from strings to lists
-        for movie in movies:
-            movie['countries'] = movie['countries'].split(', ') if movie['countries'] else []
-            movie['genres'] = movie['genres'].split(', ') if movie['genres'] else []
-            movie['actors'] = movie['actors'].split(', ') if movie['actors'] else []
-            movie['director'] = movie['director'].split(', ') if movie['director'] else []
-
-        # Execute the count query to get the total count of filtered movies
-        logging.info("Executing count query for total movies")
-        cursor.execute(count_query, tuple(params))
-        total_movies = cursor.fetchone()['total']
-        total_pages = math.ceil(total_movies / per_page)
-
-        # Define pagination range for the current page
-        pagination_range = list(range(max(1, page - 2), min(total_pages + 1, page + 3)))
-
-        # Determine the selected theme
-        selected_theme = None
-
-        if genre_filter:
-            matched_themes = [theme for theme in themes if theme['name'].lower().startswith(genre_filter.lower()) or genre_filter.lower() in theme['name'].lower()]
-            if matched_themes:
-                selected_theme = matched_themes[0]
-            else:
-                selected_theme = random.choice([theme for theme in themes if "genre" in theme['sql_condition'].lower()])
-        else:
-            selected_theme = random.choice(themes)
-
-        # Fetch featured movies based on the selected theme's sql_condition
-        if selected_theme:
-            print("selected_theme", selected_theme)
-            theme_sql_condition = selected_theme['sql_condition']
-            # Construct the featured query with dynamic conditions based on IS_PRIVATE
-            where_conditions = "1=1"  # Default condition to ensure valid SQL
-            having_conditions = "m.rating > 6.7"
-
-            if IS_PRIVATE:
-                # Add standort condition to WHERE clause
-                where_conditions += " AND (m.standort = 'extern' OR m.standort = 'local')"
-
-            # Check if theme_sql_condition already includes a WHERE clause
-            if "WHERE" in theme_sql_condition.upper():
-                query_conditions = theme_sql_condition + f" AND {where_conditions}"
+        with db_cursor() as cursor:
+            # Execute the base query to get the filtered movie data
+            logging.info("Executing base query for movies")
+            cursor.execute(base_query, pag_params)
+            movies = cursor.fetchall()
+
+            response_cache.tag(*(f"movie:{movie['movie_id']}" for movie in movies))
+
+            # Convert 'countries' and 'genres' from strings to lists
+            for movie in movies:
+                movie['countries'] = movie['countries'].split(', ') if movie['countries'] else []
+                movie['genres'] = movie['genres'].split(', ') if movie['genres'] else []
+                movie['actors'] = movie['actors'].split(', ') if movie['actors'] else []
+                movie['director'] = movie['director'].split(', ') if movie['director'] else []
+            add_card_image_urls(movies)
+
+            # Execute the count query to get the total count of filtered movies
+            logging.info("Executing count query for total movies")
+            cursor.execute(count_query, tuple(params))
+            total_movies = cursor.fetchone()['total']
+            total_pages = math.ceil(total_movies / per_page)
+
+            # Define pagination range for the current page
+            pagination_range = list(range(max(1, page - 2), min(total_pages + 1, page + 3)))
+
+            # Determine the selected theme
+            selected_theme = None
+
+            if genre_filter:
+                matched_themes = [theme for theme in themes if theme['name'].lower().startswith(genre_filter.lower()) or genre_filter.lower() in theme['name'].lower()]
+                if matched_themes:
+                    selected_theme = matched_themes[0]
+                else:
+                    selected_theme = random.choice([theme for theme in themes if "genre" in theme['sql_condition'].lower()])
             else:
-                query_conditions = f"{theme_sql_condition} WHERE {where_conditions}"
-
-            featured_query = f"""
-                SELECT 
-                    m.movie_id, 
-                    COALESCE(m.title, m.title) AS main_title,  
-                    m.original_title, 
-                    m.release_date, 
-                    m.rating, 
-                    m.folder_name, 
-                    m.overview,
-                    m.format_inhalt
-                FROM 
-                    movies m
-                    {query_conditions}  -- Dynamic theme conditions and where clause
-                GROUP BY 
-                    m.movie_id
-                HAVING 
-                    {having_conditions}  -- Keep HAVING for aggregated filters like rating
-                ORDER BY 
-                    RAND()
-                LIMIT 20;
-            """
-
+                selected_theme = random.choice(themes)
 
-            
-            logging.info("Executing featured movies query")
-            print("featured_movies2", featured_query)
-            cursor.execute(featured_query, ())
-            featured_movies = cursor.fetchall()
-
-
-            # Convert 'countries' and 'genres' from strings to lists if needed
-            for movie in featured_movies:
-                movie['countries'] = movie['countries'].split(', ') if 'countries' in movie and movie['countries'] else []
-                movie['genres'] = movie['genres'].split(', ') if 'genres' in movie and movie['genres'] else []
-        else:
-            featured_movies = []
-        
-
-        # Close cursor and database connection
-        cursor.close()
-        connection.close()
+            # Fetch featured movies based on the selected theme's sql_condition
+            if selected_theme:
+                logging.debug(f"Selected theme: {selected_theme['name']}")
+                featured_movies = get_featured_movies(cursor, selected_theme)
+            else:
+                featured_movies = []
 
         end_time = time.time()
         logging.info(f"Catalog data fetched in {end_time - start_time:.2f} seconds")
@@ -592,13 +944,103 @@ def catalog():
                                    selected_theme=selected_theme['name'] if selected_theme else "Featured")
 
         return ret_val
-    
+
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         logging.error(f"An error occurred while fetching catalog: {e}")
         return jsonify({'error': str(e)}), 500
         
-@cache.cached(timeout=300, query_string=True)  # Cache this route with query string parameters
+FEATURED_MOVIES_COUNT = 20
+
+
+def get_featured_movies(cursor, theme):
+    """
+    Return the featured movies (a random sample of 20) of a theme. With the theme
+    pools built this is a sample of the theme's pool plus one fetch by primary key;
+    otherwise the theme query runs and its sample is cached per theme.
+    """
+    pool = theme_pools.pool(theme) if theme_pools.ready else None
+    if pool is not None:
+        refresh_index_if_stale(theme_pools)
+        sample_ids = random.sample(pool, min(FEATURED_MOVIES_COUNT, len(pool)))
+        if not sample_ids:
+            return []
+        cursor.execute(f"""
+            SELECT
+                m.movie_id,
+                m.title AS main_title,
+                m.original_title,
+                m.release_date,
+                m.rating,
+                m.folder_name,
+                m.overview,
+                m.format_inhalt
+            FROM movies m
+            WHERE m.movie_id IN ({','.join(['%s'] * len(sample_ids))})
+        """, tuple(sample_ids))
+        movies_by_id = {movie['movie_id']: movie for movie in cursor.fetchall()}
+        return [movies_by_id[movie_id] for movie_id in sample_ids if movie_id in movies_by_id]
+
+    featured_cache_key = f"featured_{theme['name']}"
+    featured_movies = cache.get(featured_cache_key)
+    if featured_movies is not None:
+        return featured_movies
+
+    theme_sql_condition = theme['sql_condition']
+    # Construct the featured query with dynamic conditions based on IS_PRIVATE
+    where_conditions = "1=1"  # Default condition to ensure valid SQL
+    having_conditions = "m.rating > 6.7"
+
+    if IS_PRIVATE:
+        # Add standort condition to WHERE clause
+        where_conditions += " AND (m.standort = 'extern' OR m.standort = 'local')"
+
+    # Check if theme_sql_condition already includes a WHERE clause
+    if "WHERE" in theme_sql_condition.upper():
+        query_conditions = theme_sql_condition + f" AND {where_conditions}"
+    else:
+        query_conditions = f"{theme_sql_condition} WHERE {where_conditions}"
+
+    featured_query = f"""
+        SELECT 
+            m.movie_id, 
+            COALESCE(m.title, m.title) AS main_title,  
+            m.original_title, 
+            m.release_date, 
+            m.rating, 
+            m.folder_name, 
+            m.overview,
+            m.format_inhalt
+        FROM 
+            movies m
+            {query_conditions}  -- Dynamic theme conditions and where clause
+        GROUP BY 
+            m.movie_id
+        HAVING 
+            {having_conditions}  -- Keep HAVING for aggregated filters like rating
+        ORDER BY 
+            RAND()
+        LIMIT 20;
+    """
+
+    logging.info("Executing featured movies query")
+    logging.debug(f"Featured query: {' '.join(featured_query.split())}")
+    cursor.execute(featured_query, ())
+    featured_movies = cursor.fetchall()
+
+    # Convert 'countries' and 'genres' from strings to lists if needed
+    for movie in featured_movies:
+        movie['countries'] = movie['countries'].split(', ') if 'countries' in movie and movie['countries'] else []
+        movie['genres'] = movie['genres'].split(', ') if 'genres' in movie and movie['genres'] else []
+
+    cache.set(featured_cache_key, featured_movies, timeout=FEATURED_CACHE_TIMEOUT)
+    response_cache.register(featured_cache_key, {'facet:all'})
+    return featured_movies
+
+
 @app.route('/filter_movies', methods=['GET'])
+@response_cache.cached(timeout=RESPONSE_CACHE_TIMEOUT)
 def filter_movies():
     try:
 
@@ -611,63 +1053,56 @@ def filter_movies():
 
         if similar_id:
             # === SIMILAR MOVIES FLOW ===
-            connection = connect_to_db()
-            if not connection:
-                return jsonify({"error": "Database connection failed"}), 500
-            cursor = connection.cursor(dictionary=True)
-
-            # 1) Get the target movie's keywords
-            cursor.execute("SELECT keywords FROM movies WHERE movie_id = %s", (similar_id,))
-            row = cursor.fetchone()
-            if not row or not row.get('keywords'):
-                cursor.close()
-                connection.close()
-                return jsonify({'error': 'Movie not found or has no keywords'}), 404
-
-            # 2) Build the LIKE-based similarity expression
-            keywords_str = row['keywords']
-            keyword_list = [kw.strip() for kw in keywords_str.split(',') if kw.strip()]
-            if not keyword_list:
-                cursor.close()
-                connection.close()
-                return jsonify({'error': 'No valid keywords for similarity'}), 404
-
-            # e.g. "(CASE WHEN m.keywords LIKE %s THEN 1 ELSE 0 END) + ..."
-            similarity_expr = " + ".join(["(CASE WHEN m.keywords LIKE %s THEN 1 ELSE 0 END)" for _ in keyword_list])
-            score_params = [f"%{kw}%" for kw in keyword_list]
-
-            # We set a maximum of 50 potential matches, but we still want pagination
-            # so let's fetch them *all* (up to 50) then do the slicing ourselves.
-            sql = f"""
-                SELECT 
-                    m.*,
-                    ({similarity_expr}) AS similarity_score
-                FROM movies m
-                WHERE m.movie_id <> %s
-                  AND m.keywords IS NOT NULL
-                HAVING similarity_score > 0
-                ORDER BY similarity_score DESC, m.rating DESC
-                LIMIT 50
-            """
-            final_params = score_params + [similar_id]
-            cursor.execute(sql, tuple(final_params))
-            all_matches = cursor.fetchall()  # up to 50
-
-            cursor.close()
-            connection.close()
-
-            # 3) Manually apply pagination to that subset
-            total_movies = len(all_matches)
-            total_pages = max(1, math.ceil(total_movies / items_per_page))
-
-            # clamp page
-            if page < 1:
-                page = 1
-            elif page > total_pages:
-                page = total_pages
-
-            offset = (page - 1) * items_per_page
-            final_slice = all_matches[offset: offset + items_per_page]
+            with db_cursor() as cursor:
+                # 1) Look up the precomputed neighbors (see build_similar_movies.py)
+                neighbors = get_precomputed_neighbors(cursor, similar_id)
+
+                if neighbors:
+                    total_movies = len(neighbors)
+                    page, total_pages, offset = clamp_similar_page(page, total_movies, items_per_page)
+                    final_slice = fetch_similar_page(cursor, neighbors[offset: offset + items_per_page])
+                else:
+                    # No neighbor rows yet: score the keywords on the fly
+                    # 1) Get the target movie's keywords
+                    cursor.execute("SELECT keywords FROM movies WHERE movie_id = %s", (similar_id,))
+                    row = cursor.fetchone()
+                    if not row or not row.get('keywords'):
+                        return jsonify({'error': 'Movie not found or has no keywords'}), 404
+
+                    # 2) Build the LIKE-based similarity expression
+                    keywords_str = row['keywords']
+                    keyword_list = [kw.strip() for kw in keywords_str.split(',') if kw.strip()]
+                    if not keyword_list:
+                        return jsonify({'error': 'No valid keywords for similarity'}), 404
+
+                    # e.g. "(CASE WHEN m.keywords LIKE %s THEN 1 ELSE 0 END) + ..."
+                    similarity_expr = " + ".join(["(CASE WHEN m.keywords LIKE %s THEN 1 ELSE 0 END)" for _ in keyword_list])
+                    score_params = [f"%{kw}%" for kw in keyword_list]
+
+                    # We set a maximum of 50 potential matches, but we still want pagination
+                    # so let's fetch them *all* (up to 50) then do the slicing ourselves.
+                    sql = f"""
+                        SELECT 
+                            m.*,
+                            ({similarity_expr}) AS similarity_score
+                        FROM movies m
+                        WHERE m.movie_id <> %s
+                          AND m.keywords IS NOT NULL
+                        HAVING similarity_score > 0
+                        ORDER BY similarity_score DESC, m.rating DESC
+                        LIMIT 50
+                    """
+                    final_params = score_params + [similar_id]
+                    cursor.execute(sql, tuple(final_params))
+                    all_matches = cursor.fetchall()  # up to 50
+
+                    # 3) Manually apply pagination to that subset
+                    total_movies = len(all_matches)
+                    page, total_pages, offset = clamp_similar_page(page, total_movies, items_per_page)
+                    final_slice = all_matches[offset: offset + items_per_page]
+
+            response_cache.tag(f"movie:{similar_id}", *(f"movie:{movie['movie_id']}" for movie in final_slice))
+            add_card_image_urls(final_slice)
 
             # 4) Return JSON with normal fields
             return jsonify({
@@ -697,71 +1132,57 @@ def filter_movies():
         sort_by = request.args.get('sort_by', 'Zufall')
         page = int(request.args.get('page', 1))
 
+        # Seeded random order: the client sends back the seed it got with the first page,
+        # so every page is a slice of the same permutation (and cacheable by its query string)
+        seed = None
+        if sort_by == 'Zufall':
+            if request.args.get('seed'):
+                try:
+                    seed = int(request.args['seed'])
+                except ValueError:
+                    return jsonify({'error': f"Invalid seed '{request.args['seed']}'"}), 400
+            else:
+                # Everyone gets the same first page for a while, so it is cached (and warmed) like the other sorts
+                seed = server_shuffle_seed()
+
+        # Keyset pagination: `after=` (empty for the first page) switches from page numbers
+        # to an opaque cursor. The total count is then only computed on request.
+        after_token = request.args.get('after')
+        keyset_mode = after_token is not None
+        include_total = request.args.get('include_total', 'false' if after_token else 'true').lower() == 'true'
+        last_sort_key = last_movie_id = None
+        if keyset_mode:
+            keyset_sort_key = get_keyset_sort_key(sort_by)
+            if not keyset_sort_key:
+                return jsonify({'error': f"Sort option '{sort_by}' does not support cursor pagination"}), 400
+            if after_token:
+                try:
+                    last_sort_key, last_movie_id = decode_page_cursor(after_token, sort_by)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+
         logging.info("Filtering movies (normal mode)")
-        logging.info(f"Parameters - Years: {selected_years}, Genres: {selected_genres}, Countries: {selected_countries}, Search Query: '{search_query}', Standorte: {standorte}, Media: {media}, Sort By: {sort_by}, Page: {page}")
+        logging.info(f"Parameters - Years: {selected_years}, Genres: {selected_genres}, Countries: {selected_countries}, Search Query: '{search_query}', Standorte: {standorte}, Media: {media}, Sort By: {sort_by}, Page: {page}, After: {after_token}")
 
-        where_clauses = []
-        params = []
+        facet_filters = (selected_years, selected_genres, selected_countries, standorte, media)
 
         # **Apply Search Condition** (title, original_title, keywords, director, cast)
+        search_ranking = None
+        search_ids = None
+        if search_query and search_index.ready:
+            # Index lookup: ranked hits, the SQL only sees their movie_ids
+            refresh_index_if_stale(search_index)
+            search_ranking = search_index.search(search_query)
+            search_ids = [movie_id for movie_id, _ in search_ranking]
+
+        filter_query = FilterQuery(*facet_filters, search_query=search_query, search_ids=search_ids)
+        where_clause = filter_query.where_clause
+        params = filter_query.params
+
+        cache_tags = facet_cache_tags(*facet_filters)
         if search_query:
-            where_clauses.append("""
-                (
-                    m.title LIKE %s
-                    OR m.original_title LIKE %s
-                    OR m.keywords LIKE %s
-                    OR cr.name LIKE %s
-                    OR EXISTS (
-                        SELECT 1 
-                        FROM movie_cast mc 
-                        WHERE mc.movie_id = m.movie_id 
-                          AND mc.name LIKE %s
-                    )
-                )
-            """)
-            search_pattern = f"%{search_query}%"
-            params.extend([search_pattern]*5)
-
-        # Genre Filter
-        if selected_genres:
-            placeholders = ','.join(['%s'] * len(selected_genres))
-            where_clauses.append(f"m.movie_id IN (SELECT movie_id FROM genres WHERE genre IN ({placeholders}))")
-            params.extend(selected_genres)
-
-        # Year Filter (supports e.g. '1990...1999')
-        if selected_years:
-            year_filters = []
-            for year in selected_years:
-                if "..." in year:
-                    start_year = int(year.split("...")[0])
-                    end_year = start_year + 9
-                    year_filters.append("m.release_date BETWEEN %s AND %s")
-                    params.extend([start_year, end_year])
-                else:
-                    year_filters.append("m.release_date = %s")
-                    params.append(int(year))
-            where_clauses.append(f"({' OR '.join(year_filters)})")
-
-        # Country Filter
-        if selected_countries:
-            placeholders = ','.join(['%s'] * len(selected_countries))
-            where_clauses.append(f"m.movie_id IN (SELECT movie_id FROM countries WHERE country IN ({placeholders}))")
-            params.extend(selected_countries)
-
-        # Standort Filter
-        if standorte:
-            placeholders = ','.join(['%s'] * len(standorte))
-            where_clauses.append(f"m.standort IN ({placeholders})")
-            params.extend(standorte)
-
-        # Media Filter (vhs, dvd, blu, blu3)
-        if media:
-            # e.g. for media=['format_vhs','format_dvd']
-            media_filters = [f"m.{m} > 0" for m in media]
-            where_clauses.append(f"({' OR '.join(media_filters)})")
-
-        # Construct WHERE
-        where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
+            cache_tags.add('search')
+        response_cache.tag(*cache_tags)
 
         filters_string = f"{selected_years}_{selected_genres}_{selected_countries}_{search_query}_{standorte}_{media}"
         filters_hash = hashlib.md5(filters_string.encode('utf-8')).hexdigest()
@@ -769,117 +1190,137 @@ def filter_movies():
         counts_cached = cache.get(counts_cache_key)
 
         # 2) Connect DB
-        connection = connect_to_db()
-        if not connection:
-            return jsonify({"error": "Database connection failed"}), 500
-        cursor = connection.cursor(dictionary=True)
-
-        # 3) Count
-        count_query = f"""
-            SELECT COUNT(DISTINCT m.movie_id) AS total
-            FROM movies m
-            LEFT JOIN genres g ON m.movie_id = g.movie_id
-            LEFT JOIN countries c ON m.movie_id = c.movie_id
-            LEFT JOIN crew cr ON m.movie_id = cr.movie_id AND cr.job = 'Director'
-            LEFT JOIN movie_cast mc ON m.movie_id = mc.movie_id
-            WHERE {where_clause}
-        """
-        cursor.execute(count_query, tuple(params))
-        total_movies = cursor.fetchone()['total']
-
-        # 4) rows_per_page, columns_per_row, items_per_page
-        rows_per_page = 3
-        columns_per_row = 4
-        items_per_page = rows_per_page * columns_per_row
-
-        # 5) total_pages
-        total_pages = math.ceil(total_movies / items_per_page) if items_per_page else 1
-
-        # 6) clamp page
-        if page < 1: 
-            page = 1
-        elif page > total_pages:
-            page = total_pages
-
-        # 7) offset
-        offset = (page - 1) * items_per_page
+        with db_cursor() as cursor:
+
+            # 3) Count (optional in keyset mode, free for a precomputed order)
+            total_movies = None
+            ordered_ids = None
+            if search_ranking is not None and sort_by == 'Zufall':
+                # A search without an explicit sort order is sorted by relevance
+                ordered_ids = rank_filtered_movie_ids(cursor, search_ranking, where_clause, params, facet_filters)
+                seed = None
+            elif seed is not None:
+                ordered_ids = get_shuffled_movie_ids(cursor, filters_hash, seed, where_clause, params, search_query,
+                                                     facet_filters, cache_tags)
+            if ordered_ids is not None:
+                total_movies = len(ordered_ids)
+            elif include_total or not keyset_mode:
+                cursor.execute(*filter_query.count_query())
+                total_movies = cursor.fetchone()['total']
+
+            # 4) rows_per_page, columns_per_row, items_per_page
+            rows_per_page = 3
+            columns_per_row = 4
+            items_per_page = rows_per_page * columns_per_row
+
+            # 5) total_pages
+            total_pages = None
+            if total_movies is not None:
+                total_pages = math.ceil(total_movies / items_per_page) if items_per_page else 1
+
+            # 6) clamp page
+            if page < 1: 
+                page = 1
+            elif total_pages is not None and page > total_pages:
+                page = total_pages
 
-        logging.info(f"Page: {page}, total_movies: {total_movies}, items_per_page: {items_per_page}, offset: {offset}, total_pages: {total_pages}")
+            # 7) offset
+            offset = (page - 1) * items_per_page
 
-        # 8) Build main query
-        sort_expression, sort_options = build_sort_expression(sort_by)
-        base_query = f"""
-            SELECT
-                m.movie_id,
-                COALESCE(m.format_titel, m.title) AS main_title,
-                m.original_title,
-                m.release_date,
-                m.runtime,
-                m.imdb_id,
-                m.rating,
-                m.fsk,
-                m.folder_name,
-                m.overview,
-                m.standort,
-                m.format_inhalt,
-                GROUP_CONCAT(DISTINCT CONCAT(c.country, ' (', c.country_code, ')') SEPARATOR ', ') AS countries,
-                GROUP_CONCAT(DISTINCT g.genre SEPARATOR ', ') AS genres,
-                GROUP_CONCAT(DISTINCT cr.name SEPARATOR ', ') AS director,
-                (SELECT GROUP_CONCAT(DISTINCT movie_cast.name ORDER BY movie_cast.popularity DESC SEPARATOR ', ')
-                    FROM movie_cast WHERE movie_cast.movie_id = m.movie_id LIMIT 3) AS actors,
-                TRIM(BOTH ', ' FROM CONCAT_WS(', ',
-                    CASE WHEN m.format_vhs > 0 THEN CONCAT('VHS (', m.format_vhs, ')') ELSE NULL END,
-                    CASE WHEN m.format_dvd > 0 THEN CONCAT('DVD (', m.format_dvd, ')') ELSE NULL END,
-                    CASE WHEN m.format_blu > 0 THEN CONCAT('Blu-ray (', m.format_blu, ')') ELSE NULL END,
-                    CASE WHEN m.format_blu3 > 0 THEN CONCAT('Blu-ray 3D (', m.format_blu3, ')') ELSE NULL END
-                )) AS formats
-            FROM
-                movies m
-                LEFT JOIN genres g ON m.movie_id = g.movie_id
-                LEFT JOIN countries c ON m.movie_id = c.movie_id
-                LEFT JOIN crew cr ON m.movie_id = cr.movie_id AND cr.job = 'Director'
-            WHERE {where_clause}
-            GROUP BY m.movie_id
-            ORDER BY {sort_expression}
-            LIMIT %s OFFSET %s
-        """
-        base_params = params + [items_per_page, offset]
-
-        cursor.execute(base_query, tuple(base_params))
-        filtered_movies = cursor.fetchall()
-
-        # Convert 'countries' & 'genres' from comma-string -> list
-        for movie in filtered_movies:
-            movie['countries'] = movie['countries'].split(', ') if movie['countries'] else []
-            movie['genres'] = movie['genres'].split(', ') if movie['genres'] else []
-            movie['director'] = movie['director'].split(', ') if movie['director'] else []
-
-        # 9) Possibly fetch counts for dropdown if include_counts
-        if include_counts:
-            if counts_cached:
-                (genre_counts, year_counts, country_counts, standorte_counts, media_counts) = counts_cached
+            logging.info(f"Page: {page}, total_movies: {total_movies}, items_per_page: {items_per_page}, offset: {offset}, total_pages: {total_pages}")
+
+            # 8) Build main query
+            sort_expression, sort_options = build_sort_expression(sort_by)
+            sort_key_column = ""
+            page_where_clause = where_clause
+            page_params = list(params)
+            if keyset_mode:
+                # Seek past the last row instead of skipping `offset` rows; fetch one extra row for has_more
+                key_expression, key_direction = keyset_sort_key
+                sort_key_column = f", {key_expression} AS sort_key"
+                sort_expression += ", m.movie_id ASC"
+                if after_token:
+                    condition, condition_params = build_keyset_condition(key_expression, key_direction, last_sort_key, last_movie_id)
+                    page_where_clause = f"({where_clause}) AND {condition}"
+                    page_params += condition_params
+                page_params += [items_per_page + 1, 0]
+            elif ordered_ids is not None:
+                # Fetch just this page's slice of the precomputed order by primary key
+                page_ids = ordered_ids[offset:offset + items_per_page]
+                page_where_clause = f"m.movie_id IN ({','.join(['%s'] * len(page_ids))})" if page_ids else "1=0"
+                page_params = page_ids + [items_per_page, 0]
+                sort_expression = "m.movie_id"
             else:
-                logging.info("Fetching counts for dropdown filters...")
-                genre_counts = get_counts(cursor, 'genre', where_clause, params)
-                year_counts = get_counts(cursor, 'release_date', where_clause, params)
-                country_counts = get_counts(cursor, 'country', where_clause, params)
-                standorte_counts = get_counts(cursor, 'standort', where_clause, params)
-                media_counts = get_counts(cursor, 'media', where_clause, params)
-
-                # Optionally sort years with decades
-                year_counts = sort_years_with_decades(year_counts)
-
-                # Cache them
-                cache.set(counts_cache_key, (genre_counts, year_counts, country_counts, standorte_counts, media_counts), timeout=300)
-        else:
-            genre_counts = {}
-            year_counts = {}
-            country_counts = {}
-            standorte_counts = {}
-            media_counts = {}
+                page_params += [items_per_page, offset]
+
+            base_query = f"""
+                SELECT {MOVIE_CARD_COLUMNS}{sort_key_column}
+                FROM {MOVIE_CARD_FROM}
+                WHERE {page_where_clause}
+                ORDER BY {sort_expression}
+                LIMIT %s OFFSET %s
+            """
 
-        cursor.close()
-        connection.close()
+            cursor.execute(base_query, tuple(page_params))
+            filtered_movies = cursor.fetchall()
+            response_cache.tag(*(f"movie:{movie['movie_id']}" for movie in filtered_movies))
+
+            has_more = False
+            next_cursor = None
+            if keyset_mode:
+                has_more = len(filtered_movies) > items_per_page
+                filtered_movies = filtered_movies[:items_per_page]
+                if has_more:
+                    last_movie = filtered_movies[-1]
+                    next_cursor = encode_page_cursor(sort_by, last_movie['sort_key'], last_movie['movie_id'])
+                for movie in filtered_movies:
+                    movie.pop('sort_key', None)
+            elif ordered_ids is not None:
+                page_positions = {movie_id: i for i, movie_id in enumerate(page_ids)}
+                filtered_movies.sort(key=lambda movie: page_positions[movie['movie_id']])
+
+            # Convert 'countries' & 'genres' from comma-string -> list
+            for movie in filtered_movies:
+                movie['countries'] = movie['countries'].split(', ') if movie['countries'] else []
+                movie['genres'] = movie['genres'].split(', ') if movie['genres'] else []
+                movie['director'] = movie['director'].split(', ') if movie['director'] else []
+            add_card_image_urls(filtered_movies)
+
+            # 9) Possibly fetch counts for dropdown if include_counts
+            if include_counts:
+                if counts_cached:
+                    (genre_counts, year_counts, country_counts, standorte_counts, media_counts) = counts_cached
+                else:
+                    logging.info("Fetching counts for dropdown filters...")
+                    if facet_index.ready:
+                        refresh_index_if_stale(facet_index)
+                        if search_ranking is not None:
+                            selection = facet_index.select(*facet_filters) & facet_index.bits_for_ids(search_ids)
+                        elif search_query:
+                            # The LIKE search can't be answered from bitmaps, so fetch the matching ids once
+                            selection = get_filtered_movie_bits(cursor, where_clause, params)
+                        else:
+                            selection = facet_index.select(*facet_filters)
+                        (genre_counts, year_counts, country_counts, standorte_counts, media_counts) = facet_index.counts(selection)
+                    else:
+                        genre_counts = get_counts(cursor, 'genre', filter_query)
+                        year_counts = get_counts(cursor, 'release_date', filter_query)
+                        country_counts = get_counts(cursor, 'country', filter_query)
+                        standorte_counts = get_counts(cursor, 'standort', filter_query)
+                        media_counts = get_counts(cursor, 'media', filter_query)
+
+                    # Optionally sort years with decades
+                    year_counts = sort_years_with_decades(year_counts)
+
+                    # Cache them
+                    cache.set(counts_cache_key, (genre_counts, year_counts, country_counts, standorte_counts, media_counts), timeout=300)
+                    response_cache.register(counts_cache_key, cache_tags)
+            else:
+                genre_counts = {}
+                year_counts = {}
+                country_counts = {}
+                standorte_counts = {}
+                media_counts = {}
 
         end_time = time.time()
         logging.info(f"Filter completed in {(end_time - start_time):.2f} seconds")
@@ -895,6 +1336,15 @@ def filter_movies():
             'items_per_page': items_per_page,
             'sort_options': sort_options
         }
+        if seed is not None:
+            response_data['seed'] = seed
+        if keyset_mode:
+            response_data.update({
+                'pagination': 'keyset',
+                'has_more': has_more,
+                'next_cursor': next_cursor
+            })
+            del response_data['current_page']
         if include_counts:
             response_data.update({
                 'years': year_counts,
@@ -905,11 +1355,61 @@ def filter_movies():
             })
         return jsonify(response_data)
 
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         logging.error(f"Error in filter_movies: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+def get_precomputed_neighbors(cursor, movie_id):
+    """
+    Return [(similar_movie_id, score), ...] from the movie_similar table, best first.
+    Returns an empty list if the movie has no rows or the table doesn't exist yet.
+    """
+    try:
+        cursor.execute("""
+            SELECT similar_movie_id, score
+            FROM movie_similar
+            WHERE movie_id = %s
+            ORDER BY score DESC
+            LIMIT 50
+        """, (movie_id,))
+    except mysql.connector.Error as err:
+        if err.errno == errorcode.ER_NO_SUCH_TABLE:
+            return []
+        raise
+    return [(row['similar_movie_id'], row['score']) for row in cursor.fetchall()]
+
+
+def fetch_similar_page(cursor, neighbors):
+    """Fetch the movie rows for one page of neighbors, keeping the neighbor order."""
+    if not neighbors:
+        return []
+    placeholders = ','.join(['%s'] * len(neighbors))
+    cursor.execute(f"SELECT m.* FROM movies m WHERE m.movie_id IN ({placeholders})",
+                   tuple(movie_id for movie_id, _ in neighbors))
+    movies_by_id = {movie['movie_id']: movie for movie in cursor.fetchall()}
+
+    page_movies = []
+    for movie_id, score in neighbors:
+        movie = movies_by_id.get(movie_id)
+        if movie:
+            movie['similarity_score'] = score
+            page_movies.append(movie)
+    return page_movies
+
+
+def clamp_similar_page(page, total_movies, items_per_page):
+    """Clamp the page number for the similar view; returns (page, total_pages, offset)."""
+    total_pages = max(1, math.ceil(total_movies / items_per_page))
+    if page < 1:
+        page = 1
+    elif page > total_pages:
+        page = total_pages
+    return page, total_pages, (page - 1) * items_per_page
+
+
 def build_sort_expression(sort_option):
     """
     Builds the sort expression based on the sort_option.
@@ -921,8 +1421,8 @@ def build_sort_expression(sort_option):
         "Titel desc": "m.title DESC",  # Descending order by movie title
         "Jahr asc": "m.release_date ASC",  # Ascending order by release date
         "Jahr desc": "m.release_date DESC",  # Descending order by release date
-        "Bewertung asc": "CAST(m.rating AS DECIMAL(3,1)) ASC",  # Ascending order by IMDb rating
-        "Bewertung desc": "CAST(m.rating AS DECIMAL(3,1)) DESC",  # Descending order by IMDb rating
+        "Bewertung asc": "m.rating ASC",  # Ascending order by IMDb rating
+        "Bewertung desc": "m.rating DESC",  # Descending order by IMDb rating
         "Regisseur asc": "director ASC",  # Ascending order by director's name
         "Regisseur desc": "director DESC",  # Descending order by director's name
         "Länge asc": "m.runtime ASC",  # Ascending order by runtime
@@ -937,6 +1437,74 @@ def build_sort_expression(sort_option):
     return sort_expression, list(sort_options.keys())
 
 
+# Sort key (expression, direction) for every deterministic sort option of
+# build_sort_expression. Keyset pagination seeks on this key plus m.movie_id.
+KEYSET_SORT_KEYS = {
+    "Titel asc": ("m.title", "ASC"),
+    "Titel desc": ("m.title", "DESC"),
+    "Jahr asc": ("m.release_date", "ASC"),
+    "Jahr desc": ("m.release_date", "DESC"),
+    "Bewertung asc": ("m.rating", "ASC"),
+    "Bewertung desc": ("m.rating", "DESC"),
+    "Regisseur asc": ("ms.director", "ASC"),
+    "Regisseur desc": ("ms.director", "DESC"),
+    "Länge asc": ("m.runtime", "ASC"),
+    "Länge desc": ("m.runtime", "DESC"),
+}
+DEFAULT_KEYSET_SORT_KEY = ("m.release_date", "DESC")  # Matches the default sort of build_sort_expression
+
+
+def get_keyset_sort_key(sort_option):
+    """
+    Return (expression, direction) of the sort key for keyset pagination,
+    or None if the sort option has no deterministic order (random).
+    """
+    if sort_option == "Zufall":
+        return None
+    return KEYSET_SORT_KEYS.get(sort_option, DEFAULT_KEYSET_SORT_KEY)
+
+
+def encode_page_cursor(sort_option, sort_key, movie_id):
+    """Encode the last row of a page into an opaque `after=` token."""
+    payload = json.dumps([sort_option, sort_key, movie_id], default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_cursor(token, sort_option):
+    """
+    Decode an `after=` token into (sort_key, movie_id).
+    Raises ValueError if the token is malformed or was issued for another sort option.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        token_sort_option, sort_key, movie_id = json.loads(payload)
+        movie_id = int(movie_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid pagination cursor") from e
+    if token_sort_option != sort_option:
+        raise ValueError("Pagination cursor does not match the sort option")
+    return sort_key, movie_id
+
+
+def build_keyset_condition(expression, direction, sort_key, movie_id):
+    """
+    Build the seek condition for rows after (sort_key, movie_id) in the order
+    `expression direction, m.movie_id ASC`. MySQL sorts NULLs first in ascending
+    and last in descending order, which the IS NULL branches mirror.
+    Returns the SQL condition and its parameters.
+    """
+    if sort_key is None:
+        if direction == "ASC":
+            return f"(({expression} IS NULL AND m.movie_id > %s) OR {expression} IS NOT NULL)", [movie_id]
+        return f"({expression} IS NULL AND m.movie_id > %s)", [movie_id]
+
+    operator = ">" if direction == "ASC" else "<"
+    condition = f"{expression} {operator} %s OR ({expression} = %s AND m.movie_id > %s)"
+    if direction == "DESC":
+        condition += f" OR {expression} IS NULL"
+    return f"({condition})", [sort_key, sort_key, movie_id]
+
+
 def sort_years_with_decades(year_counts):
     """Sorts year counts so that grouped decades appear at the top of the list."""
     # Group years into decades
@@ -979,191 +1547,178 @@ def sort_years_with_decades(year_counts):
     return sorted_combined_dict
 
 
-def get_counts(cursor, field, where_clause, params):
+def get_filtered_movie_ids(cursor, where_clause, params):
+    """Run the filter once and return all matching movie_ids."""
+    id_query = f"""
+        SELECT m.movie_id
+        FROM movies m
+        WHERE {where_clause}
+    """
+    cursor.execute(id_query, tuple(params))
+    return [row['movie_id'] for row in cursor.fetchall()]
+
+
+def get_filtered_movie_bits(cursor, where_clause, params):
+    """Run the filter once and return the matching movie_ids as a facet index bitmap."""
+    return facet_index.bits_for_ids(get_filtered_movie_ids(cursor, where_clause, params))
+
+
+def rank_filtered_movie_ids(cursor, search_ranking, where_clause, params, facet_filters):
+    """Return the ids of the search hits that pass the other filters, best match first."""
+    if facet_index.ready:
+        allowed = set(facet_index.movie_ids(facet_index.select(*facet_filters)))
+    else:
+        allowed = set(get_filtered_movie_ids(cursor, where_clause, params))
+    return [movie_id for movie_id, _ in search_ranking if movie_id in allowed]
+
+
+def server_shuffle_seed():
+    """Seed of requests without one; it changes every SERVER_SEED_INTERVAL and is the same in every process."""
+    return random.Random(int(time.time() // SERVER_SEED_INTERVAL)).randint(1, 2**31 - 1)
+
+
+def get_shuffled_movie_ids(cursor, filters_hash, seed, where_clause, params, search_query, facet_filters, cache_tags):
+    """
+    Return the filtered movie_ids in a random order that only depends on the seed.
+    The permutation is cached per (filters, seed), so paging through a shuffled
+    result only slices a list instead of sorting the whole set by RAND(). It is
+    registered under the filter's `cache_tags`, so changed movies evict it.
+    """
+    shuffle_cache_key = f"shuffle_{filters_hash}_{seed}"
+    shuffled_ids = cache.get(shuffle_cache_key)
+    if shuffled_ids is not None:
+        return shuffled_ids
+
+    if facet_index.ready and not search_query:
+        movie_ids = facet_index.movie_ids(facet_index.select(*facet_filters))
+    else:
+        movie_ids = get_filtered_movie_ids(cursor, where_clause, params)
+
+    shuffled_ids = sorted(movie_ids)
+    random.Random(seed).shuffle(shuffled_ids)
+    cache.set(shuffle_cache_key, shuffled_ids, timeout=SHUFFLE_CACHE_TIMEOUT)
+    response_cache.register(shuffle_cache_key, cache_tags)
+    return shuffled_ids
+
+
+def get_counts(cursor, field, filter_query):
     """
     Generalized helper function to get counts of distinct values for the specified field,
     including search query filtering and filters for years, countries, and genres.
     """
     logging.info(f"Getting counts for field: {field}")
 
-    if field == "media":
-        # For media counts, calculate the sum of each media format
-        count_query = f"""
-            SELECT
-                SUM(CASE WHEN m.format_vhs > 0 THEN 1 ELSE 0 END) AS format_vhs,
-                SUM(CASE WHEN m.format_dvd > 0 THEN 1 ELSE 0 END) AS format_dvd,
-                SUM(CASE WHEN m.format_blu > 0 THEN 1 ELSE 0 END) AS format_blu,
-                SUM(CASE WHEN m.format_blu3 > 0 THEN 1 ELSE 0 END) AS format_blu3
-            FROM movies m
-            LEFT JOIN crew cr ON m.movie_id = cr.movie_id AND cr.job = 'Director'
-            WHERE {where_clause}
-        """
-        cursor.execute(count_query, tuple(params))
-        result = cursor.fetchone()
-        return {
-            'format_vhs': result['format_vhs'],
-            'format_dvd': result['format_dvd'],
-            'format_blu': result['format_blu'],
-            'format_blu3': result['format_blu3']
-        }
-    else:
-        # For other fields (genre, release_date, country, standort)
-        if field == "genre":
-            group_field = "g.genre"
-            join_clause = "LEFT JOIN genres g ON m.movie_id = g.movie_id"
-        elif field == "country":
-            group_field = "c.country"
-            join_clause = "LEFT JOIN countries c ON m.movie_id = c.movie_id"
-        elif field == "release_date":
-            group_field = "m.release_date"
-            join_clause = ""
-        elif field == "standort":
-            group_field = "m.standort"
-            join_clause = ""
-        else:
-            raise ValueError(f"Invalid field name: {field}")
-
-        # Construct the count query
-        count_query = f"""
-            SELECT {group_field} AS field_value, COUNT(DISTINCT m.movie_id) AS count
-            FROM movies m
-            {join_clause}
-            LEFT JOIN crew cr ON m.movie_id = cr.movie_id AND cr.job = 'Director'
-            WHERE {where_clause}
-        """
-
-        # Add GROUP BY and ORDER BY clauses
-        if field in ["genre", "country"]:
-            count_query += f" GROUP BY {group_field} ORDER BY count DESC"
-        else:
-            # For release_date and standort
-            count_query += f" GROUP BY {group_field} ORDER BY {group_field} DESC"
+    cursor.execute(*filter_query.facet_count_query(field))
 
-        cursor.execute(count_query, tuple(params))
-        results = cursor.fetchall()
+    if field == "media":
+        # For media counts, the query sums up each media format
+        return dict(cursor.fetchone())
 
-        counts = {}
-        for row in results:
-            key = row['field_value'] if row['field_value'] else 'Unknown'
-            counts[key] = row['count']
+    counts = {}
+    for row in cursor.fetchall():
+        key = row['field_value'] if row['field_value'] else 'Unknown'
+        counts[key] = row['count']
 
-        return counts
+    return counts
 
 
-@cache.cached(timeout=300, query_string=True)
 @app.route('/autocomplete')
+@response_cache.cached(timeout=RESPONSE_CACHE_TIMEOUT)
 def autocomplete():
     query = request.args.get('query', '').strip()
     suggestions = []
+    response_cache.tag('autocomplete')
 
     logging.info(f"Handling autocomplete for query: '{query}'")
 
-    if len(query) >= 2:
-        connection = connect_to_db()
-        if not connection:
-            return jsonify({"error": "Database connection failed"}), 500
+    if len(query) >= 2 and autocomplete_index.ready:
+        # Answered from memory, no connection needed
+        refresh_index_if_stale(autocomplete_index)
+        return jsonify(autocomplete_index.suggest(query))
 
+    if len(query) >= 2:
         try:
-            cursor = connection.cursor(dictionary=True)
-
-            search_pattern = f"%{query}%"
-
-            # 1) Search in movie titles (existing)
-            movie_query = """
-                SELECT DISTINCT title, movie_id
-                FROM movies
-                WHERE title LIKE %s OR original_title LIKE %s OR format_orig_titel LIKE %s
-                ORDER BY title
-                LIMIT 10
-            """
-            cursor.execute(movie_query, (search_pattern,)*3)
-            movie_matches = cursor.fetchall()
-            for movie in movie_matches:
-                suggestions.append({
-                    'name': movie['title'],
-                    'type': 'Title',
-                    'id': movie['movie_id']
-                })
-
-            # 2) Search in cast names (existing)
-            cast_query = """
-                SELECT DISTINCT name, id
-                FROM movie_cast
-                WHERE name LIKE %s
-                ORDER BY name
-                LIMIT 10
-            """
-            cursor.execute(cast_query, (search_pattern,))
-            cast_matches = cursor.fetchall()
-            for cast_member in cast_matches:
-                suggestions.append({
-                    'name': cast_member['name'],
-                    'type': 'Actor',
-                    'id': cast_member['id']
-                })
-
-            # 3) Search in crew names (existing)
-            crew_query = """
-                SELECT DISTINCT name, id
-                FROM crew
-                WHERE name LIKE %s
-                ORDER BY name
-                LIMIT 10
-            """
-            cursor.execute(crew_query, (search_pattern,))
-            crew_matches = cursor.fetchall()
-            for crew_member in crew_matches:
-                suggestions.append({
-                    'name': crew_member['name'],
-                    'type': 'Director',
-                    'id': crew_member['id']
-                })
-
-            # 4) Search in m.keywords
-            keywords_query = """
-                SELECT movie_id, keywords
-                FROM movies
-                WHERE keywords LIKE %s
-                LIMIT 10
-            """
-            cursor.execute(keywords_query, (search_pattern,))
-            keyword_matches = cursor.fetchall()
-            for row in keyword_matches:
-                # Because 'keywords' might be a long comma-separated string, 
-                # you can just show the entire chunk, or something simpler:
-                suggestions.append({
-                    'name': row['keywords'],
-                    'type': 'Keywords',
-                    'id': row['movie_id']
-                })
-
+            with db_cursor() as cursor:
+                search_pattern = f"%{query}%"
+
+                # 1) Search in movie titles (existing)
+                movie_query = """
+                    SELECT DISTINCT title, movie_id
+                    FROM movies
+                    WHERE title LIKE %s OR original_title LIKE %s OR format_orig_titel LIKE %s
+                    ORDER BY title
+                    LIMIT 10
+                """
+                cursor.execute(movie_query, (search_pattern,)*3)
+                movie_matches = cursor.fetchall()
+                for movie in movie_matches:
+                    suggestions.append({
+                        'name': movie['title'],
+                        'type': 'Title',
+                        'id': movie['movie_id']
+                    })
+
+                # 2) Search in cast names (existing)
+                cast_query = """
+                    SELECT DISTINCT name, id
+                    FROM movie_cast
+                    WHERE name LIKE %s
+                    ORDER BY name
+                    LIMIT 10
+                """
+                cursor.execute(cast_query, (search_pattern,))
+                cast_matches = cursor.fetchall()
+                for cast_member in cast_matches:
+                    suggestions.append({
+                        'name': cast_member['name'],
+                        'type': 'Actor',
+                        'id': cast_member['id']
+                    })
+
+                # 3) Search in crew names (existing)
+                crew_query = """
+                    SELECT DISTINCT name, id
+                    FROM crew
+                    WHERE name LIKE %s
+                    ORDER BY name
+                    LIMIT 10
+                """
+                cursor.execute(crew_query, (search_pattern,))
+                crew_matches = cursor.fetchall()
+                for crew_member in crew_matches:
+                    suggestions.append({
+                        'name': crew_member['name'],
+                        'type': 'Director',
+                        'id': crew_member['id']
+                    })
+
+                # 4) Search in m.keywords
+                keywords_query = """
+                    SELECT movie_id, keywords
+                    FROM movies
+                    WHERE keywords LIKE %s
+                    LIMIT 10
+                """
+                cursor.execute(keywords_query, (search_pattern,))
+                keyword_matches = cursor.fetchall()
+                for row in keyword_matches:
+                    # Because 'keywords' might be a long comma-separated string, 
+                    # you can just show the entire chunk, or something simpler:
+                    suggestions.append({
+                        'name': row['keywords'],
+                        'type': 'Keywords',
+                        'id': row['movie_id']
+                    })
+
+        except DatabaseUnavailable:
+            raise
         except Exception as e:
             logging.error(f"Error in autocomplete: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
-        finally:
-            cursor.close()
-            connection.close()
 
     return jsonify(suggestions)
 
 
-def convert_subtitle_to_vtt(subtitle_path):
-    ext = os.path.splitext(subtitle_path)[1].lower()
-    vtt_path = subtitle_path + '.vtt'  # Temporary file
-    if ext == '.vtt':
-        return subtitle_path  # Already in VTT format
-    try:
-        with open(subtitle_path, 'r', encoding='utf-8') as infile:
-            content = infile.read()
-        # Basic conversion; for complex files, use a library like pysrt or pycaption
-        content = 'WEBVTT\n\n' + content.replace(',', '.')
-        with open(vtt_path, 'w', encoding='utf-8') as outfile:
-            outfile.write(content)
-        return vtt_path
-    except Exception as e:
-        print(f"Error converting subtitle: {e}")
-        return None
-
 @app.route('/serve_movie_file')
 def serve_movie_file():
     """
@@ -1175,16 +1730,24 @@ def serve_movie_file():
     if not movie_file_path:
         abort(400, "Missing 'file_path' parameter.")
     
+    return stream_movie_file(movie_file_path)
+
+
+def stream_movie_file(movie_file_path):
+    """
+    Stream a movie file given by its absolute path, with Range support for
+    seeking, after checking that it lies within the MOVIES_BASE_DIRS.
+    """
     # Validate the file path (ensure it's within allowed directories)
-    movie_file_path = unquote(movie_file_path)
-    movie_file_path = os.path.abspath(movie_file_path)  # Get absolute path
-    allowed = any(movie_file_path.startswith(base_dir) for base_dir in MOVIES_BASE_DIRS)
-    if not allowed or not os.path.isfile(movie_file_path):
+    movie_file_path = resolve_movie_file(unquote(movie_file_path))
+    if not movie_file_path:
         abort(404, "Invalid or non-existent movie file.")
 
     try:
-        return send_file(movie_file_path, mimetype='video/mp4', conditional=True)
-    except Exception as e:
+        if file_offload.mode:
+            return file_offload.send(movie_file_path, mimetype=video_mimetype(movie_file_path))
+        return stream_file(movie_file_path)
+    except OSError as e:
         logging.error(f"Error serving file {movie_file_path}: {e}")
         abort(500, "Internal server error.")
 
@@ -1195,15 +1758,17 @@ def serve_subtitle(folder_name, subtitle_file):
     # We combine folder_name & subtitle_file -> then find in base dirs
     rel_path = os.path.join(folder_name, subtitle_file)
     abs_path = find_file_in_base_dirs(rel_path)
-    if not abs_path or not os.path.isfile(abs_path):
+    if not abs_path:
         abort(404, description="Subtitle file not found")
 
-    # If the subtitle is in SRT format, convert it to VTT on the fly
+    # If the subtitle is in SRT format, serve its (cached) VTT conversion
     if subtitle_file.lower().endswith('.srt'):
-        vtt_content = convert_srt_to_vtt(abs_path)
-        return Response(vtt_content, mimetype='text/vtt')
-    # Otherwise, just serve the file
-    return send_file(abs_path, mimetype='text/vtt')
+        try:
+            abs_path = subtitle_cache.vtt_path(abs_path)
+        except OSError as e:
+            logging.error(f"Error converting subtitle {abs_path}: {e}")
+            abort(500, "Internal server error.")
+    return file_offload.send(abs_path, mimetype='text/vtt')
 
 @app.route('/movie_player/<movie_file_path>')
 def movie_player(movie_file_path):
@@ -1220,10 +1785,14 @@ def movie_player(movie_file_path):
     # Detect subtitle files in the same folder
     # Extract the directory path
     directory_path = os.path.dirname(movie_file_path)
-    subtitles = []
-    for file in os.listdir(directory_path):
-        if file.lower().endswith(('.srt', '.vtt')):
-            subtitles.append(file)
+    folder = media_index.folder_for_path(directory_path) if media_index.ready else None
+    if folder:
+        subtitles = list(folder.subtitles)
+    else:
+        subtitles = []
+        for file in os.listdir(directory_path):
+            if file.lower().endswith(('.srt', '.vtt')):
+                subtitles.append(file)
     logging.info(f"Found subtitles: {subtitles}")
     print(f"movie_file_path: {movie_file_path}")
     # print(f"Filename: {filename}")
@@ -1237,30 +1806,22 @@ def movie_player(movie_file_path):
 from urllib.parse import unquote
 @app.route("/play_movie/<path:movie_file_path>")
 def play_movie(movie_file_path):
-    movie_file_path = unquote(movie_file_path)
-    if not os.path.isfile(movie_file_path):
-        abort(404, description="File not found")
+    return stream_movie_file(movie_file_path)
 
-    # Provide the correct MIME type, if known.
-    print("play_movie", movie_file_path, "!"*20)
-    return send_file(movie_file_path, mimetype="video/mp4")
-
-
-from flask import Response
-
-def convert_srt_to_vtt(srt_path):
-    with open(srt_path, 'r', encoding='utf-8') as srt_file:
-        content = srt_file.read()
-    # Simple conversion: replace commas with periods in timestamps
-    content = content.replace(',', '.')
-    return 'WEBVTT\n\n' + content
 
 # For validating a single movie file:
 def validate_movie_file(movie):
     """
     Check if the movie file path is valid across the multiple directories.
     `movie['folder_name']` and `movie['moviefilename']` are used to locate the file.
+    Movies synced by library_scanner.py (movie_exist not NULL) are taken from
+    the database without looking at the disk.
     """
+    if movie.get('movie_exist') is not None:
+        if movie['movie_exist'] and movie.get('full_folder_path') and movie.get('moviefilename'):
+            return os.path.join(movie['full_folder_path'], movie['moviefilename'])
+        return None
+
     folder_name = movie.get('folder_name', '')
 
     if not folder_name:
@@ -1271,5 +1832,75 @@ def validate_movie_file(movie):
     
     return found_path
 
+# -------------------------------------------------------------------------
+# CACHE WARMUP (fill the cache for the hot views after a restart)
+# -------------------------------------------------------------------------
+
+CACHE_WARMUP_ON_IMPORT = os.environ.get('CACHE_WARMUP') == '1'  # For WSGI servers, which never run __main__
+CACHE_WARMUP_WORKERS = 4
+
+
+def _warm_url(url):
+    """Request a view like a client would, so the response lands under the same cache key."""
+    response = app.test_client().get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} returned {response.status_code}")
+
+
+def theme_genres():
+    """The genres with a theme carousel of their own, in theme order."""
+    genres = []
+    for theme in themes:
+        for genre in re.findall(r"genre = '([^']+)'", theme['sql_condition']):
+            if genre not in genres:
+                genres.append(genre)
+    return genres
+
+
+def warm_cache():
+    """
+    Precompute the first unfiltered page of every sort option (Zufall with the
+    current server seed), the dropdown counts of the empty filter, and the catalog
+    page with its featured carousel, unfiltered and for every theme genre.
+    """
+    start_time = time.time()
+    _, sort_options = build_sort_expression(None)
+
+    # The first page also fills the counts of the empty filter, which all other pages reuse
+    first_url = '/filter_movies?' + urlencode({'sort_by': sort_options[0], 'page': 1})
+    tasks = [(f"first page '{sort_option}'", _warm_url, '/filter_movies?' + urlencode({'sort_by': sort_option, 'page': 1}))
+             for sort_option in sort_options[1:]]
+    tasks.append(("catalog", _warm_url, '/catalog'))
+    tasks += [(f"catalog '{genre}'", _warm_url, '/catalog?' + urlencode({'genres': genre})) for genre in theme_genres()]
+    total = len(tasks) + 1
+
+    try:
+        _warm_url(first_url)
+        logging.info(f"Cache warmup 1/{total}: facet counts and first page '{sort_options[0]}'")
+    except Exception as e:
+        logging.error(f"Cache warmup of {first_url} failed: {e}")
+
+    with ThreadPoolExecutor(max_workers=CACHE_WARMUP_WORKERS) as executor:
+        futures = {executor.submit(func, arg): description for description, func, arg in tasks}
+        for done, future in enumerate(as_completed(futures), start=2):
+            try:
+                future.result()
+                logging.info(f"Cache warmup {done}/{total}: {futures[future]}")
+            except Exception as e:
+                logging.error(f"Cache warmup {done}/{total}: {futures[future]} failed: {e}")
+
+    logging.info(f"Cache warmup finished in {time.time() - start_time:.2f} seconds")
+
+
+def start_cache_warmup():
+    threading.Thread(target=warm_cache, daemon=True).start()
+
+
+if CACHE_WARMUP_ON_IMPORT:
+    start_cache_warmup()
+
 if __name__ == '__main__':
+    # The reloader's parent process only watches files; warm the child that serves
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' and not CACHE_WARMUP_ON_IMPORT:
+        start_cache_warmup()
     app.run(debug=True)
@@ -0,0 +1,132 @@
+"""
+In-memory suggestion index for /autocomplete.
+
+Every suggestion (title, actor, crew member, single keyword) is indexed under
+the normalized text starting at each of its words, so 'wil' finds 'Bruce Willis'
+and 'dark kn' finds 'The Dark Knight'. Keys live in a sorted list for bisect
+prefix lookups; for the short prefixes of the first keystrokes, where a range
+would cover thousands of keys, the top-k by popularity is precomputed.
+"""
+import bisect
+import heapq
+
+from memory_index import MemoryIndex
+from migrations import column_exists
+from search_index import tokenize
+
+SUGGESTION_TYPES = ('Title', 'Actor', 'Director', 'Keywords')  # Order of the groups in the response
+TOP_K = 10
+SHORT_PREFIX_LENGTHS = (2, 3)  # Prefix lengths with precomputed top-k lists
+
+
+def _parse_votes(votes):
+    """Parse vote counts stored as text with thousands separators ('1,234')."""
+    try:
+        return int(str(votes).replace(',', '').replace('.', ''))
+    except (TypeError, ValueError):
+        return 0
+
+
+class _Suggestions:
+    """Sorted word-start keys of one suggestion type plus top-k lists for short prefixes."""
+
+    def __init__(self, entries):
+        self.entries = entries  # [(name, id, weight, texts)]
+        keyed = []
+        for entry_index, (_, _, _, texts) in enumerate(entries):
+            for text in texts:
+                words = tokenize(text)
+                for start in range(len(words)):
+                    keyed.append((' '.join(words[start:]), entry_index))
+        keyed.sort()
+        self.keys = [key for key, _ in keyed]
+        self.refs = [entry_index for _, entry_index in keyed]
+
+        groups = {}
+        for key, entry_index in keyed:
+            for length in SHORT_PREFIX_LENGTHS:
+                if len(key) >= length:
+                    groups.setdefault(key[:length], set()).add(entry_index)
+        self.top = {prefix: self._best(refs) for prefix, refs in groups.items()}
+
+    def _best(self, refs):
+        return heapq.nlargest(TOP_K, refs, key=lambda entry_index: self.entries[entry_index][2])
+
+    def lookup(self, prefix):
+        """Return the top-k entries with a word-start key beginning with `prefix`."""
+        if len(prefix) in SHORT_PREFIX_LENGTHS:
+            refs = self.top.get(prefix, [])
+        else:
+            start = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + '\uffff', start)
+            refs = self._best(set(self.refs[start:end]))
+        return [self.entries[entry_index] for entry_index in refs]
+
+
+class AutocompleteIndex(MemoryIndex):
+    name = 'Autocomplete index'
+
+    def load(self, connection):
+        cursor = connection.cursor(dictionary=True)
+        try:
+            # imdb_votes_num comes with migration 3; until it is applied, parse the text column
+            numeric_votes = column_exists(cursor, 'movies', 'imdb_votes_num')
+            cursor.execute(f"""
+                SELECT movie_id, title, original_title, format_orig_titel,
+                       {'imdb_votes_num' if numeric_votes else 'imdb_votes'} AS votes, rating
+                FROM movies
+                WHERE title IS NOT NULL
+            """)
+            titles = [(row['title'], row['movie_id'],
+                       ((row['votes'] or 0) if numeric_votes else _parse_votes(row['votes']), row['rating'] or 0),
+                       (row['title'], row['original_title'], row['format_orig_titel']))
+                      for row in cursor.fetchall()]
+
+            cursor.execute("""
+                SELECT name, MIN(id) AS id, SUM(popularity) AS popularity
+                FROM movie_cast
+                WHERE name IS NOT NULL
+                GROUP BY name
+            """)
+            actors = [(row['name'], row['id'], row['popularity'] or 0, (row['name'],))
+                      for row in cursor.fetchall()]
+
+            cursor.execute("""
+                SELECT name, MIN(id) AS id, COUNT(DISTINCT movie_id) AS movies
+                FROM crew
+                WHERE name IS NOT NULL
+                GROUP BY name
+            """)
+            crew = [(row['name'], row['id'], row['movies'], (row['name'],))
+                    for row in cursor.fetchall()]
+
+            # Split the comma-separated keyword blobs into single keywords, weighted by movie count
+            cursor.execute("SELECT movie_id, keywords FROM movies WHERE keywords IS NOT NULL AND keywords <> ''")
+            keyword_movies = {}
+            for row in cursor.fetchall():
+                for keyword in row['keywords'].split(','):
+                    keyword = keyword.strip()
+                    if keyword:
+                        keyword_movies.setdefault(keyword.lower(), [keyword, row['movie_id'], 0])[2] += 1
+            keywords = [(name, movie_id, count, (name,)) for name, movie_id, count in keyword_movies.values()]
+        finally:
+            cursor.close()
+
+        return {
+            'Title': _Suggestions(titles),
+            'Actor': _Suggestions(actors),
+            'Director': _Suggestions(crew),
+            'Keywords': _Suggestions(keywords),
+        }
+
+    def suggest(self, query):
+        """Return suggestions as [{'name', 'type', 'id'}], up to TOP_K per type."""
+        prefix = ' '.join(tokenize(query))
+        if not prefix:
+            return []
+        state = self._state
+        suggestions = []
+        for suggestion_type in SUGGESTION_TYPES:
+            for name, entry_id, _, _ in state[suggestion_type].lookup(prefix):
+                suggestions.append({'name': name, 'type': suggestion_type, 'id': entry_id})
+        return suggestions
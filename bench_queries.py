@@ -0,0 +1,129 @@
+"""
+Timing benchmark for the hot queries, to record the effect of the schema
+migrations (see migrations.py).
+
+Runs the filter counts, dropdown counts, sorted list pages, detail, similar
+and director lookups of the app REPEAT times each and records the median
+time per query under a label in TIMINGS_FILE, together with the schema
+version. A run with another label is compared against the `before` run.
+
+    python bench_queries.py before     # record the timings before migrating
+    python migrations.py
+    python bench_queries.py after      # record again and print before -> after
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+import mysql.connector
+from mysql.connector import errorcode
+from check_query_plans import fetch_sample_filters
+from filter_query import FilterQuery
+from migrations import applied_versions
+from movie_details import DETAIL_QUERY
+from vars import db_name, db_passwd, db_user
+
+TIMINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_timings.json')
+REPEAT = 7
+PAGE_SIZE = 12
+BASELINE_LABEL = 'before'
+
+
+def build_queries(cursor):
+    """(name, sql, params) for every benchmarked query, with values picked from the data."""
+    samples = fetch_sample_filters(cursor)
+    try:
+        cursor.execute("SELECT movie_id FROM movie_similar GROUP BY movie_id ORDER BY COUNT(*) DESC LIMIT 1")
+        row = cursor.fetchone()
+        similar_id = row['movie_id'] if row else None
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
+        similar_id = None  # build_similar_movies.py never ran
+    cursor.execute("SELECT name FROM crew WHERE job = 'Director' GROUP BY name ORDER BY COUNT(*) DESC LIMIT 1")
+    director = cursor.fetchone()['name']
+    cursor.execute("SELECT movie_id FROM movies ORDER BY movie_id LIMIT 20")
+    detail_ids = [row['movie_id'] for row in cursor.fetchall()]
+
+    queries = []
+    for name in ('genres', 'countries', 'years', 'decades', 'standorte'):
+        filter_query = FilterQuery(**samples[name])
+        queries.append((f"count {name}", *filter_query.count_query()))
+    everything = FilterQuery()
+    for field in ('genre', 'country', 'release_date', 'standort'):
+        queries.append((f"dropdown counts {field}", *everything.facet_count_query(field)))
+    genre_filter = FilterQuery(**samples['genres'])
+    queries.append(("dropdown counts country | genre", *genre_filter.facet_count_query('country')))
+
+    for label, order_by in (("title", "m.title ASC"), ("year", "m.release_date DESC"), ("runtime", "m.runtime DESC"),
+                            ("rating", "m.rating DESC")):
+        queries.append((f"page sorted by {label}",
+                        f"SELECT m.movie_id, m.title FROM movies m ORDER BY {order_by}, m.movie_id LIMIT %s", (PAGE_SIZE,)))
+    queries.append(("page genre sorted by year",
+                    f"SELECT m.movie_id, m.title FROM movies m WHERE {genre_filter.where_clause} "
+                    f"ORDER BY m.release_date DESC, m.movie_id LIMIT %s", tuple(genre_filter.params) + (PAGE_SIZE,)))
+
+    queries.append(("detail x20", DETAIL_QUERY.format(placeholders=','.join(['%s'] * len(detail_ids))), tuple(detail_ids)))
+    if similar_id is not None:
+        queries.append(("similar neighbors",
+                        "SELECT similar_movie_id, score FROM movie_similar WHERE movie_id = %s ORDER BY score DESC LIMIT 50",
+                        (similar_id,)))
+    queries.append(("director theme",
+                    "SELECT m.movie_id FROM movies m WHERE m.movie_id IN "
+                    "(SELECT movie_id FROM crew WHERE job = 'Director' AND name = %s)", (director,)))
+    queries.append(("top actors",
+                    "SELECT name FROM movie_cast WHERE movie_id = %s ORDER BY popularity DESC LIMIT 3", (detail_ids[0],)))
+    return queries
+
+
+def time_query(cursor, sql, params):
+    durations = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def main():
+    label = sys.argv[1] if len(sys.argv) > 1 else 'current'
+    cnx = mysql.connector.connect(host='localhost', user=db_user, password=db_passwd, database=db_name)
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        queries = build_queries(cursor)
+        timings = {name: round(time_query(cursor, sql, params), 2) for name, sql, params in queries}
+        version_cursor = cnx.cursor()
+        schema_version = max(applied_versions(version_cursor), default=0)
+        version_cursor.close()
+    finally:
+        cursor.close()
+        cnx.close()
+
+    results = {}
+    if os.path.exists(TIMINGS_FILE):
+        with open(TIMINGS_FILE, encoding='utf-8') as f:
+            results = json.load(f)
+    results[label] = {'schema_version': schema_version, 'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                      'timings': timings}
+    with open(TIMINGS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+
+    baseline = results.get(BASELINE_LABEL) if label != BASELINE_LABEL else None
+    if baseline:
+        print(f"Median ms, '{BASELINE_LABEL}' (schema {baseline['schema_version']}) -> '{label}' (schema {schema_version})")
+    else:
+        print(f"Median ms, '{label}' (schema {schema_version})")
+    for name, ms in timings.items():
+        before = baseline['timings'].get(name) if baseline else None
+        if before is None:
+            print(f"    {name:<36} {ms:>9.2f}")
+        else:
+            print(f"    {name:<36} {before:>9.2f} -> {ms:>9.2f}  ({before / ms if ms else 0:.1f}x)")
+    print(f"Recorded as '{label}' in {TIMINGS_FILE}.")
+
+
+if __name__ == "__main__":
+    main()
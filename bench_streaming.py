@@ -0,0 +1,134 @@
+"""
+Throughput benchmark for the Range streaming of movie files.
+
+Simulates clients that seek around in a movie: every client repeatedly asks
+for a random "bytes=N-" range and reads READ_SIZE bytes of it before it seeks
+again, like a player after a jump. Reports requests/s, MB/s and latency
+percentiles (time to first byte and per request).
+
+By default it starts the streaming code on a local werkzeug server over a
+temporary test file, so it runs without the database and the movie drives:
+
+    python bench_streaming.py                      # 16 clients, 30 s
+    python bench_streaming.py 64 60                # 64 clients, 60 s
+    python bench_streaming.py 16 30 http://127.0.0.1:8080/play_movie/E:/Movies/Katalog/x/x.mkv
+"""
+import http.client
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from range_streaming import stream_file
+
+TEST_FILE_SIZE = 512 * 1024 * 1024
+READ_SIZE = 4 * 1024 * 1024  # Bytes a client reads before seeking again
+
+
+def make_test_file():
+    f = tempfile.NamedTemporaryFile(suffix='.mkv', delete=False)
+    block = os.urandom(1024 * 1024)
+    for _ in range(TEST_FILE_SIZE // len(block)):
+        f.write(block)
+    f.close()
+    return f.name
+
+
+def start_server(path):
+    app = Flask(__name__)
+    app.add_url_rule('/movie', 'movie', lambda: stream_file(path))
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No access log line per request
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/movie"
+
+
+def file_size(url):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.netloc)
+    connection.request('HEAD', parts.path)
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return int(response.headers['Content-Length'])
+
+
+def client(url, size, deadline, results):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.netloc)
+    while time.time() < deadline:
+        offset = random.randrange(0, max(size - READ_SIZE, 1))
+        start = time.perf_counter()
+        connection.request('GET', parts.path, headers={'Range': f"bytes={offset}-"})
+        response = connection.getresponse()
+        if response.status != 206:
+            results.append(('error', response.status))
+            response.read()
+            continue
+        first = response.read(64 * 1024)
+        first_byte = time.perf_counter() - start
+        received = len(first) + len(response.read(READ_SIZE - len(first)))
+        # The player seeks again: drop the connection instead of reading the rest
+        connection.close()
+        connection = http.client.HTTPConnection(parts.netloc)
+        results.append(('ok', received, first_byte, time.perf_counter() - start))
+    connection.close()
+
+
+def percentile(values, p):
+    return sorted(values)[min(int(len(values) * p), len(values) - 1)]
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    url = sys.argv[3] if len(sys.argv) > 3 else None
+
+    server = test_file = None
+    if url is None:
+        print(f"Writing a {TEST_FILE_SIZE // 2**20} MB test file...")
+        test_file = make_test_file()
+        server, url = start_server(test_file)
+
+    try:
+        size = file_size(url)
+        results = []
+        deadline = time.time() + duration
+        threads = [threading.Thread(target=client, args=(url, size, deadline, results)) for _ in range(clients)]
+        print(f"{clients} seeking clients for {duration:.0f} s against {url}")
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+    finally:
+        if server:
+            server.shutdown()
+        if test_file:
+            os.remove(test_file)
+
+    ok = [result for result in results if result[0] == 'ok']
+    errors = len(results) - len(ok)
+    if not ok:
+        print(f"No successful requests ({errors} errors).")
+        exit(1)
+    received = sum(result[1] for result in ok)
+    first_bytes = [result[2] * 1000 for result in ok]
+    totals = [result[3] * 1000 for result in ok]
+    print(f"Requests:    {len(ok)} ok, {errors} errors, {len(ok) / elapsed:.1f}/s")
+    print(f"Throughput:  {received / elapsed / 2**20:.1f} MB/s")
+    print(f"First byte:  p50 {statistics.median(first_bytes):.1f} ms, p95 {percentile(first_bytes, 0.95):.1f} ms")
+    print(f"Per request: p50 {statistics.median(totals):.1f} ms, p95 {percentile(totals, 0.95):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
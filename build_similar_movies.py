@@ -0,0 +1,167 @@
+import math
+import heapq
+
+import mysql.connector
+from mysql.connector import errorcode
+from tqdm import tqdm  # For progress bar
+from vars import db_name, db_passwd, db_user
+
+# Database configuration
+db_config = {
+    'host': 'localhost',
+    'user': db_user,
+    'password': db_passwd,
+    'database': db_name
+}
+
+# Number of neighbors stored per movie (the similar view shows up to 50)
+TOP_N = 50
+
+# Keywords on more than this share of all movies ('based on novel', ...) say
+# nothing about similarity and would make the pair scoring quadratic
+MAX_DF_RATIO = 0.02
+
+INSERT_BATCH_SIZE = 5000
+
+
+def connect_to_database():
+    """
+    Establishes a connection to the MySQL database.
+    """
+    try:
+        cnx = mysql.connector.connect(**db_config)
+        cursor = cnx.cursor(dictionary=True)
+        print("Successfully connected to the database.")
+        return cnx, cursor
+    except mysql.connector.Error as err:
+        handle_database_error(err)
+
+def handle_database_error(err):
+    """
+    Handles database connection errors.
+    """
+    if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
+        print("Error: Incorrect database username or password.")
+    elif err.errno == errorcode.ER_BAD_DB_ERROR:
+        print("Error: Database does not exist.")
+    else:
+        print(f"Database error: {err}")
+    exit(1)
+
+def create_movie_similar_table(cursor, cnx):
+    """
+    Creates the 'movie_similar' neighbor table if it does not exist.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movie_similar (
+            movie_id INT NOT NULL,
+            similar_movie_id INT NOT NULL,
+            score FLOAT NOT NULL,
+            PRIMARY KEY (movie_id, similar_movie_id),
+            KEY idx_movie_similar_score (movie_id, score)
+        ) ENGINE=InnoDB;
+    """)
+    cnx.commit()
+
+def fetch_movie_keywords(cursor):
+    """
+    Returns {movie_id: set of normalized keywords} for all movies with keywords.
+    """
+    cursor.execute("SELECT movie_id, keywords FROM movies WHERE keywords IS NOT NULL AND keywords <> ''")
+    movie_keywords = {}
+    for row in cursor.fetchall():
+        keywords = {kw.strip().lower() for kw in row['keywords'].split(',') if kw.strip()}
+        if keywords:
+            movie_keywords[row['movie_id']] = keywords
+    return movie_keywords
+
+def build_tfidf_vectors(movie_keywords):
+    """
+    Turns the keyword sets into L2-normalized TF-IDF vectors ({keyword: weight}).
+    Keywords that occur only once or on too many movies are dropped.
+    """
+    document_frequency = {}
+    for keywords in movie_keywords.values():
+        for keyword in keywords:
+            document_frequency[keyword] = document_frequency.get(keyword, 0) + 1
+
+    total_movies = len(movie_keywords)
+    max_df = max(2, int(total_movies * MAX_DF_RATIO))
+    idf = {
+        keyword: math.log(total_movies / df)
+        for keyword, df in document_frequency.items()
+        if 2 <= df <= max_df
+    }
+
+    vectors = {}
+    for movie_id, keywords in movie_keywords.items():
+        vector = {keyword: idf[keyword] for keyword in keywords if keyword in idf}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if norm:
+            vectors[movie_id] = {keyword: weight / norm for keyword, weight in vector.items()}
+    return vectors
+
+def compute_neighbors(vectors):
+    """
+    Yields (movie_id, [(similar_movie_id, cosine score), ...]) with the TOP_N
+    neighbors per movie. Only movies sharing at least one keyword are scored,
+    via an inverted keyword index, so the work grows with the overlap instead
+    of with all movie pairs.
+    """
+    postings = {}
+    for movie_id, vector in vectors.items():
+        for keyword, weight in vector.items():
+            postings.setdefault(keyword, []).append((movie_id, weight))
+
+    for movie_id, vector in tqdm(vectors.items(), desc="Scoring neighbors"):
+        scores = {}
+        for keyword, weight in vector.items():
+            for other_id, other_weight in postings[keyword]:
+                if other_id != movie_id:
+                    scores[other_id] = scores.get(other_id, 0.0) + weight * other_weight
+        yield movie_id, heapq.nlargest(TOP_N, scores.items(), key=lambda item: item[1])
+
+def write_neighbors(cursor, cnx, neighbors):
+    """
+    Writes all neighbors into a fresh copy of the table and swaps it in with one
+    RENAME TABLE, so the app never reads a half-written neighbor table.
+    """
+    cursor.execute("DROP TABLE IF EXISTS movie_similar_new")
+    cursor.execute("CREATE TABLE movie_similar_new LIKE movie_similar")
+
+    insert_query = "INSERT INTO movie_similar_new (movie_id, similar_movie_id, score) VALUES (%s, %s, %s)"
+    batch = []
+    total_rows = 0
+    for movie_id, similar in neighbors:
+        batch.extend((movie_id, similar_id, round(score, 5)) for similar_id, score in similar)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            cursor.executemany(insert_query, batch)
+            cnx.commit()
+            total_rows += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(insert_query, batch)
+        cnx.commit()
+        total_rows += len(batch)
+
+    cursor.execute("RENAME TABLE movie_similar TO movie_similar_old, movie_similar_new TO movie_similar")
+    cursor.execute("DROP TABLE movie_similar_old")
+    cnx.commit()
+    return total_rows
+
+def main():
+    cnx, cursor = connect_to_database()
+    create_movie_similar_table(cursor, cnx)
+
+    movie_keywords = fetch_movie_keywords(cursor)
+    print(f"Vectorizing keywords of {len(movie_keywords)} movies...")
+    vectors = build_tfidf_vectors(movie_keywords)
+
+    total_rows = write_neighbors(cursor, cnx, compute_neighbors(vectors))
+
+    cursor.close()
+    cnx.close()
+    print(f"Similar movies table rebuilt with {total_rows} neighbor rows.")
+
+if __name__ == "__main__":
+    main()
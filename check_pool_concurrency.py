@@ -0,0 +1,101 @@
+"""
+Concurrency check for the database connection pool.
+
+Fires a burst of parallel requests at database-backed views (different filter
+pages, so the response cache doesn't answer them) and checks that the app
+degrades gracefully: requests beyond the pool size wait for a connection
+instead of failing. Prints status codes, latency percentiles and the pool
+gauges afterwards; exits with 1 if any request failed.
+
+    python check_pool_concurrency.py                             # 50 requests, in-process test client
+    python check_pool_concurrency.py 100                         # 100 requests
+    python check_pool_concurrency.py 50 http://127.0.0.1:5000    # against a running server
+"""
+import collections
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+SORT_OPTIONS = ('Titel asc', 'Titel desc', 'Jahr asc', 'Jahr desc', 'Bewertung desc')
+
+
+def make_urls(count):
+    urls = []
+    for i in range(count):
+        params = {'sort_by': SORT_OPTIONS[i % len(SORT_OPTIONS)], 'page': i // len(SORT_OPTIONS) + 2}
+        urls.append('/filter_movies?' + urlencode(params))
+    return urls
+
+
+def remote_get(base_url):
+    def get(url):
+        try:
+            with urllib.request.urlopen(base_url + url, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return get
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    base_url = sys.argv[2].rstrip('/') if len(sys.argv) > 2 else None
+
+    if base_url:
+        get = remote_get(base_url)
+
+        def pool_stats():
+            with urllib.request.urlopen(base_url + '/pool_stats') as response:
+                return json.load(response)
+    else:
+        import app
+        client = app.app.test_client()
+
+        def get(url):
+            return client.get(url).status_code
+        pool_stats = app.connection_pool.stats
+
+    barrier = threading.Barrier(count)
+    results = []
+
+    def worker(url):
+        barrier.wait()  # Start all requests at the same moment
+        start = time.perf_counter()
+        try:
+            status = get(url)
+        except Exception as e:
+            status = f"{type(e).__name__}: {e}"
+        results.append((status, time.perf_counter() - start))
+
+    threads = [threading.Thread(target=worker, args=(url,)) for url in make_urls(count)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    statuses = collections.Counter(status for status, _ in results)
+    latencies = sorted(duration * 1000 for _, duration in results)
+    print(f"{count} parallel requests in {elapsed:.2f} s")
+    for status, n in sorted(statuses.items(), key=str):
+        print(f"    {status}: {n}")
+    print(f"Latency: p50 {statistics.median(latencies):.0f} ms, "
+          f"p95 {latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]:.0f} ms, max {latencies[-1]:.0f} ms")
+    print(f"Pool: {pool_stats()}")
+
+    failures = sum(n for status, n in statuses.items() if status != 200)
+    if failures:
+        print(f"FAIL {failures} requests did not succeed.")
+        exit(1)
+    print("OK all requests succeeded.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+EXPLAIN regression check for the /filter_movies queries.
+
+Builds the count, id and dropdown count queries of FilterQuery for every
+combination of the filters (search, genres, years, decades, countries,
+standorte, media), runs EXPLAIN on each and checks:
+
+- count and id queries touch no table that their filters don't need and
+  never use a temporary table or a filesort,
+- no query reads movies, movie_cast or crew in full (type ALL), unless its
+  only filters can't use an index anyway or it is in FULL_SCAN_ALLOWLIST,
+- no plan got worse than the one recorded in the baseline file (access type
+  per table, new 'Using temporary' / 'Using filesort').
+
+    python check_query_plans.py            # check, exit code 1 on regressions
+    python check_query_plans.py --update   # record the current plans as baseline
+"""
+import itertools
+import json
+import os
+import sys
+
+import mysql.connector
+from mysql.connector import errorcode
+from filter_query import FilterQuery, FACET_FIELDS
+from vars import db_name, db_passwd, db_user
+
+# Database configuration
+db_config = {
+    'host': 'localhost',
+    'user': db_user,
+    'password': db_passwd,
+    'database': db_name
+}
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_plans.json')
+
+# EXPLAIN access types from best to worst
+ACCESS_TYPES = ('system', 'const', 'eq_ref', 'ref', 'fulltext', 'ref_or_null', 'index_merge',
+                'unique_subquery', 'index_subquery', 'range', 'index', 'ALL')
+WATCHED_EXTRAS = ('Using temporary', 'Using filesort')
+
+# Tables (by the name or alias EXPLAIN reports) a filter may add to a query
+FILTER_TABLES = {
+    'search': {'cr', 'mc'},
+    'genres': {'genres'},
+    'countries': {'countries'},
+}
+FACET_QUERY_FIELDS = tuple(FACET_FIELDS) + ('media',)
+
+# Large tables (by the name or alias EXPLAIN reports) that must never be scanned in full
+LARGE_TABLES = {'m': 'movies', 'movies': 'movies', 'mc': 'movie_cast', 'movie_cast': 'movie_cast',
+                'cr': 'crew', 'crew': 'crew'}
+# Filters no index can answer (LIKE '%...%', ORed format_* > 0): with only these, movies is read in full anyway
+UNINDEXED_FILTERS = {'search', 'media'}
+# Known, accepted full scans: 'case:query' -> table names/aliases
+FULL_SCAN_ALLOWLIST = {}
+
+
+def connect_to_database():
+    """
+    Establishes a connection to the MySQL database.
+    """
+    try:
+        cnx = mysql.connector.connect(**db_config)
+        return cnx, cnx.cursor(dictionary=True)
+    except mysql.connector.Error as err:
+        if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
+            print("Error: Incorrect database username or password.")
+        elif err.errno == errorcode.ER_BAD_DB_ERROR:
+            print("Error: Database does not exist.")
+        else:
+            print(f"Database error: {err}")
+        exit(1)
+
+def fetch_sample_filters(cursor):
+    """
+    Picks a realistic value for every filter from the data, so the plans are
+    computed with the selectivity the app actually sees.
+    """
+    cursor.execute("SELECT genre FROM genres GROUP BY genre ORDER BY COUNT(*) DESC LIMIT 1")
+    genre = cursor.fetchone()['genre']
+    cursor.execute("SELECT country FROM countries GROUP BY country ORDER BY COUNT(*) DESC LIMIT 1")
+    country = cursor.fetchone()['country']
+    cursor.execute("SELECT standort FROM movies WHERE standort IS NOT NULL GROUP BY standort ORDER BY COUNT(*) DESC LIMIT 1")
+    standort = cursor.fetchone()['standort']
+    cursor.execute("SELECT release_date FROM movies WHERE release_date IS NOT NULL GROUP BY release_date ORDER BY COUNT(*) DESC LIMIT 1")
+    year = int(cursor.fetchone()['release_date'])
+
+    return {
+        'search': {'search_query': 'star'},
+        'genres': {'genres': [genre]},
+        'years': {'years': [str(year)]},
+        'decades': {'years': [f"{year // 10 * 10}...{year // 10 * 10 + 9}"]},
+        'countries': {'countries': [country]},
+        'standorte': {'standorte': [standort]},
+        'media': {'media': ['format_dvd', 'format_blu']},
+    }
+
+def build_cases(sample_filters):
+    """Yields (case name, FilterQuery, active filter names) for every filter combination."""
+    names = list(sample_filters)
+    for size in range(len(names) + 1):
+        for active in itertools.combinations(names, size):
+            kwargs = {}
+            for name in active:
+                for key, value in sample_filters[name].items():
+                    kwargs[key] = kwargs.get(key, []) + value if isinstance(value, list) else value
+            yield '+'.join(active) or 'none', FilterQuery(**kwargs), active
+
+def explain(cursor, sql, params):
+    """Returns the EXPLAIN rows as [{'table', 'type', 'key', 'extra'}]."""
+    cursor.execute("EXPLAIN " + sql, params)
+    return [{
+        'table': row['table'],
+        'type': row['type'],
+        'key': row['key'],
+        'extra': row['Extra'] or '',
+    } for row in cursor.fetchall()]
+
+def check_structure(key, query_name, plan, active):
+    """Checks the rules that hold independent of the baseline."""
+    problems = []
+    for row in plan:
+        table = row['table'] or ''
+        if row['type'] != 'ALL' or table not in LARGE_TABLES:
+            continue
+        if LARGE_TABLES[table] == 'movies' and set(active) <= UNINDEXED_FILTERS:
+            continue
+        if table not in FULL_SCAN_ALLOWLIST.get(key, ()):
+            problems.append(f"full scan of '{table}' ({LARGE_TABLES[table]})")
+    if query_name in ('count', 'ids'):
+        allowed_tables = {'m'}
+        for name in active:
+            allowed_tables |= FILTER_TABLES.get(name, set())
+        for row in plan:
+            table = row['table'] or ''
+            # '<subqueryN>' / '<derivedN>' are the optimizer's own materializations
+            if not table.startswith('<') and table not in allowed_tables:
+                problems.append(f"joins table '{table}' no filter needs")
+            for extra in WATCHED_EXTRAS:
+                if extra in row['extra']:
+                    problems.append(f"{extra} on '{table}'")
+    return problems
+
+def compare_to_baseline(plan, baseline_plan):
+    """Returns the differences where `plan` is worse than `baseline_plan`."""
+    problems = []
+    baseline_rows = {row['table']: row for row in baseline_plan}
+    for row in plan:
+        old = baseline_rows.get(row['table'])
+        if old is None:
+            continue
+        if (row['type'] in ACCESS_TYPES and old['type'] in ACCESS_TYPES
+                and ACCESS_TYPES.index(row['type']) > ACCESS_TYPES.index(old['type'])):
+            problems.append(f"'{row['table']}' access {old['type']} -> {row['type']}")
+        for extra in WATCHED_EXTRAS:
+            if extra in row['extra'] and extra not in old['extra']:
+                problems.append(f"'{row['table']}' now {extra}")
+    return problems
+
+def main():
+    update = '--update' in sys.argv[1:]
+    cnx, cursor = connect_to_database()
+
+    baseline = {}
+    if not update and os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding='utf-8') as f:
+            baseline = json.load(f)
+    elif not update:
+        print(f"No baseline at {BASELINE_FILE}, checking the structural rules only.")
+
+    plans = {}
+    failures = []
+    for case_name, filter_query, active in build_cases(fetch_sample_filters(cursor)):
+        queries = {'count': filter_query.count_query(), 'ids': filter_query.ids_query()}
+        for field in FACET_QUERY_FIELDS:
+            queries[f"counts_{field}"] = filter_query.facet_count_query(field)
+
+        for query_name, (sql, params) in queries.items():
+            key = f"{case_name}:{query_name}"
+            plan = explain(cursor, sql, params)
+            plans[key] = plan
+            problems = check_structure(key, query_name, plan, active)
+            if key in baseline:
+                problems += compare_to_baseline(plan, baseline[key])
+            failures.extend(f"{key}: {problem}" for problem in problems)
+
+    cursor.close()
+    cnx.close()
+
+    if update:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(plans, f, indent=1, sort_keys=True)
+        print(f"Recorded {len(plans)} query plans in {BASELINE_FILE}.")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"Checked {len(plans)} query plans, {len(failures)} problems.")
+    if failures:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Blocking MySQL connection pool with health checks and usage gauges.
+
+mysql.connector's MySQLConnectionPool raises "pool exhausted" as soon as all
+connections are checked out, and pings every connection on every checkout.
+This pool instead
+
+- lets a request wait (up to `wait_timeout` seconds) for a free connection,
+  then raises PoolTimeout - a mysql.connector PoolError, so the existing
+  `except mysql.connector.Error` handlers cover it,
+- opens connections lazily, up to `size`,
+- pings a connection only if it sat idle longer than `ping_after` seconds and
+  replaces it if the ping fails (e.g. after a MySQL restart) or if it is older
+  than `max_lifetime`,
+- counts checkouts, waits, total and maximum wait time and timeouts,
+- remembers who checked out each connection (`owner`, e.g. the Flask
+  endpoint) and logs it when a connection is held longer than
+  `leak_threshold` seconds, or is garbage-collected without being returned.
+
+`get_connection()` returns a PooledConnection; its close() hands the
+connection back instead of closing it.
+"""
+import collections
+import logging
+import threading
+import time
+import weakref
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+_IdleConnection = collections.namedtuple('_IdleConnection', 'connection created_at idle_since')
+
+
+class PooledConnection:
+    """A checked-out connection; attribute access goes to the MySQL connection."""
+
+    def __init__(self, pool, connection, created_at, owner=None):
+        self._pool = pool
+        self._connection = connection
+        self._created_at = created_at
+        self.owner = owner or 'unknown'
+        self.checked_out_at = time.time()
+        self.reported = False  # Already logged as held too long
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(self._connection, name)
+
+    def held_for(self):
+        return time.time() - self.checked_out_at
+
+    def close(self):
+        """Return the connection to the pool (a second close() does nothing)."""
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._pool._release(connection, self._created_at, self)
+
+    def __del__(self):
+        # Nobody called close(): log who leaked it and give the connection back anyway
+        if self.__dict__.get('_connection') is not None:
+            self._pool._leaked(self)
+            self.close()
+
+
+class BlockingPool:
+
+    def __init__(self, size, wait_timeout=10, ping_after=30, max_lifetime=3600, leak_threshold=30, **connect_args):
+        self.size = size
+        self.wait_timeout = wait_timeout
+        self.ping_after = ping_after
+        self.max_lifetime = max_lifetime
+        self.leak_threshold = leak_threshold
+        self.connect_args = connect_args
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._open = 0       # Connections open or being opened, idle ones included
+        self._in_use = 0
+        self._waiting = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.long_holds = 0
+        self.leaks = 0
+        self._checked_out = weakref.WeakSet()
+
+    def get_connection(self, timeout=None, owner=None):
+        """
+        Check out a connection, waiting up to `timeout` (default wait_timeout) seconds
+        for one. `owner` names the code holding it in the leak warnings.
+        """
+        timeout = self.wait_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        idle = None
+        with self._cond:
+            if not self._idle and self._open >= self.size:
+                self._report_long_holds()  # An exhausted pool is where a leak shows first
+                self._waiting += 1
+                try:
+                    if not self._cond.wait_for(lambda: self._idle or self._open < self.size, timeout):
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No free database connection after {timeout} seconds "
+                                          f"({self._in_use} in use, {self._waiting - 1} other requests waiting)")
+                finally:
+                    self._waiting -= 1
+                waited = time.perf_counter() - start
+                self.waits += 1
+                self.wait_time += waited
+                self.max_wait = max(self.max_wait, waited)
+            if self._idle:
+                idle = self._idle.pop()  # Most recently used first, so surplus connections age out
+            else:
+                self._open += 1  # Reserve the slot, connect outside the lock
+            self._in_use += 1
+            self.checkouts += 1
+
+        try:
+            if idle is not None:
+                connection, created_at = self._check(idle)
+            else:
+                connection, created_at = self._connect(), time.time()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        pooled = PooledConnection(self, connection, created_at, owner)
+        with self._cond:
+            self._checked_out.add(pooled)
+        return pooled
+
+    def _connect(self):
+        return mysql.connector.connect(**self.connect_args)
+
+    def _check(self, idle):
+        """Make sure an idle connection is still usable; replace it otherwise."""
+        now = time.time()
+        if now - idle.created_at > self.max_lifetime:
+            self._close_quietly(idle.connection)
+            return self._connect(), time.time()
+        if now - idle.idle_since > self.ping_after:
+            try:
+                idle.connection.ping(reconnect=False)
+            except mysql.connector.Error as err:
+                logging.warning(f"Replacing stale database connection: {err}")
+                self._close_quietly(idle.connection)
+                with self._cond:
+                    self.reconnects += 1
+                return self._connect(), time.time()
+        return idle.connection, idle.created_at
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _report_long_holds(self):
+        """Log every connection held longer than leak_threshold (once each); the caller holds _cond."""
+        if self.leak_threshold is None:
+            return
+        for pooled in list(self._checked_out):
+            held = pooled.held_for()
+            if held > self.leak_threshold and not pooled.reported:
+                pooled.reported = True
+                self.long_holds += 1
+                logging.warning(f"Database connection held for {held:.1f} s by {pooled.owner} and not returned yet")
+
+    def _leaked(self, pooled):
+        with self._cond:
+            self.leaks += 1
+        logging.warning(f"Database connection of {pooled.owner} was garbage-collected without close() "
+                        f"after {pooled.held_for():.1f} s; returning it to the pool")
+
+    def _release(self, connection, created_at, pooled):
+        held = pooled.held_for()
+        if self.leak_threshold is not None and held > self.leak_threshold:
+            if not pooled.reported:
+                with self._cond:
+                    self.long_holds += 1
+            logging.warning(f"Database connection held for {held:.1f} s by {pooled.owner}")
+        try:
+            if connection.in_transaction:
+                connection.rollback()  # Don't hand an open transaction to the next request
+            healthy = True
+        except mysql.connector.Error:
+            healthy = False
+        with self._cond:
+            self._checked_out.discard(pooled)
+            self._in_use -= 1
+            if healthy:
+                self._idle.append(_IdleConnection(connection, created_at, time.time()))
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if not healthy:
+            self._close_quietly(connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 3),
+                'max_wait': round(self.max_wait, 3),
+                'timeouts': self.timeouts,
+                'reconnects': self.reconnects,
+                'long_holds': self.long_holds,
+                'leaks': self.leaks,
+                'checked_out': sorted(([pooled.owner, round(pooled.held_for(), 1)] for pooled in self._checked_out),
+                                      key=lambda item: -item[1]),
+            }
@@ -15,6 +15,8 @@ import mysql.connector
 from mysql.connector import errorcode
 from tqdm import tqdm  # For progress bar
 import math
+import sys
+from migrations import column_exists
 
 
 # Maximum estimated price (for rare collector's items)
@@ -78,10 +80,10 @@ def fetch_movie_data(cursor):
     cursor.execute("""
         SELECT 
             m.movie_id,
-            m.rating,
-            m.imdb_votes,
-            m.tmdb_rating,
-            m.tmdb_votes,
+            m.rating AS imdb_rating,
+            m.imdb_votes_num AS imdb_votes,
+            m.tmdb_rating_num AS tmdb_rating,
+            m.tmdb_votes_num AS tmdb_votes,
             m.format_ausleihen,
             m.release_date
         FROM 
@@ -103,11 +105,11 @@ def calculate_composite_score(movie, total_awards):
     """
     Calculates a composite score based on various factors.
     """
-    # Extract and clean data
-    imdb_rating = float(movie['imdb_rating']) if movie['imdb_rating'] else 0.0
-    imdb_votes = int(movie['imdb_votes'].replace(',', '')) if movie['imdb_votes'] else 0
-    tmdb_rating = float(movie['tmdb_rating']) if movie['tmdb_rating'] else 0.0
-    tmdb_votes = int(movie['tmdb_votes'].replace(',', '')) if movie['tmdb_votes'] else 0
+    # Extract data (votes and ratings come as numeric columns, see migrations.py)
+    imdb_rating = float(movie['imdb_rating'] or 0)
+    imdb_votes = movie['imdb_votes'] or 0
+    tmdb_rating = float(movie['tmdb_rating'] or 0)
+    tmdb_votes = movie['tmdb_votes'] or 0
     format_ausleihen = float(movie['format_ausleihen']) if movie['format_ausleihen'] else 0.0
     release_year = int(movie['release_date']) if movie['release_date'] else 0
 
@@ -186,6 +188,10 @@ def update_estimated_prices(cursor, cnx):
 
 def main():
     cnx, cursor = connect_to_database()
+    if not column_exists(cursor, 'movies', 'imdb_votes_num'):
+        cursor.close()
+        cnx.close()
+        sys.exit("The numeric vote and rating columns are missing; run `python migrations.py` first.")
     add_est_price_column(cursor, cnx)
     update_estimated_prices(cursor, cnx)
     cursor.close()
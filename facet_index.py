@@ -0,0 +1,208 @@
+"""
+In-memory facet index for the dropdown counts of /filter_movies.
+
+Every movie gets a dense bit position. For each value of a facet (genre, year,
+country, standort, media format) we keep one bitmap of positions, stored as a
+plain Python int. A filter combination then becomes a few AND/OR operations and
+each dropdown count is a popcount (int.bit_count) instead of a GROUP BY query.
+"""
+from memory_index import MemoryIndex
+
+MEDIA_FIELDS = ('format_vhs', 'format_dvd', 'format_blu', 'format_blu3')
+
+
+def _bitmap(positions, size):
+    """Build an int bitmap from an iterable of bit positions in O(n)."""
+    buf = bytearray((size + 7) // 8)
+    for pos in positions:
+        buf[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(buf, 'little')
+
+
+class Facet:
+    """Bitmaps for one facet: one per known value plus one for missing values."""
+
+    def __init__(self, values, unknown):
+        self.values = values      # raw value -> bitmap
+        self.unknown = unknown    # movies with NULL/empty value (shown as 'Unknown')
+
+    def union(self, keys):
+        bits = 0
+        for key in keys:
+            bits |= self.values.get(key, 0)
+        return bits
+
+    def counts(self, selection):
+        """Return {value: count} for all values that intersect `selection`."""
+        counts = {}
+        for value, bits in self.values.items():
+            count = (bits & selection).bit_count()
+            if count:
+                counts[value] = count
+        unknown = (self.unknown & selection).bit_count()
+        if unknown:
+            counts['Unknown'] = unknown
+        return counts
+
+
+class FacetIndex(MemoryIndex):
+    """Process-wide facet index, built from the movies, genres and countries tables."""
+    name = 'Facet index'
+
+    def load(self, connection):
+        """Read the facet columns and build all bitmaps."""
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(f"""
+                SELECT movie_id, release_date, standort, {', '.join(MEDIA_FIELDS)}
+                FROM movies
+                ORDER BY movie_id
+            """)
+            movies = cursor.fetchall()
+            cursor.execute("SELECT movie_id, genre FROM genres")
+            genre_rows = cursor.fetchall()
+            cursor.execute("SELECT movie_id, country FROM countries")
+            country_rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        positions = {row['movie_id']: pos for pos, row in enumerate(movies)}
+        size = len(positions)
+
+        years, standorte = {}, {}
+        year_unknown, standort_unknown = [], []
+        media = {field: [] for field in MEDIA_FIELDS}
+        for pos, row in enumerate(movies):
+            if row['release_date']:
+                years.setdefault(row['release_date'], []).append(pos)
+            else:
+                year_unknown.append(pos)
+            if row['standort']:
+                standorte.setdefault(row['standort'], []).append(pos)
+            else:
+                standort_unknown.append(pos)
+            for field in MEDIA_FIELDS:
+                if (row[field] or 0) > 0:
+                    media[field].append(pos)
+
+        state = {
+            'positions': positions,
+            'movie_ids': [row['movie_id'] for row in movies],
+            'all': (1 << size) - 1,
+            'years': self._facet(years, year_unknown, size),
+            'standorte': self._facet(standorte, standort_unknown, size),
+            'genres': self._child_facet(genre_rows, 'genre', positions, size),
+            'countries': self._child_facet(country_rows, 'country', positions, size),
+            'media': {field: _bitmap(pos_list, size) for field, pos_list in media.items()},
+        }
+        return state
+
+    @staticmethod
+    def _facet(value_positions, unknown_positions, size):
+        return Facet({value: _bitmap(pos_list, size) for value, pos_list in value_positions.items()},
+                     _bitmap(unknown_positions, size))
+
+    def _child_facet(self, rows, column, positions, size):
+        """Facet over a child table; movies without any row count as 'Unknown'."""
+        value_positions = {}
+        has_value = set()
+        unknown = set()
+        for row in rows:
+            pos = positions.get(row['movie_id'])
+            if pos is None:
+                continue
+            if row[column]:
+                value_positions.setdefault(row[column], set()).add(pos)
+                has_value.add(pos)
+            else:
+                unknown.add(pos)
+        # Mirrors the LEFT JOIN in get_counts: no child row -> NULL group
+        unknown.update(pos for pos in positions.values() if pos not in has_value)
+        return self._facet(value_positions, unknown, size)
+
+    def bits_for_ids(self, movie_ids):
+        """Bitmap for an explicit set of movie_ids (e.g. the result of a search query)."""
+        state = self._state
+        positions = state['positions']
+        return _bitmap((positions[movie_id] for movie_id in movie_ids if movie_id in positions),
+                       len(positions))
+
+    def facet_values(self, movie_id):
+        """
+        Return the facet values a movie had when the index was built, as
+        {'years', 'genres', 'countries', 'standorte', 'media'} -> set of values.
+        """
+        state = self._state
+        pos = state['positions'].get(movie_id)
+        if pos is None:
+            return {}
+        bit = 1 << pos
+        values = {facet: {value for value, bits in state[facet].values.items() if bits & bit}
+                  for facet in ('years', 'genres', 'countries', 'standorte')}
+        values['media'] = {field for field, bits in state['media'].items() if bits & bit}
+        return values
+
+    def movie_ids(self, selection):
+        """Return the movie_ids of all set bits of a selection bitmap, in movie_id order."""
+        movie_ids = self._state['movie_ids']
+        bits = bin(selection)[:1:-1]  # Bit 0 first
+        return [movie_ids[pos] for pos, bit in enumerate(bits) if bit == '1']
+
+    def select(self, years=(), genres=(), countries=(), standorte=(), media=()):
+        """
+        Evaluate the filter_movies filters as bitmaps. Values within one facet are
+        ORed, different facets are ANDed - the same semantics as the SQL filters.
+        """
+        state = self._state
+        selection = state['all']
+
+        if years:
+            year_bits = 0
+            for year in years:
+                if "..." in year:
+                    start_year = int(year.split("...")[0])
+                    year_bits |= state['years'].union(range(start_year, start_year + 10))
+                else:
+                    year_bits |= state['years'].union([int(year)])
+            selection &= year_bits
+        if genres:
+            selection &= state['genres'].union(genres)
+        if countries:
+            selection &= state['countries'].union(countries)
+        if standorte:
+            selection &= state['standorte'].union(standorte)
+        if media:
+            media_bits = 0
+            for field in media:
+                media_bits |= state['media'].get(field, 0)
+            selection &= media_bits
+
+        return selection
+
+    def counts(self, selection):
+        """
+        Return the dropdown counts for a selection bitmap as
+        (genre_counts, year_counts, country_counts, standorte_counts, media_counts),
+        ordered like the SQL get_counts() results.
+        """
+        state = self._state
+
+        genre_counts = _sorted_by_count(state['genres'].counts(selection))
+        country_counts = _sorted_by_count(state['countries'].counts(selection))
+        year_counts = _sorted_by_value(state['years'].counts(selection))
+        standorte_counts = _sorted_by_value(state['standorte'].counts(selection))
+        media_counts = {field: (bits & selection).bit_count() for field, bits in state['media'].items()}
+
+        return genre_counts, year_counts, country_counts, standorte_counts, media_counts
+
+
+def _sorted_by_count(counts):
+    return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+
+def _sorted_by_value(counts):
+    # 'Unknown' stands for NULL, which MySQL sorts last in DESC order
+    known = sorted((item for item in counts.items() if item[0] != 'Unknown'), key=lambda item: item[0], reverse=True)
+    if 'Unknown' in counts:
+        known.append(('Unknown', counts['Unknown']))
+    return dict(known)
@@ -0,0 +1,68 @@
+"""
+Let the front proxy send large files instead of a Python worker.
+
+With offloading on, a view still resolves and authorizes the path, but answers
+with an empty response carrying `X-Accel-Redirect` (nginx) or `X-Sendfile`
+(Apache mod_xsendfile, lighttpd). The proxy then streams the file itself,
+including Range requests and conditional GETs, and the worker thread is free
+again right away. Without offloading, files go through `send_file` as before.
+
+For nginx every served directory is mapped to an `internal` location; see
+doc/nginx_offload.conf.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import current_app, send_file
+
+OFFLOAD_MODES = ('x-accel', 'x-sendfile')
+
+
+class FileOffload:
+
+    def __init__(self, mode=None, locations=()):
+        """
+        `mode` is None (serve from Python), 'x-accel' or 'x-sendfile'.
+        `locations` is a list of (directory, internal uri prefix) pairs for x-accel.
+        """
+        if mode not in (None,) + OFFLOAD_MODES:
+            raise ValueError(f"Unknown file offload mode: {mode}")
+        self.mode = mode
+        self.locations = [(os.path.normcase(os.path.abspath(directory)), prefix.rstrip('/'))
+                          for directory, prefix in locations]
+
+    def internal_uri(self, path):
+        """The nginx internal URI of a file, or None if it lies outside all mapped directories."""
+        path = os.path.normcase(os.path.abspath(path))
+        for directory, prefix in self.locations:
+            if path.startswith(directory + os.sep):
+                rel_path = os.path.relpath(path, directory).replace(os.sep, '/')
+                return f"{prefix}/{quote(rel_path)}"
+        return None
+
+    def send(self, path, mimetype=None, max_age=None, immutable=False):
+        """
+        Respond with the file at `path` (already resolved and authorized by the caller).
+        `max_age` adds a public Cache-Control, e.g. for images.
+        """
+        target = self.internal_uri(path) if self.mode == 'x-accel' else path
+        if self.mode is None or target is None:
+            response = send_file(path, mimetype=mimetype, conditional=True)
+        else:
+            response = current_app.response_class(mimetype=mimetype or _guess_mimetype(path))
+            response.headers['X-Accel-Redirect' if self.mode == 'x-accel' else 'X-Sendfile'] = target
+            # The proxy answers conditionals from the file; Last-Modified is kept for X-Sendfile
+            response.last_modified = os.stat(path).st_mtime
+
+        if max_age is not None:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            if immutable:
+                response.cache_control.immutable = True
+        return response
+
+
+def _guess_mimetype(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
@@ -0,0 +1,136 @@
+"""
+SQL builder for the filters of /filter_movies.
+
+Every filter on a child table (genres, countries, crew, movie_cast) is written
+as a semi-join (`IN (SELECT ...)` / `EXISTS`) against `movies`, so a filter
+never multiplies rows and counts can use COUNT(*) instead of
+COUNT(DISTINCT ...) over a joined result. A child table is only joined where
+its values are grouped on (the genre and country dropdown counts).
+"""
+from facet_index import MEDIA_FIELDS
+
+# field -> (grouped column, join needed for it, ORDER BY of the dropdown)
+FACET_FIELDS = {
+    'genre': ("g.genre", "LEFT JOIN genres g ON g.movie_id = m.movie_id", "count DESC"),
+    'country': ("c.country", "LEFT JOIN countries c ON c.movie_id = m.movie_id", "count DESC"),
+    'release_date': ("m.release_date", "", "m.release_date DESC"),
+    'standort': ("m.standort", "", "m.standort DESC"),
+}
+
+SEARCH_CONDITION = """
+    (
+        m.title LIKE %s
+        OR m.original_title LIKE %s
+        OR m.keywords LIKE %s
+        OR EXISTS (
+            SELECT 1
+            FROM crew cr
+            WHERE cr.movie_id = m.movie_id
+              AND cr.job = 'Director'
+              AND cr.name LIKE %s
+        )
+        OR EXISTS (
+            SELECT 1
+            FROM movie_cast mc
+            WHERE mc.movie_id = m.movie_id
+              AND mc.name LIKE %s
+        )
+    )
+"""
+
+
+def _placeholders(values):
+    return ','.join(['%s'] * len(values))
+
+
+class FilterQuery:
+    """
+    The WHERE clause for one filter combination plus the queries built on it.
+    `search_ids` are the hits of the in-memory search index; without them a
+    search query falls back to LIKE matching.
+    """
+
+    def __init__(self, years=(), genres=(), countries=(), standorte=(), media=(),
+                 search_query=None, search_ids=None):
+        self.conditions = []
+        self.params = []
+
+        if search_ids is not None:
+            if search_ids:
+                self._add(f"m.movie_id IN ({_placeholders(search_ids)})", search_ids)
+            else:
+                self._add("1=0")
+        elif search_query:
+            self._add(SEARCH_CONDITION, [f"%{search_query}%"] * 5)
+
+        if genres:
+            self._add(f"m.movie_id IN (SELECT movie_id FROM genres WHERE genre IN ({_placeholders(genres)}))", genres)
+
+        # Years, incl. decades like '1990...1999'
+        if years:
+            year_filters = []
+            year_params = []
+            for year in years:
+                if "..." in year:
+                    start_year = int(year.split("...")[0])
+                    year_filters.append("m.release_date BETWEEN %s AND %s")
+                    year_params.extend([start_year, start_year + 9])
+                else:
+                    year_filters.append("m.release_date = %s")
+                    year_params.append(int(year))
+            self._add(f"({' OR '.join(year_filters)})", year_params)
+
+        if countries:
+            self._add(f"m.movie_id IN (SELECT movie_id FROM countries WHERE country IN ({_placeholders(countries)}))", countries)
+
+        if standorte:
+            self._add(f"m.standort IN ({_placeholders(standorte)})", standorte)
+
+        # Media formats are column names, so only known ones go into the SQL
+        if media:
+            media_filters = [f"m.{field} > 0" for field in MEDIA_FIELDS if field in media]
+            self._add(f"({' OR '.join(media_filters)})" if media_filters else "1=0")
+
+    def _add(self, condition, params=()):
+        self.conditions.append(condition)
+        self.params.extend(params)
+
+    @property
+    def where_clause(self):
+        return " AND ".join(self.conditions) if self.conditions else "1=1"
+
+    def count_query(self):
+        """Return (sql, params) counting the matching movies."""
+        sql = f"SELECT COUNT(*) AS total FROM movies m WHERE {self.where_clause}"
+        return sql, tuple(self.params)
+
+    def ids_query(self):
+        """Return (sql, params) selecting the matching movie_ids."""
+        sql = f"SELECT m.movie_id FROM movies m WHERE {self.where_clause}"
+        return sql, tuple(self.params)
+
+    def facet_count_query(self, field):
+        """
+        Return (sql, params) for the dropdown counts of one facet field. Only the
+        genre and country counts join their child table, since that is what they group on.
+        """
+        if field == 'media':
+            sums = ",\n".join(f"SUM(CASE WHEN m.{media_field} > 0 THEN 1 ELSE 0 END) AS {media_field}"
+                              for media_field in MEDIA_FIELDS)
+            sql = f"SELECT {sums} FROM movies m WHERE {self.where_clause}"
+            return sql, tuple(self.params)
+
+        if field not in FACET_FIELDS:
+            raise ValueError(f"Invalid field name: {field}")
+        group_field, join_clause, order_by = FACET_FIELDS[field]
+        # A joined child table can repeat a (movie, value) pair, so only those counts need DISTINCT
+        count_expression = "COUNT(DISTINCT m.movie_id)" if join_clause else "COUNT(*)"
+        sql = f"""
+            SELECT {group_field} AS field_value, {count_expression} AS count
+            FROM movies m
+            {join_clause}
+            WHERE {self.where_clause}
+            GROUP BY {group_field}
+            ORDER BY {order_by}
+        """
+        return sql, tuple(self.params)
@@ -0,0 +1,207 @@
+"""
+Resized, re-encoded derivatives of the poster and backdrop images.
+
+The originals are full-resolution files, far too large for catalog cards and
+carousels. A derivative is one (source file, width bucket, format) rendering,
+stored in the cache dir under a name that hashes the source path and its
+version - a replaced source simply gets new derivatives. Callers pass the
+version they already know (the app takes it from the media index), so the
+source on the remote drive is only stat'ed when there is none. Rendering runs in a
+process pool (Pillow is CPU-bound) behind a bounded queue: when the queue is
+full a request gets the original instead of waiting in line.
+
+Pillow is optional. Without it (or without an encoder for a format) callers
+fall back to serving the originals.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+WIDTH_BUCKETS = (160, 320, 480, 780, 1280)  # Requested widths are rounded up to one of these
+FORMATS = {'avif': ('AVIF', 'image/avif'), 'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+FORMAT_PREFERENCE = ('avif', 'webp')  # Picked in this order if the client accepts it; JPEG otherwise
+QUALITY = {'avif': 50, 'webp': 75, 'jpeg': 80}
+
+
+def source_version(path):
+    """Short hash of a source file's size and mtime, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+
+
+def width_bucket(width):
+    """The smallest bucket >= width (the largest bucket for anything bigger)."""
+    for bucket in WIDTH_BUCKETS:
+        if width <= bucket:
+            return bucket
+    return WIDTH_BUCKETS[-1]
+
+
+def render(source_path, target_path, width, fmt):
+    """Resize one image to `width` (never upscaling) and write it atomically. Runs in a worker process."""
+    pil_format = FORMATS[fmt][0]
+    with Image.open(source_path) as image:
+        image.thumbnail((width, width * 4))
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        tmp_path = f"{target_path}.{os.getpid()}.tmp"
+        try:
+            image.save(tmp_path, pil_format, quality=QUALITY[fmt])
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return target_path
+
+
+class DerivativeCache:
+
+    def __init__(self, cache_dir, workers=2, max_pending=64):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {}  # target path -> Future, so concurrent requests share one rendering
+        self.hits = 0
+        self.renders = 0
+        self.fallbacks = 0
+        self.formats = self._supported_formats()
+
+    @staticmethod
+    def _supported_formats():
+        if Image is None:
+            return ()
+        Image.init()
+        return tuple(fmt for fmt, (pil_format, _) in FORMATS.items() if pil_format in Image.SAVE)
+
+    @property
+    def available(self):
+        return 'jpeg' in self.formats
+
+    def negotiate(self, accept_mimetypes):
+        """The derivative format for a request's Accept header (listed explicitly, not via */*)."""
+        accepted = {mimetype for mimetype, quality in accept_mimetypes if quality > 0}
+        for fmt in FORMAT_PREFERENCE:
+            if fmt in self.formats and FORMATS[fmt][1] in accepted:
+                return fmt
+        return 'jpeg'
+
+    def target_path(self, source_path, width, fmt, version=None):
+        """Cache path of a derivative; without a `version` the source is stat'ed for one."""
+        if version is None:
+            version = source_version(source_path)
+            if version is None:
+                raise FileNotFoundError(source_path)
+        key = hashlib.sha1(f"{os.path.abspath(source_path)}|{version}|{width}|{fmt}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{fmt}")
+
+    def _submit(self, source_path, target_path, width, fmt, block):
+        """
+        Queue a rendering; returns its Future, or None if the queue is full and `block` is False.
+        Raises if the executor refuses it; a broken executor is dropped, the next call starts a new one.
+        """
+        with self._lock:
+            future = self._pending.get(target_path)
+            if future is not None:
+                return future
+        if not self._slots.acquire(blocking=block):
+            return None
+        with self._lock:
+            future = self._pending.get(target_path)
+            if future is not None:
+                self._slots.release()
+                return future
+            try:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                executor = self._executor
+                future = executor.submit(render, source_path, target_path, width, fmt)
+            except Exception as e:
+                self._slots.release()
+                if isinstance(e, BrokenProcessPool):
+                    self._executor = None
+                raise
+            self._pending[target_path] = future
+            self.renders += 1
+        future.add_done_callback(lambda done: self._done(target_path, executor, done))
+        return future
+
+    def _done(self, target_path, executor, future):
+        with self._lock:
+            self._pending.pop(target_path, None)
+            # A worker died: the executor refuses all further work, replace it on the next submit
+            if self._executor is executor and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                self._executor = None
+        self._slots.release()
+
+    def get(self, source_path, width, fmt, timeout, version=None):
+        """
+        Path of the derivative, rendering it if needed. Returns None (serve the
+        original) if the queue is full, the rendering fails or takes longer than `timeout`.
+        """
+        try:
+            target_path = self.target_path(source_path, width, fmt, version)
+        except OSError:
+            return None
+        if os.path.exists(target_path):
+            with self._lock:
+                self.hits += 1
+            return target_path
+
+        try:
+            future = self._submit(source_path, target_path, width, fmt, block=False)
+            if future is None:
+                raise TimeoutError("derivative queue is full")
+            return future.result(timeout=timeout)
+        except Exception as e:
+            with self._lock:
+                self.fallbacks += 1
+            logging.warning(f"Serving original of {source_path} ({width}px {fmt}): {e}")
+            return None
+
+    def pregenerate(self, sources, widths, formats=None):
+        """
+        Render all missing derivatives of the given (source path, version) pairs;
+        blocks while the queue is full.
+        """
+        formats = formats or self.formats
+        futures = []
+        for source_path, version in sources:
+            for width in widths:
+                for fmt in formats:
+                    try:
+                        target_path = self.target_path(source_path, width, fmt, version)
+                    except OSError:
+                        continue
+                    if not os.path.exists(target_path):
+                        try:
+                            futures.append(self._submit(source_path, target_path, width, fmt, block=True))
+                        except Exception as e:
+                            futures.append(None)
+                            logging.warning(f"Queueing image derivative of {source_path} failed: {e}")
+        failed = futures.count(None)
+        for future in filter(None, futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                logging.warning(f"Pregenerating image derivative failed: {e}")
+        return len(futures), failed
+
+    def stats(self):
+        with self._lock:
+            return {'formats': list(self.formats), 'pending': len(self._pending),
+                    'hits': self.hits, 'renders': self.renders, 'fallbacks': self.fallbacks}
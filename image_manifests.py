@@ -0,0 +1,57 @@
+"""
+Bounded LRU cache for the per-folder image manifests of get_images().
+
+A manifest is the list of image URLs of one (folder, poster/backdrop) pair
+together with the version it was built from (the directory mtime). Callers
+compare that version before using a manifest, so a changed directory is
+re-listed on its next request. Folders without an image directory are cached
+as negative entries (`subdir` None) until `expires`.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+Manifest = namedtuple('Manifest', 'version subdir urls expires')
+
+
+class ManifestCache:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            manifest = self._entries.get(key)
+            if manifest is not None:
+                self._entries.move_to_end(key)
+            return manifest
+
+    def put(self, key, manifest):
+        with self._lock:
+            self._entries[key] = manifest
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, folder_names):
+        """Drop the manifests of the given movie folders; returns how many were dropped."""
+        folder_names = set(folder_names)
+        with self._lock:
+            keys = [key for key in self._entries if key[0] in folder_names]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,215 @@
+"""
+Library scanner: syncs the file facts of the movie folders into `movies`.
+
+Walks all MOVIES_BASE_DIRS with the thread-pooled MediaIndex scan and writes
+`full_folder_path`, `moviefilename`, `movie_exist`, `poster_images` and
+`backdrop_images` for every movie with a `folder_name`. The new values go into
+a temporary table with one batched insert and are applied with a single
+UPDATE ... JOIN; only rows whose facts changed are written. Once a row has been
+scanned (`movie_exist` not NULL) the app trusts these columns instead of
+looking at the disk. Movies last seen on a base dir the scan couldn't list
+(drive unplugged, share offline) are left as they are and reported as
+unreachable, not missing.
+
+Every run saves the scan to SNAPSHOT_FILE. With --incremental the scan starts
+from that snapshot: only folders whose mtimes changed are listed again, and
+only the movies of added, removed, moved or changed folders are synced.
+
+    python library_scanner.py                 # full scan and sync
+    python library_scanner.py --incremental   # only what changed since the last run
+"""
+import logging
+import os
+import sys
+import time
+
+import mysql.connector
+from media_index import MediaIndex
+from vars import db_name, db_passwd, db_user, MOVIES_BASE_DIRS
+
+IMAGE_EXTENSIONS = ('.avif', '.jpg', '.jpeg', '.png', '.webp')
+FACT_COLUMNS = ('full_folder_path', 'moviefilename', 'movie_exist', 'poster_images', 'backdrop_images')
+INSERT_BATCH_SIZE = 1000
+SELECT_BATCH_SIZE = 1000  # folder_names per IN (...) list in incremental syncs
+SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'media_snapshot.json')
+REPORT_LIMIT = 20  # Titles listed per category in the summary
+
+
+def folder_facts(folder):
+    """The FACT_COLUMNS values for a MovieFolder, or for a missing folder (None)."""
+    if folder is None:
+        return {'full_folder_path': None, 'moviefilename': None, 'movie_exist': 0,
+                'poster_images': 0, 'backdrop_images': 0}
+
+    def image_count(image_type):
+        return sum(1 for name in folder.images.get(image_type) or () if name.lower().endswith(IMAGE_EXTENSIONS))
+
+    movie_file = folder.movie_files[0] if folder.movie_files else None
+    return {
+        'full_folder_path': folder.path,
+        'moviefilename': movie_file,
+        'movie_exist': 1 if movie_file else 0,
+        'poster_images': image_count('poster'),
+        'backdrop_images': image_count('backdrop'),
+    }
+
+
+def _find_folder(index, folders_casefold, folder_name):
+    # Windows paths are case-insensitive, the names in the database not always spelled like on disk
+    return index.folder(folder_name) or folders_casefold.get(folder_name.casefold())
+
+
+def _under_base_dir(path, base_dirs):
+    """The base dir of `base_dirs` that `path` lies in, or None."""
+    if not path:
+        return None
+    path = os.path.normcase(os.path.abspath(path))
+    for base_dir in base_dirs:
+        base = os.path.normcase(os.path.abspath(base_dir))
+        if path.startswith(base.rstrip(os.sep) + os.sep):
+            return base_dir
+    return None
+
+
+def _select_movies(cursor, folder_names):
+    query = f"""
+        SELECT movie_id, COALESCE(format_titel, title) AS title, folder_name, {', '.join(FACT_COLUMNS)}
+        FROM movies
+        WHERE folder_name IS NOT NULL AND folder_name <> ''
+    """
+    if folder_names is None:
+        cursor.execute(query)
+        return cursor.fetchall()
+    folder_names = sorted(folder_names)
+    movies = []
+    for start in range(0, len(folder_names), SELECT_BATCH_SIZE):
+        batch = folder_names[start:start + SELECT_BATCH_SIZE]
+        cursor.execute(f"{query} AND folder_name IN ({', '.join(['%s'] * len(batch))})", tuple(batch))
+        movies.extend(cursor.fetchall())
+    return movies
+
+
+def sync(connection, index, folder_names=None):
+    """
+    Write the facts of a built MediaIndex into `movies`, for all movies or only for
+    those in the given folders (e.g. the ChangeSet of an incremental scan). Returns a
+    summary dict with the titles that are new (file now present), missing (file
+    gone), moved (other folder path), unreachable (not found, but last seen on a
+    base dir the scan couldn't list; left untouched), the number of otherwise
+    changed rows and the folders on disk that no movie refers to.
+    """
+    unreachable_base_dirs = index.unreachable_base_dirs()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        movies = _select_movies(cursor, folder_names)
+
+        folders_casefold = {name.casefold(): index.folder(name) for name in index.folder_names()}
+        summary = {'new': [], 'missing': [], 'moved': [], 'unreachable': [], 'changed': 0, 'unmatched_folders': []}
+        used_folders = set()
+        updates = []
+        for movie in movies:
+            folder = _find_folder(index, folders_casefold, movie['folder_name'])
+            if folder is not None:
+                used_folders.add(folder.name)
+            elif _under_base_dir(movie['full_folder_path'], unreachable_base_dirs):
+                # Not found because its drive is offline, not because it is gone
+                summary['unreachable'].append(movie['title'])
+                continue
+            facts = folder_facts(folder)
+            if all(movie[column] == facts[column] for column in FACT_COLUMNS):
+                continue
+
+            if facts['movie_exist'] and not movie['movie_exist']:
+                summary['new'].append(movie['title'])
+            elif movie['movie_exist'] and not facts['movie_exist']:
+                summary['missing'].append(movie['title'])
+            elif movie['full_folder_path'] and facts['full_folder_path'] and movie['full_folder_path'] != facts['full_folder_path']:
+                summary['moved'].append(movie['title'])
+            else:
+                summary['changed'] += 1
+            updates.append((movie['movie_id'],) + tuple(facts[column] for column in FACT_COLUMNS))
+
+        scanned_folders = set(index.folder_names())
+        if folder_names is not None:
+            scanned_folders &= set(folder_names)
+        summary['unmatched_folders'] = sorted(scanned_folders - used_folders)
+
+        if updates:
+            # Pooled connections outlive a sync, so a scan_facts left behind by a failed one may still exist
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS scan_facts")
+            cursor.execute("""
+                CREATE TEMPORARY TABLE scan_facts (
+                    movie_id INT PRIMARY KEY,
+                    full_folder_path VARCHAR(500),
+                    moviefilename VARCHAR(255),
+                    movie_exist TINYINT(1),
+                    poster_images INT,
+                    backdrop_images INT
+                )
+            """)
+            try:
+                insert_query = (f"INSERT INTO scan_facts (movie_id, {', '.join(FACT_COLUMNS)}) "
+                                f"VALUES ({', '.join(['%s'] * (len(FACT_COLUMNS) + 1))})")
+                for start in range(0, len(updates), INSERT_BATCH_SIZE):
+                    cursor.executemany(insert_query, updates[start:start + INSERT_BATCH_SIZE])
+                cursor.execute(f"""
+                    UPDATE movies m
+                    JOIN scan_facts f ON f.movie_id = m.movie_id
+                    SET {', '.join(f'm.{column} = f.{column}' for column in FACT_COLUMNS)}
+                """)
+                connection.commit()
+            finally:
+                try:
+                    cursor.execute("DROP TEMPORARY TABLE IF EXISTS scan_facts")
+                except mysql.connector.Error as err:
+                    logging.warning(f"Could not drop scan_facts: {err}")
+        summary['updated'] = len(updates)
+        return summary
+    finally:
+        cursor.close()
+
+
+def print_summary(summary):
+    for category in ('new', 'missing', 'moved', 'unreachable'):
+        titles = summary[category]
+        print(f"{category.capitalize()}: {len(titles)}")
+        for title in titles[:REPORT_LIMIT]:
+            print(f"    {title}")
+        if len(titles) > REPORT_LIMIT:
+            print(f"    ... and {len(titles) - REPORT_LIMIT} more")
+    print(f"Other changes (image counts, movie file name): {summary['changed']}")
+    print(f"Folders without a movie in the database: {len(summary['unmatched_folders'])}")
+    for name in summary['unmatched_folders'][:REPORT_LIMIT]:
+        print(f"    {name}")
+    print(f"Updated {summary['updated']} movies.")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start_time = time.time()
+    index = MediaIndex(MOVIES_BASE_DIRS)
+    incremental = '--incremental' in sys.argv and index.load_snapshot(SNAPSHOT_FILE)
+    if '--incremental' in sys.argv and not incremental:
+        print("No usable snapshot, doing a full scan.")
+    changes = index.refresh()
+    print(f"Scanned {len(index.folder_names())} movie folders in {time.time() - start_time:.1f} seconds.")
+    for base_dir in index.unreachable_base_dirs():
+        print(f"Could not list {base_dir}; its movies are left as they are.")
+    if incremental:
+        print(f"Folders: {changes}")
+        for name in changes.moved:
+            print(f"    moved: {name} -> {index.folder(name).base_dir}")
+
+    if not incremental or changes:
+        cnx = mysql.connector.connect(host='localhost', user=db_user, password=db_passwd, database=db_name)
+        try:
+            print_summary(sync(cnx, index, changes.folder_names if incremental else None))
+        finally:
+            cnx.close()
+
+    os.makedirs(os.path.dirname(SNAPSHOT_FILE), exist_ok=True)
+    index.save_snapshot(SNAPSHOT_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+In-memory index of the movie folders on the MOVIES_BASE_DIRS drives.
+
+For every folder it records the base dir it lives in, the movie files,
+the poster/backdrop file names and the subtitle files, so request handlers
+never have to probe the (slow USB / network) drives. The index is built by
+scanning all folders in a thread pool. `refresh()` re-stats the folders and
+their image subdirectories, only re-lists the ones whose mtime changed and
+returns the ChangeSet against the previous scan. The first base dir containing
+a folder wins, like the old probing order. A base dir that can't be listed
+(an unplugged USB drive, an unreachable share) keeps its folders from the
+previous scan, so an offline drive never shows up as removed folders.
+
+The index can be saved to a JSON snapshot and loaded from it, so a process
+that starts up (or the library scanner) only re-lists what changed since.
+"""
+import hashlib
+import json
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from memory_index import MemoryIndex
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv')
+SUBTITLE_EXTENSIONS = ('.srt', '.vtt')
+IMAGE_TYPES = ('poster', 'backdrop')
+SCAN_WORKERS = 16  # Folder listings are latency-bound on network drives
+
+SNAPSHOT_VERSION = 1
+
+# mtimes = (folder mtime, {image_type: subdir mtime or None}); images = {image_type: sorted names or None};
+# sizes = {movie file: size in bytes}
+MovieFolder = namedtuple('MovieFolder', 'name base_dir path mtimes files movie_files subtitles images sizes')
+
+
+class ChangeSet(namedtuple('ChangeSet', 'added removed moved changed')):
+    """Folder names that appeared, disappeared, moved to another base dir or changed their content."""
+
+    @property
+    def folder_names(self):
+        return set(self.added) | set(self.removed) | set(self.moved) | set(self.changed)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.moved or self.changed)
+
+    def __str__(self):
+        return (f"{len(self.added)} added, {len(self.removed)} removed, "
+                f"{len(self.moved)} moved, {len(self.changed)} changed")
+
+
+def diff_folders(previous, current):
+    """The ChangeSet between two folder_name -> MovieFolder dicts."""
+    added, moved, changed = [], [], []
+    for name, folder in current.items():
+        old = previous.get(name)
+        if old is None:
+            added.append(name)
+        elif old.base_dir != folder.base_dir:
+            moved.append(name)
+        elif old != folder:
+            changed.append(name)
+    removed = [name for name in previous if name not in current]
+    return ChangeSet(sorted(added), sorted(removed), sorted(moved), sorted(changed))
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _list_files(path):
+    with os.scandir(path) as entries:
+        return sorted(entry.name for entry in entries if entry.is_file())
+
+
+def _list_file_sizes(path):
+    """{name: size} of the files in a directory, sorted by name (scandir has the sizes for free on Windows)."""
+    with os.scandir(path) as entries:
+        return dict(sorted((entry.name, entry.stat().st_size) for entry in entries if entry.is_file()))
+
+
+def _scan_folder(base_dir, name, previous=None):
+    """List one movie folder, or return `previous` unchanged if none of its mtimes changed."""
+    path = os.path.join(base_dir, name)
+    folder_mtime = _mtime(path)
+    if folder_mtime is None:
+        return None
+    image_mtimes = {image_type: _mtime(os.path.join(path, image_type)) for image_type in IMAGE_TYPES}
+    mtimes = (folder_mtime, image_mtimes)
+    if previous is not None and previous.mtimes == mtimes and previous.base_dir == base_dir:
+        return previous
+
+    try:
+        sizes = _list_file_sizes(path)
+        files = list(sizes)
+        images = {}
+        for image_type, image_mtime in image_mtimes.items():
+            images[image_type] = _list_files(os.path.join(path, image_type)) if image_mtime is not None else None
+    except OSError as e:
+        # The folder exists but can't be read right now; that is no reason to drop what we knew
+        logging.warning(f"Could not list movie folder {path}: {e}")
+        return previous if previous is not None and previous.base_dir == base_dir else None
+
+    movie_files = [f for f in files if f.lower().endswith(VIDEO_EXTENSIONS)]
+    return MovieFolder(
+        name=name,
+        base_dir=base_dir,
+        path=path,
+        mtimes=mtimes,
+        files=frozenset(files),
+        movie_files=movie_files,
+        subtitles=[f for f in files if f.lower().endswith(SUBTITLE_EXTENSIONS)],
+        images=images,
+        sizes={f: sizes[f] for f in movie_files},
+    )
+
+
+def _folder_to_json(folder):
+    data = folder._asdict()
+    data['mtimes'] = [folder.mtimes[0], folder.mtimes[1]]
+    data['files'] = sorted(folder.files)
+    return data
+
+
+def _folder_from_json(data):
+    data['mtimes'] = (data['mtimes'][0], data['mtimes'][1])
+    data['files'] = frozenset(data['files'])
+    return MovieFolder(**data)
+
+
+class MediaIndex(MemoryIndex):
+    """folder_name -> MovieFolder for all movie folders of all base dirs."""
+    name = 'Media index'
+
+    def __init__(self, base_dirs):
+        super().__init__()
+        self.base_dirs = base_dirs
+
+    def load(self, connection=None):
+        """
+        Scan all base dirs; folders unchanged since the last scan are reused without
+        listing, and the folders of a base dir that can't be listed are kept as they were.
+        """
+        previous = self._folders()
+        candidates = []
+        kept = {}
+        unreachable = []
+        seen = set()
+        for base_dir in self.base_dirs:
+            try:
+                with os.scandir(base_dir) as entries:
+                    names = sorted(entry.name for entry in entries if entry.is_dir())
+            except OSError as e:
+                logging.warning(f"Could not list base dir {base_dir}, keeping its folders from the last scan: {e}")
+                unreachable.append(base_dir)
+                # They still win over later base dirs, as they did while the drive was online
+                names = sorted(name for name, folder in previous.items() if folder.base_dir == base_dir)
+                for name in names:
+                    if name not in seen:
+                        seen.add(name)
+                        kept[name] = previous[name]
+                continue
+            for name in names:
+                if name not in seen:
+                    seen.add(name)
+                    candidates.append((base_dir, name))
+
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            scanned = executor.map(lambda candidate: _scan_folder(*candidate, previous.get(candidate[1])), candidates)
+            folders = {folder.name: folder for folder in scanned if folder is not None}
+        folders.update(kept)
+
+        return self._make_state(folders, unreachable)
+
+    @staticmethod
+    def _make_state(folders, unreachable=()):
+        by_path = {os.path.normcase(os.path.abspath(folder.path)): folder for folder in folders.values()}
+        return {'folders': folders, 'by_path': by_path, 'unreachable': list(unreachable)}
+
+    def _folders(self):
+        return self._state['folders'] if self._state else {}
+
+    def refresh(self):
+        """Re-check the mtimes, pick up new, changed, moved and removed folders and return the ChangeSet."""
+        previous = self._folders()
+        self.build(None)
+        return diff_folders(previous, self._folders())
+
+    def save_snapshot(self, path):
+        """Write the index to a JSON snapshot (atomically, the scanner and the app may share it)."""
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'base_dirs': self.base_dirs,
+            'folders': [_folder_to_json(folder) for folder in self._folders().values()],
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path):
+        """
+        Take the index state from a snapshot written by save_snapshot(). Returns False
+        (and keeps the index as it is) if there is no usable snapshot for these base dirs.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('base_dirs') != list(self.base_dirs):
+                logging.info(f"Ignoring media snapshot {path}: written for other base dirs or an older version")
+                return False
+            folders = {data['name']: _folder_from_json(data) for data in snapshot['folders']}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Could not load media snapshot {path}: {e}")
+            return False
+        self._state = self._make_state(folders)
+        return True
+
+    @staticmethod
+    def _split(rel_path):
+        parts = rel_path.replace('\\', '/').strip('/').split('/')
+        return parts[0], parts[1:]
+
+    def unreachable_base_dirs(self):
+        """The base dirs the last scan couldn't list (their folders are the ones of the scan before)."""
+        return list(self._state['unreachable']) if self._state else []
+
+    def folder_names(self):
+        """Names of all indexed movie folders."""
+        return list(self._state['folders'])
+
+    def folder(self, folder_name):
+        """The MovieFolder of a folder_name, or None if no base dir has it."""
+        return self._state['folders'].get(folder_name)
+
+    def folder_for_path(self, path):
+        """The MovieFolder with the given absolute directory path, or None."""
+        return self._state['by_path'].get(os.path.normcase(os.path.abspath(path)))
+
+    def movie_file(self, folder_name, extensions=VIDEO_EXTENSIONS):
+        """Absolute path of the first movie file in a folder, or None."""
+        folder = self.folder(folder_name)
+        if folder is None:
+            return None
+        for filename in folder.movie_files:
+            if filename.lower().endswith(extensions):
+                return os.path.join(folder.path, filename)
+        return None
+
+    def images(self, folder_name, image_type):
+        """Sorted file names in a folder's poster/backdrop dir, or None if it has no such dir."""
+        folder = self.folder(folder_name)
+        if folder is None:
+            return None
+        return folder.images.get(image_type)
+
+    def find_file(self, rel_path):
+        """
+        Absolute path of a file given relative to the base dirs ('folder/poster/x.jpg'),
+        or None if the index doesn't know it.
+        """
+        folder_name, rest = self._split(rel_path)
+        folder = self.folder(folder_name)
+        if folder is None or not rest:
+            return None
+        if len(rest) == 1 and rest[0] in folder.files:
+            return os.path.join(folder.path, rest[0])
+        if len(rest) == 2 and rest[0] in IMAGE_TYPES and rest[1] in (folder.images.get(rest[0]) or ()):
+            return os.path.join(folder.path, rest[0], rest[1])
+        return None
+
+    def image_version(self, rel_path):
+        """
+        Short version hash of a poster/backdrop file ('folder/poster/x.jpg') from the
+        indexed path and mtime of its image dir, or None if the index doesn't know it.
+        The file itself is never stat'ed. A file added, removed or replaced by a new
+        one changes the dir mtime; one overwritten in place keeps its version.
+        """
+        folder_name, rest = self._split(rel_path)
+        folder = self.folder(folder_name)
+        if folder is None or len(rest) != 2 or rest[0] not in IMAGE_TYPES:
+            return None
+        dir_mtime = folder.mtimes[1].get(rest[0])
+        if dir_mtime is None or rest[1] not in (folder.images.get(rest[0]) or ()):
+            return None
+        return hashlib.sha1(f"{folder.path}|{dir_mtime}|{rest[1]}".encode()).hexdigest()[:12]
+
+    def find_folder(self, rel_path):
+        """Absolute path of a movie folder or one of its image dirs, or None."""
+        folder_name, rest = self._split(rel_path)
+        folder = self.folder(folder_name)
+        if folder is None:
+            return None
+        if not rest:
+            return folder.path
+        if len(rest) == 1 and folder.images.get(rest[0]) is not None:
+            return os.path.join(folder.path, rest[0])
+        return None
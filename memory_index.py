@@ -0,0 +1,39 @@
+"""
+Base class for the process-wide in-memory indexes (facets, search, ...).
+
+An index loads everything it needs from the database in `load()` and `build()`
+swaps the new state in with a single assignment, so request threads always see
+either the old or the new index, never a half-built one.
+"""
+import logging
+import threading
+import time
+
+
+class MemoryIndex:
+    name = 'index'
+
+    def __init__(self):
+        self.build_lock = threading.Lock()  # Held while a (re)build is running
+        self._state = None
+        self.built_at = None
+
+    @property
+    def ready(self):
+        return self._state is not None
+
+    def age(self):
+        """Seconds since the last successful build, or None if never built."""
+        return time.time() - self.built_at if self.built_at else None
+
+    def build(self, connection):
+        """(Re)build the index from the database."""
+        start_time = time.time()
+        state = self.load(connection)
+        self._state = state
+        self.built_at = time.time()
+        logging.info(f"{self.name} built in {self.built_at - start_time:.2f} seconds")
+
+    def load(self, connection):
+        """Read the database and return the new index state."""
+        raise NotImplementedError
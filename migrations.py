@@ -0,0 +1,300 @@
+"""
+Versioned, non-destructive schema migrations.
+
+Every migration has a version number, a description and a list of steps
+(SQL strings or functions taking a cursor). Applied versions are recorded in
+`schema_migrations`, so a run only applies what is missing, in order, and can
+be repeated safely. Steps only add things (indexes, columns, triggers,
+backfilled values); nothing is dropped or rebuilt like db_setup.py does.
+
+Indexes are added with ALGORITHM=INPLACE, LOCK=NONE, so the app keeps reading
+and writing the table while an index is built. A step that finds its index
+already present skips it, which makes a migration that was interrupted
+half-way safe to re-run.
+
+    python migrations.py              # apply all pending migrations
+    python migrations.py --status     # list applied and pending migrations
+    python migrations.py --dry-run    # print what would be applied
+    python migrations.py --to 2       # apply up to version 2
+
+Time the hot queries before and after with bench_queries.py.
+"""
+import argparse
+import collections
+import logging
+import time
+
+import movie_summary
+import mysql.connector
+from vars import db_name, db_passwd, db_user
+
+Migration = collections.namedtuple('Migration', 'version description steps')
+
+MIGRATION_LOCK = 'formatdb_schema_migrations'  # GET_LOCK name, so two runners never overlap
+BACKFILL_BATCH_SIZE = 1000  # Rows per UPDATE of a backfill, committed one by one to keep row locks short
+BACKFILL_PAUSE = 0.05  # Seconds between backfill batches, so the app's writes get their turn
+
+# Votes come as text with thousands separators ('1,234,567' or '1.234.567'),
+# TMDb ratings as '7.3' or '7,3'. Anything else becomes NULL.
+VOTES_SQL = "IF({column} REGEXP '^[0-9][0-9,.]*$', CAST(REPLACE(REPLACE({column}, ',', ''), '.', '') AS UNSIGNED), NULL)"
+RATING_SQL = ("IF(REPLACE({column}, ',', '.') REGEXP '^[0-9]+([.][0-9]+)?$', "
+              "CAST(REPLACE({column}, ',', '.') AS DECIMAL(3,1)), NULL)")
+
+# Numeric copy of a text column: (column, definition, source column, conversion)
+NUMERIC_MOVIE_COLUMNS = (
+    ('imdb_votes_num', 'INT UNSIGNED NULL', 'imdb_votes', VOTES_SQL),
+    ('tmdb_votes_num', 'INT UNSIGNED NULL', 'tmdb_votes', VOTES_SQL),
+    ('tmdb_rating_num', 'DECIMAL(3,1) NULL', 'tmdb_rating', RATING_SQL),
+)
+
+
+def described(description, step):
+    """A function step with the description shown by --dry-run and the log."""
+    def wrapper(cursor):
+        step(cursor)
+    wrapper.description = description
+    return wrapper
+
+
+def add_index(table, name, columns):
+    """Step adding index `name` on `columns` of `table`, unless it exists."""
+    def step(cursor):
+        if index_exists(cursor, table, name):
+            logging.info(f"Index {table}.{name} exists, skipping")
+            return
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} ({', '.join(columns)}), ALGORITHM=INPLACE, LOCK=NONE")
+    step.description = f"ADD INDEX {table}.{name} ({', '.join(columns)})"
+    return step
+
+
+def add_columns(table, columns):
+    """Step adding the missing ones of `columns` [(name, definition)] to `table` in one ALTER."""
+    def step(cursor):
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s
+        """, (table,))
+        existing = {row[0].lower() for row in cursor.fetchall()}
+        missing = [(name, definition) for name, definition in columns if name.lower() not in existing]
+        if not missing:
+            logging.info(f"Columns of {table} exist, skipping")
+            return
+        additions = ', '.join(f"ADD COLUMN {name} {definition}" for name, definition in missing)
+        cursor.execute(f"ALTER TABLE {table} {additions}, ALGORITHM=INPLACE, LOCK=NONE")
+    step.description = f"ADD COLUMNS {table} ({', '.join(name for name, _ in columns)})"
+    return step
+
+
+def add_sync_triggers(table, assignments):
+    """
+    Step creating BEFORE INSERT/UPDATE triggers that set NEW.<column> = <expression>
+    for every (column, expression over NEW) in `assignments`.
+    """
+    def step(cursor):
+        body = ', '.join(f"NEW.{column} = {expression}" for column, expression in assignments)
+        for event in ('INSERT', 'UPDATE'):
+            trigger = f"trg_{table}_{event.lower()}_numeric"
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"CREATE TRIGGER {trigger} BEFORE {event} ON {table} FOR EACH ROW SET {body}")
+    step.description = f"CREATE TRIGGERS {table} ({', '.join(column for column, _ in assignments)})"
+    return step
+
+
+def backfill(table, key, assignments):
+    """
+    Step setting `assignments` [(column, expression)] on all rows of `table`, in
+    ranges of BACKFILL_BATCH_SIZE on the integer primary key `key`, one commit per range.
+    """
+    def step(cursor):
+        cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {table}")
+        low, high = cursor.fetchone()
+        if low is None:
+            return
+        updates = ', '.join(f"{column} = {expression}" for column, expression in assignments)
+        for start in range(low, high + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(f"UPDATE {table} SET {updates} WHERE {key} >= %s AND {key} < %s",
+                           (start, start + BACKFILL_BATCH_SIZE))
+            cursor.execute("COMMIT")
+            time.sleep(BACKFILL_PAUSE)
+        logging.info(f"Backfilled {table} ({', '.join(column for column, _ in assignments)}) up to {key} {high}")
+    step.description = f"BACKFILL {table} ({', '.join(column for column, _ in assignments)})"
+    return step
+
+
+def index_exists(cursor, table, name):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    return bool(cursor.fetchall())
+
+
+def column_exists(cursor, table, name):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+    """, (table, name))
+    return bool(cursor.fetchall())
+
+
+MIGRATIONS = [
+    Migration(1, "Covering indexes for the filters and facet counts", [
+        # Genre/country filters are `movie_id IN (SELECT movie_id ... WHERE genre IN (...))`:
+        # (value, movie_id) answers them from the index alone
+        add_index('genres', 'idx_genres_genre_movie', ('genre', 'movie_id')),
+        add_index('countries', 'idx_countries_country_movie', ('country', 'movie_id')),
+        # The dropdown counts join the other way round and group on the value
+        add_index('genres', 'idx_genres_movie_genre', ('movie_id', 'genre')),
+        add_index('countries', 'idx_countries_movie_country', ('movie_id', 'country', 'country_code')),
+        # Year and standort filters plus the "Jahr" sort and catalog keyset order (release_date, movie_id)
+        add_index('movies', 'idx_movies_release_date', ('release_date', 'movie_id')),
+        add_index('movies', 'idx_movies_standort', ('standort', 'movie_id')),
+        # "Titel" and "Länge" sorts with their keyset tie-breaker
+        add_index('movies', 'idx_movies_title', ('title', 'movie_id')),
+        add_index('movies', 'idx_movies_runtime', ('runtime', 'movie_id')),
+    ]),
+    Migration(2, "Indexes for the detail, similar and director lookups", [
+        # Director themes and the director search: job = 'Director' AND name = / LIKE
+        add_index('crew', 'idx_crew_job_name', ('job', 'name', 'movie_id')),
+        # Detail page and movie_summary: directors of one movie
+        add_index('crew', 'idx_crew_movie_job', ('movie_id', 'job')),
+        # Top actors of a movie by popularity (detail page, movie_summary)
+        add_index('movie_cast', 'idx_movie_cast_movie_popularity', ('movie_id', 'popularity')),
+        add_index('awards', 'idx_awards_movie', ('movie_id',)),
+    ]),
+    Migration(3, "Numeric vote and TMDb rating columns", [
+        add_columns('movies', [(column, definition) for column, definition, _, _ in NUMERIC_MOVIE_COLUMNS]),
+        # Importers keep writing the text columns; the triggers convert every write, including
+        # those that happen while the backfill below is running
+        add_sync_triggers('movies', [(column, conversion.format(column=f"NEW.{source}"))
+                                     for column, _, source, conversion in NUMERIC_MOVIE_COLUMNS]),
+        backfill('movies', 'movie_id', [(column, conversion.format(column=source))
+                                        for column, _, source, conversion in NUMERIC_MOVIE_COLUMNS]),
+        # rating already is DECIMAL(3,1); the sorts just no longer CAST it
+        add_index('movies', 'idx_movies_rating', ('rating', 'movie_id')),
+        add_index('movies', 'idx_movies_imdb_votes', ('imdb_votes_num', 'movie_id')),
+        add_index('movies', 'idx_movies_tmdb_rating', ('tmdb_rating_num', 'movie_id')),
+    ]),
+    Migration(4, "movie_summary read table with its dirty queue and triggers", [
+        # Databases where the app created these before keep their rows; the triggers are recreated
+        described("CREATE TABLES movie_summary, movie_summary_dirty", movie_summary.create_tables),
+        described(f"CREATE TRIGGERS {', '.join(movie_summary.SOURCE_TABLES)} (summary queue)",
+                  movie_summary.create_triggers),
+        described("BUILD movie_summary (if empty)", movie_summary.fill_if_empty),
+    ]),
+]
+
+
+def ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INT
+        ) ENGINE=InnoDB;
+    """)
+
+
+def applied_versions(cursor):
+    """{version: applied_at} of the applied migrations; empty if none ever ran."""
+    cursor.execute("SHOW TABLES LIKE 'schema_migrations'")
+    if not cursor.fetchall():
+        return {}
+    cursor.execute("SELECT version, applied_at FROM schema_migrations")
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def pending_migrations(cursor, target=None):
+    applied = applied_versions(cursor)
+    return [migration for migration in sorted(MIGRATIONS, key=lambda m: m.version)
+            if migration.version not in applied and (target is None or migration.version <= target)]
+
+
+def step_description(step):
+    return getattr(step, 'description', None) or ' '.join(str(step).split())[:120]
+
+
+def apply_migration(cursor, migration):
+    start_time = time.time()
+    for step in migration.steps:
+        logging.info(f"  {step_description(step)}")
+        if callable(step):
+            step(cursor)
+        else:
+            cursor.execute(step)
+    duration_ms = int((time.time() - start_time) * 1000)
+    cursor.execute("INSERT INTO schema_migrations (version, description, duration_ms) VALUES (%s, %s, %s)",
+                   (migration.version, migration.description, duration_ms))
+    return duration_ms
+
+
+def migrate(connection, target=None):
+    """Apply the pending migrations up to `target` (all if None) in order; returns the applied versions."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (MIGRATION_LOCK,))
+        if not cursor.fetchone()[0]:
+            raise RuntimeError("Another migration run holds the lock")
+        try:
+            ensure_table(cursor)
+            applied = []
+            for migration in pending_migrations(cursor, target):
+                logging.info(f"Applying migration {migration.version}: {migration.description}")
+                duration_ms = apply_migration(cursor, migration)
+                # DDL commits implicitly; this commits the schema_migrations row and any data steps
+                connection.commit()
+                logging.info(f"Migration {migration.version} applied in {duration_ms / 1000:.1f} s")
+                applied.append(migration.version)
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def print_status(cursor):
+    applied = applied_versions(cursor)
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        state = f"applied {applied[migration.version]}" if migration.version in applied else "pending"
+        print(f"{migration.version:>4}  {migration.description:<60} {state}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Apply the pending schema migrations.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--status', action='store_true', help="list applied and pending migrations")
+    mode.add_argument('--dry-run', action='store_true', help="print what would be applied")
+    parser.add_argument('--to', type=int, metavar='VERSION', help="apply up to this version")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    target = args.to
+    cnx = mysql.connector.connect(host='localhost', user=db_user, password=db_passwd, database=db_name)
+    try:
+        if args.status:
+            cursor = cnx.cursor()
+            print_status(cursor)
+            cursor.close()
+        elif args.dry_run:
+            cursor = cnx.cursor()
+            for migration in pending_migrations(cursor, target):
+                print(f"{migration.version}: {migration.description}")
+                for step in migration.steps:
+                    print(f"    {step_description(step)}")
+            cursor.close()
+        else:
+            applied = migrate(cnx, target)
+            print(f"Applied {len(applied)} migrations." if applied else "Schema is up to date.")
+    finally:
+        cnx.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Single-query loader for the movie detail page.
+
+The movie row and all of its child collections (genres, countries, companies,
+directors, actors, awards, languages, certificates, video link) come back in
+one round trip: every collection is a correlated JSON_ARRAYAGG subquery, so
+the number of child tables adds columns, not queries. `load_movie_details()`
+takes any number of movie_ids.
+"""
+import json
+
+ACTOR_LIMIT = 10
+
+DETAIL_QUERY = """
+    SELECT
+        m.*,
+        (SELECT JSON_ARRAYAGG(g.genre) FROM genres g WHERE g.movie_id = m.movie_id) AS genres,
+        (SELECT JSON_ARRAYAGG(c.country) FROM countries c WHERE c.movie_id = m.movie_id) AS countries,
+        (SELECT JSON_ARRAYAGG(p.company_name) FROM production_companies p WHERE p.movie_id = m.movie_id) AS production_companies,
+        (SELECT JSON_ARRAYAGG(JSON_OBJECT('name', cr.name, 'tmdb_id', cr.tmdb_id))
+            FROM crew cr WHERE cr.movie_id = m.movie_id AND cr.job = 'Director') AS directors,
+        (SELECT JSON_ARRAYAGG(JSON_OBJECT('name', mc.name, 'tmdb_id', mc.tmdb_id, 'popularity', mc.popularity))
+            FROM movie_cast mc WHERE mc.movie_id = m.movie_id) AS actors,
+        (SELECT JSON_ARRAYAGG(a.award) FROM awards a WHERE a.movie_id = m.movie_id) AS awards,
+        (SELECT JSON_ARRAYAGG(sl.language) FROM spoken_languages sl WHERE sl.movie_id = m.movie_id) AS spoken_languages,
+        (SELECT JSON_ARRAYAGG(JSON_OBJECT('country', ce.country, 'rating', ce.rating, 'additional_info', ce.additional_info))
+            FROM certificates ce WHERE ce.movie_id = m.movie_id) AS certificates,
+        (SELECT v.video_link FROM video_links v WHERE v.movie_id = m.movie_id ORDER BY v.id LIMIT 1) AS video_link
+    FROM movies m
+    WHERE m.movie_id IN ({placeholders})
+"""
+
+# Collections of plain values, deduplicated like the former GROUP_CONCAT(DISTINCT ...)
+VALUE_COLLECTIONS = ('genres', 'countries', 'production_companies', 'awards', 'spoken_languages')
+
+
+def _json_list(value):
+    """Decode a JSON_ARRAYAGG column; NULL (no child rows) becomes []."""
+    if value is None:
+        return []
+    return json.loads(value)
+
+
+def _unique(values):
+    return [value for value in dict.fromkeys(values) if value]
+
+
+def load_movie_details(connection, movie_ids):
+    """Return {movie_id: movie dict with its child collections} for the given ids."""
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if not movie_ids:
+        return {}
+
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(DETAIL_QUERY.format(placeholders=','.join(['%s'] * len(movie_ids))), tuple(movie_ids))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    movies = {}
+    for movie in rows:
+        for column in VALUE_COLLECTIONS:
+            movie[column] = _unique(_json_list(movie[column]))
+        movie['directors'] = _json_list(movie['directors'])
+        movie['certificates'] = _json_list(movie['certificates'])
+
+        actors = sorted(_json_list(movie['actors']), key=lambda actor: float(actor['popularity'] or 0), reverse=True)
+        movie['actors'] = [{'name': actor['name'], 'tmdb_id': actor['tmdb_id']} for actor in actors[:ACTOR_LIMIT]]
+
+        movies[movie['movie_id']] = movie
+    return movies
+
+
+def load_movie_detail(connection, movie_id):
+    """Return one movie with its child collections, or None if it doesn't exist."""
+    return load_movie_details(connection, [movie_id]).get(movie_id)
@@ -0,0 +1,143 @@
+"""
+Denormalized `movie_summary` read table for the catalog and filter listings.
+
+It holds the card fields that every list query used to aggregate per row and
+per request (countries, genres, directors, top-3 actors, formats string), one
+row per movie. Triggers on the source tables append the changed movie_id to
+`movie_summary_dirty`; `refresh_dirty()` rebuilds only those rows. The tables
+and triggers are created by migration 4 (migrations.py); the app only applies
+the queue. Run this module directly for a full rebuild.
+"""
+import logging
+
+import mysql.connector
+from vars import db_name, db_passwd, db_user
+
+# Tables whose changes affect a summary row
+SOURCE_TABLES = ('movies', 'genres', 'countries', 'crew', 'movie_cast')
+
+SUMMARY_COLUMNS_SQL = """
+    SELECT
+        m.movie_id,
+        (SELECT GROUP_CONCAT(DISTINCT CONCAT(c.country, ' (', c.country_code, ')') SEPARATOR ', ')
+            FROM countries c WHERE c.movie_id = m.movie_id) AS countries,
+        (SELECT GROUP_CONCAT(DISTINCT g.genre SEPARATOR ', ')
+            FROM genres g WHERE g.movie_id = m.movie_id) AS genres,
+        (SELECT GROUP_CONCAT(DISTINCT cr.name SEPARATOR ', ')
+            FROM crew cr WHERE cr.movie_id = m.movie_id AND cr.job = 'Director') AS director,
+        (SELECT SUBSTRING_INDEX(GROUP_CONCAT(DISTINCT mc.name ORDER BY mc.popularity DESC SEPARATOR ', '), ', ', 3)
+            FROM movie_cast mc WHERE mc.movie_id = m.movie_id) AS actors,
+        TRIM(BOTH ', ' FROM CONCAT_WS(', ',
+            CASE WHEN m.format_vhs > 0 THEN CONCAT('VHS (', m.format_vhs, ')') ELSE NULL END,
+            CASE WHEN m.format_dvd > 0 THEN CONCAT('DVD (', m.format_dvd, ')') ELSE NULL END,
+            CASE WHEN m.format_blu > 0 THEN CONCAT('Blu-ray (', m.format_blu, ')') ELSE NULL END,
+            CASE WHEN m.format_blu3 > 0 THEN CONCAT('Blu-ray 3D (', m.format_blu3, ')') ELSE NULL END
+        )) AS formats
+    FROM movies m
+"""
+
+INSERT_SUMMARY_SQL = "INSERT INTO movie_summary (movie_id, countries, genres, director, actors, formats)" + SUMMARY_COLUMNS_SQL
+
+REFRESH_BATCH_SIZE = 1000
+
+
+def create_tables(cursor):
+    """Create the summary table and the dirty queue, if missing."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movie_summary (
+            movie_id INT PRIMARY KEY,
+            countries TEXT,
+            genres TEXT,
+            director TEXT,
+            actors TEXT,
+            formats VARCHAR(255),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB;
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movie_summary_dirty (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            movie_id INT NOT NULL
+        ) ENGINE=InnoDB;
+    """)
+
+
+def create_triggers(cursor):
+    """(Re)create the triggers queueing changed movie_ids, so missing or dropped ones come back."""
+    for table in SOURCE_TABLES:
+        for event, values in (('INSERT', '(NEW.movie_id)'),
+                              ('UPDATE', '(OLD.movie_id), (NEW.movie_id)'),
+                              ('DELETE', '(OLD.movie_id)')):
+            trigger = f"trg_{table}_{event.lower()}_summary"
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"""
+                CREATE TRIGGER {trigger} AFTER {event} ON {table}
+                FOR EACH ROW INSERT INTO movie_summary_dirty (movie_id) VALUES {values}
+            """)
+
+
+def fill_if_empty(cursor):
+    """Build all summary rows unless the table already has some."""
+    cursor.execute("SELECT 1 FROM movie_summary LIMIT 1")
+    if cursor.fetchall():
+        logging.info("movie_summary is filled, skipping the full build")
+        return
+    rebuild(cursor)
+
+
+def rebuild(cursor, movie_ids=None):
+    """Rebuild the summary rows of the given movie_ids, or of all movies if None."""
+    if movie_ids is None:
+        cursor.execute("DELETE FROM movie_summary")
+        cursor.execute(INSERT_SUMMARY_SQL)
+        return
+
+    movie_ids = list(movie_ids)
+    for i in range(0, len(movie_ids), REFRESH_BATCH_SIZE):
+        batch = movie_ids[i:i + REFRESH_BATCH_SIZE]
+        placeholders = ','.join(['%s'] * len(batch))
+        # Delete + insert also drops the rows of movies that no longer exist
+        cursor.execute(f"DELETE FROM movie_summary WHERE movie_id IN ({placeholders})", tuple(batch))
+        cursor.execute(INSERT_SUMMARY_SQL + f" WHERE m.movie_id IN ({placeholders})", tuple(batch))
+
+
+def refresh_dirty(connection):
+    """
+    Rebuild the summary rows of all movies queued by the triggers and return their ids.
+    Only the queue entries up to the id read at the start are removed, so changes
+    made during the refresh are picked up by the next one.
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT MAX(id) AS upto FROM movie_summary_dirty")
+        upto = cursor.fetchone()['upto']
+        if upto is None:
+            return []
+
+        cursor.execute("SELECT DISTINCT movie_id FROM movie_summary_dirty WHERE id <= %s", (upto,))
+        movie_ids = [row['movie_id'] for row in cursor.fetchall()]
+        rebuild(cursor, movie_ids)
+        cursor.execute("DELETE FROM movie_summary_dirty WHERE id <= %s", (upto,))
+        connection.commit()
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    logging.info(f"Refreshed movie_summary for {len(movie_ids)} movies")
+    return movie_ids
+
+
+if __name__ == "__main__":
+    cnx = mysql.connector.connect(host='localhost', user=db_user, password=db_passwd, database=db_name)
+    cursor = cnx.cursor(dictionary=True)
+    create_tables(cursor)
+    create_triggers(cursor)
+    print("Rebuilding movie_summary for all movies...")
+    rebuild(cursor)
+    cursor.execute("DELETE FROM movie_summary_dirty")
+    cnx.commit()
+    cursor.close()
+    cnx.close()
+    print("movie_summary rebuilt successfully.")
@@ -0,0 +1,167 @@
+"""
+HTTP Range streaming of movie files.
+
+`stream_file()` answers a GET/HEAD for a file with
+
+- 200 and the whole file, or 304 for a matching If-None-Match / If-Modified-Since,
+- 206 with one Content-Range for a single range (what players send when seeking),
+- 206 multipart/byteranges for several ranges (adjacent ones are merged),
+- 416 for ranges outside the file.
+
+A Range is only honored while its If-Range still matches the file, so a client
+never stitches together parts of two versions. The ETag is derived from size and
+mtime, the movie files are far too large to hash.
+
+The body is read in STREAM_CHUNK_SIZE pieces. A response that runs to the end
+of the file (the whole file, or an open "bytes=N-" seek) is handed to the WSGI
+server's `wsgi.file_wrapper`, which servers like gunicorn send with
+os.sendfile() - no copy through Python at all.
+"""
+import os
+import uuid
+
+from flask import current_app, request
+
+STREAM_CHUNK_SIZE = 256 * 1024
+MAX_RANGES = 16  # More ranges than this (after merging) are ignored and the whole file is sent
+
+VIDEO_MIMETYPES = {
+    '.mp4': 'video/mp4',
+    '.m4v': 'video/mp4',
+    '.mkv': 'video/x-matroska',
+    '.webm': 'video/webm',
+    '.avi': 'video/x-msvideo',
+    '.mov': 'video/quicktime',
+    '.wmv': 'video/x-ms-wmv',
+    '.flv': 'video/x-flv',
+}
+
+
+def video_mimetype(path):
+    """The MIME type of a movie file by its container extension."""
+    return VIDEO_MIMETYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+
+
+def _file_etag(stat):
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def _read_chunks(path, start, stop):
+    """Yield the bytes [start, stop) of a file in bounded chunks."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _multipart_chunks(path, ranges, boundary, part_headers):
+    for (start, stop), headers in zip(ranges, part_headers):
+        yield headers
+        yield from _read_chunks(path, start, stop)
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+def parse_ranges(range_header, size):
+    """
+    Turn a parsed Range header into sorted, merged (start, stop) byte ranges.
+    Returns None if the header is to be ignored and [] if no range is satisfiable.
+    """
+    if range_header is None or range_header.units != 'bytes':
+        return None
+    ranges = []
+    for begin, end in range_header.ranges:
+        if begin < 0:  # Suffix range: the last -begin bytes
+            start, stop = max(size + begin, 0), size
+        else:
+            start, stop = begin, size if end is None else min(end, size)
+        if start < stop:
+            ranges.append((start, stop))
+
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def _if_range_matches(etag, last_modified):
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return int(if_range.date.timestamp()) == int(last_modified)
+    return True  # No If-Range header
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None:
+        return int(last_modified) <= int(request.if_modified_since.timestamp())
+    return False
+
+
+def stream_file(path, mimetype=None):
+    """Respond with (a range of) the file at `path`, which the caller has already authorized."""
+    mimetype = mimetype or video_mimetype(path)
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = _file_etag(stat)
+
+    response = current_app.response_class(mimetype=mimetype, direct_passthrough=True)
+    response.set_etag(etag)
+    response.last_modified = stat.st_mtime
+    response.accept_ranges = 'bytes'
+
+    if _not_modified(etag, stat.st_mtime):
+        response.status_code = 304
+        return response
+
+    ranges = parse_ranges(request.range, size) if _if_range_matches(etag, stat.st_mtime) else None
+    if ranges == []:
+        response.status_code = 416
+        response.headers['Content-Range'] = f"bytes */{size}"
+        return response
+
+    if ranges is None or ranges == [(0, size)]:
+        start, stop = 0, size
+    elif len(ranges) == 1:
+        (start, stop), = ranges
+        response.status_code = 206
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+    else:
+        boundary = uuid.uuid4().hex
+        part_headers = [(f"--{boundary}\r\nContent-Type: {mimetype}\r\n"
+                         f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n").encode()
+                        for start, stop in ranges]
+        response.status_code = 206
+        response.headers['Content-Type'] = f"multipart/byteranges; boundary={boundary}"
+        response.content_length = (sum(len(headers) + stop - start + 2
+                                       for (start, stop), headers in zip(ranges, part_headers))
+                                   + len(f"--{boundary}--\r\n"))
+        if request.method != 'HEAD':
+            response.response = _multipart_chunks(path, ranges, boundary, part_headers)
+        return response
+
+    response.content_length = stop - start
+    if request.method == 'HEAD':
+        return response
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None and stop == size:
+        # Runs to the end of the file, so the server may send the rest of it as is
+        f = open(path, 'rb')
+        f.seek(start)
+        response.response = file_wrapper(f, STREAM_CHUNK_SIZE)
+    else:
+        response.response = _read_chunks(path, start, stop)
+    return response
@@ -0,0 +1,199 @@
+"""
+Per-route response cache with tag-based invalidation.
+
+`ResponseCache.cached()` goes *below* `@app.route`, so Flask registers the
+caching wrapper. The key is the request path plus the query args in a
+normalized order, so `?a=1&b=2` and `?b=2&a=1` share an entry. While a view
+runs it can attach tags (`movie:<id>`, `genre:<name>`, ...) with `tag()`;
+`invalidate()` later evicts exactly the entries carrying one of the given tags.
+Hits and misses are counted per endpoint.
+
+Responses carry a strong ETag and `Cache-Control: no-cache`, so clients
+revalidate with If-None-Match. Every tag has a generation that `invalidate()`
+bumps; the ETag of a stored response hashes its key, the generations of its
+tags and the store time. The validator is kept apart from the body for the
+entry's timeout, so a matching If-None-Match is answered with 304 before the
+view runs, even when the cache backend has already dropped the body.
+Responses that aren't stored get a hash of the body as ETag.
+"""
+import functools
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from flask import g, make_response, request
+
+PRUNE_INTERVAL = 1000  # Drop expired keys from the tag registry every this many stores
+DEFAULT_TIMEOUT = 300  # Seconds a validator lives when cached() gets no timeout
+
+
+def make_conditional(response):
+    """Add a content-hash ETag and answer a matching If-None-Match with 304."""
+    if response.status_code == 200 and not response.direct_passthrough:
+        if not response.get_etag()[0]:
+            response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        if not response.headers.get('Cache-Control'):
+            response.cache_control.no_cache = True
+        response.make_conditional(request)
+    return response
+
+
+def conditional(view):
+    """ETag/304 support for views that are not worth caching server-side."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        rv = view(*args, **kwargs)
+        if rv is None:
+            return rv
+        return make_conditional(make_response(rv))
+    return wrapper
+
+
+class ResponseCache:
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._keys_by_tag = {}
+        self._tags_by_key = {}
+        self._generations = {}  # tag -> number of invalidations
+        self._validators = {}  # key -> (etag, {tag: generation}, expires)
+        self._stores = 0
+        self._invalidations = 0
+        self.hits = {}
+        self.misses = {}
+
+    @staticmethod
+    def make_key():
+        args = sorted((name, value) for name in request.args for value in request.args.getlist(name))
+        return f"view:{request.path}?{urlencode(args)}"
+
+    def tag(self, *tags):
+        """Attach tags to the response of the current request."""
+        if hasattr(g, 'response_cache_tags'):
+            g.response_cache_tags.update(tags)
+
+    def bypass(self):
+        """Don't store the response of the current request (e.g. it contains a fresh random seed)."""
+        g.response_cache_bypass = True
+
+    def cached(self, timeout=None):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                endpoint = request.endpoint
+                key = self.make_key()
+                etag = self._current_etag(key)
+                if etag is not None and request.if_none_match.contains(etag):
+                    self._count(self.hits, endpoint)
+                    response = make_response('', 304)
+                    response.set_etag(etag)
+                    response.cache_control.no_cache = True
+                    return response
+
+                entry = self.cache.get(key)
+                if entry is not None:
+                    self._count(self.hits, endpoint)
+                    body, status, headers = entry
+                    return make_conditional(make_response(body, status, headers))
+
+                self._count(self.misses, endpoint)
+                g.response_cache_tags = set()
+                g.response_cache_bypass = False
+                invalidations = self._invalidations
+                rv = view(*args, **kwargs)
+                if rv is None:
+                    return rv
+                response = make_response(rv)
+                if response.status_code == 200 and not response.direct_passthrough:
+                    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+                # A response computed while an invalidation ran may already be stale
+                if (response.status_code == 200 and not response.direct_passthrough
+                        and not g.response_cache_bypass and invalidations == self._invalidations):
+                    response.set_etag(self._store_validator(key, g.response_cache_tags, timeout or DEFAULT_TIMEOUT))
+                    self.cache.set(key, (response.get_data(), response.status_code, response.headers.to_wsgi_list()),
+                                   timeout=timeout)
+                    self.register(key, g.response_cache_tags)
+                return make_conditional(response)
+            return wrapper
+        return decorator
+
+    def _store_validator(self, key, tags, timeout):
+        """Record and return the ETag of a response stored under `key` with `tags`."""
+        with self._lock:
+            generations = {tag: self._generations.get(tag, 0) for tag in tags}
+            stamp = ','.join(f"{tag}={generation}" for tag, generation in sorted(generations.items()))
+            etag = hashlib.sha1(f"{key}|{stamp}|{time.time()}".encode()).hexdigest()
+            self._validators[key] = (etag, generations, time.time() + timeout)
+        return etag
+
+    def _current_etag(self, key):
+        """ETag of the stored response of `key`, or None if it expired or one of its tags was invalidated."""
+        with self._lock:
+            validator = self._validators.get(key)
+            if validator is None:
+                return None
+            etag, generations, expires = validator
+            if time.time() >= expires or any(self._generations.get(tag, 0) != generation
+                                             for tag, generation in generations.items()):
+                del self._validators[key]
+                return None
+            return etag
+
+    def _count(self, counter, endpoint):
+        with self._lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    def register(self, key, tags):
+        """Tag a cache key; also usable for entries a view stores in the cache itself."""
+        with self._lock:
+            self._unregister(key)
+            self._tags_by_key[key] = tags
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            self._stores += 1
+            if self._stores % PRUNE_INTERVAL == 0:
+                for expired_key in [k for k in self._tags_by_key if not self.cache.has(k)]:
+                    self._unregister(expired_key)
+                now = time.time()
+                for expired_key in [k for k, (_, _, expires) in self._validators.items() if expires <= now]:
+                    del self._validators[expired_key]
+
+    def _unregister(self, key):
+        for tag in self._tags_by_key.pop(key, ()):
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def invalidate(self, tags):
+        """Evict all entries carrying any of the tags; returns the number of evicted entries."""
+        with self._lock:
+            self._invalidations += 1
+            keys = set()
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                keys |= self._keys_by_tag.get(tag, set())
+            for key in keys:
+                self._unregister(key)
+        for key in keys:
+            self.cache.delete(key)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            endpoints = sorted(set(self.hits) | set(self.misses))
+            return {
+                'entries': len(self._tags_by_key),
+                'validators': len(self._validators),
+                'tags': len(self._keys_by_tag),
+                'endpoints': {
+                    endpoint: {'hits': self.hits.get(endpoint, 0), 'misses': self.misses.get(endpoint, 0)}
+                    for endpoint in endpoints
+                },
+            }
@@ -0,0 +1,119 @@
+"""
+In-memory inverted index for the search box of /filter_movies.
+
+Titles (incl. format_titel/format_orig_titel), keywords, cast and crew names are
+split into normalized tokens. Each token maps to the movies it occurs in, with
+a weight for the field it came from. A query is tokenized the same way; every
+query token must match (exactly or as a prefix) and the movies are ranked by
+the summed field weights.
+"""
+import bisect
+import re
+import unicodedata
+
+from memory_index import MemoryIndex
+
+# Field weights: a hit in a title counts more than a hit in a name or keyword
+TITLE_WEIGHT = 3.0
+DIRECTOR_WEIGHT = 2.0
+CAST_WEIGHT = 2.0
+CREW_WEIGHT = 1.0
+KEYWORD_WEIGHT = 1.0
+PREFIX_FACTOR = 0.5  # A prefix match scores half of an exact token match
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+# German umlaut transcriptions (ae/oe/ue, but not the 'ue' in 'que...'),
+# folded like Lucene's GermanNormalizationFilter
+_UMLAUT_DIGRAPHS = re.compile(r'(?<!q)ue|ae|oe')
+
+
+def normalize(text):
+    """
+    Fold text for matching: lowercase, ß -> ss, strip accents and umlauts and
+    collapse the ae/oe/ue transcriptions, so 'München', 'Muenchen' and
+    'Munchen' all become 'munchen'.
+    """
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _UMLAUT_DIGRAPHS.sub(lambda match: match.group(0)[0], text)
+
+
+def tokenize(text):
+    """Split text into normalized tokens."""
+    if not text:
+        return []
+    return _TOKEN_PATTERN.findall(normalize(text))
+
+
+class SearchIndex(MemoryIndex):
+    """Token -> {movie_id: weight} postings plus a sorted vocabulary for prefix lookups."""
+    name = 'Search index'
+
+    def load(self, connection):
+        postings = {}
+
+        def add(movie_id, text, weight):
+            for token in tokenize(text):
+                movies = postings.setdefault(token, {})
+                if weight > movies.get(movie_id, 0):
+                    movies[movie_id] = weight
+
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT movie_id, title, original_title, format_titel, format_orig_titel, keywords
+                FROM movies
+            """)
+            for row in cursor.fetchall():
+                for column in ('title', 'original_title', 'format_titel', 'format_orig_titel'):
+                    add(row['movie_id'], row[column], TITLE_WEIGHT)
+                add(row['movie_id'], row['keywords'], KEYWORD_WEIGHT)
+
+            cursor.execute("SELECT movie_id, name FROM movie_cast")
+            for row in cursor.fetchall():
+                add(row['movie_id'], row['name'], CAST_WEIGHT)
+
+            cursor.execute("SELECT movie_id, name, job FROM crew")
+            for row in cursor.fetchall():
+                add(row['movie_id'], row['name'], DIRECTOR_WEIGHT if row['job'] == 'Director' else CREW_WEIGHT)
+        finally:
+            cursor.close()
+
+        return {'postings': postings, 'vocabulary': sorted(postings)}
+
+    @staticmethod
+    def _matching_terms(vocabulary, token):
+        """Yield (term, factor) for the exact token and all indexed terms it is a prefix of."""
+        start = bisect.bisect_left(vocabulary, token)
+        end = bisect.bisect_left(vocabulary, token + '\uffff', start)
+        for term in vocabulary[start:end]:
+            yield term, 1.0 if term == token else PREFIX_FACTOR
+
+    def search(self, query):
+        """
+        Return [(movie_id, score), ...] for all movies matching every query token,
+        best match first.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        state = self._state
+        postings = state['postings']
+
+        scores = None
+        for token in dict.fromkeys(tokens):
+            token_scores = {}
+            for term, factor in self._matching_terms(state['vocabulary'], token):
+                for movie_id, weight in postings[term].items():
+                    score = weight * factor
+                    if score > token_scores.get(movie_id, 0):
+                        token_scores[movie_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {movie_id: scores[movie_id] + score
+                          for movie_id, score in token_scores.items() if movie_id in scores}
+            if not scores:
+                return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
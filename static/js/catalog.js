@@ -110,8 +110,11 @@ export function updateMovieListings(movies) {
 
     movies.forEach(movie => {
         // Prepare paths
-        const imagePath = `/movie_images/${encodeURIComponent(movie.folder_name || 'default')}/poster/poster_1.avif`;
         const defaultImagePath = '/static/images/default_movie.png';
+        // poster_images is 0 if the library scan found no posters: don't even ask for one
+        const imagePath = movie.poster_images === 0 || !movie.poster_url
+            ? defaultImagePath
+            : movie.poster_url;
     
         // Are we in list view or grid view?
         const isListView = movieContainer.classList.contains('list-view');
@@ -129,9 +132,8 @@ export function updateMovieListings(movies) {
         movieCard.className = 'movie-card';
     
         // If in list view, set background to the backdrop
-        if (isListView) {
-            const backdropPath = `/movie_images/${encodeURIComponent(movie.folder_name || 'default')}/backdrop/backdrop_1.avif`;
-            movieCard.style.backgroundImage = `url('${backdropPath}')`;
+        if (isListView && movie.backdrop_url) {
+            movieCard.style.backgroundImage = `url('${movie.backdrop_url}')`;
         }
     
         // Icon sizes
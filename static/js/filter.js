@@ -20,6 +20,10 @@ let debounceTimer = null;
 const AUTOCOMPLETE_DEBOUNCE_DELAY = 500; // milliseconds
 const AUTOCOMPLETE_MIN_DIGITS = 2;
 
+// Seed of the current "Zufall" order; kept while only the page changes
+let randomSeed = null;
+let lastFilterSignature = null;
+
 /**
  * Initialize the toggle functionality for the filter panel and advanced filters
  */
@@ -559,6 +563,14 @@ export function updateFilters(page = 1) {
         if (selectedMedia.length) finalParams.append('media', selectedMedia.join(','));
         if (selectedSortBy.length) finalParams.append('sort_by', selectedSortBy[0]);
         if (searchQuery.length > 0) finalParams.append('search', searchQuery);
+
+        // New filters -> new random order; paging keeps the seed so pages don't overlap
+        const filterSignature = finalParams.toString();
+        if (filterSignature !== lastFilterSignature) {
+            randomSeed = null;
+            lastFilterSignature = filterSignature;
+        }
+        if (randomSeed !== null && selectedSortBy[0] === 'Zufall') finalParams.append('seed', randomSeed);
         finalParams.append('page', page);
     }
 
@@ -600,6 +612,8 @@ export function updateFilters(page = 1) {
 
             } else {
                 // 2B) Normal filter mode
+                if (data.seed) randomSeed = data.seed;
+
                 const {
                     years,
                     genres,
@@ -42,7 +42,7 @@ document.addEventListener('DOMContentLoaded', function () {
             return response.json();
         })
         .then(data => {
-            let backdrops = data.images;
+            let backdrops = data.urls;
             const swiperWrapper = document.querySelector('.swiper-wrapper');
 
             if (backdrops.length === 0) {
@@ -56,37 +56,38 @@ document.addEventListener('DOMContentLoaded', function () {
                         return response.json();
                     })
                     .then(posterData => {
-                        backdrops = posterData.images;
+                        backdrops = posterData.urls;
                         if (backdrops.length === 0) {
                             console.warn('No posters found to use as backdrops.');
                             return; // optionally show a default
                         }
                         // Use posters as backdrops
-                        populateSwiper(backdrops, movieFolder, 'poster');
+                        populateSwiper(backdrops, 'poster');
                         initializeSwiper();
                     });
             }
 
             // Otherwise, populate with actual backdrops
             swiperWrapper.innerHTML = '';
-            populateSwiper(backdrops, movieFolder, 'backdrop');
+            populateSwiper(backdrops, 'backdrop');
             initializeSwiper();
         })
         .catch(error => {
             console.error('Error fetching backdrop images:', error);
         });
 
-    function populateSwiper(images, folderName, type) {
+    // urls are the versioned image URLs of the listing routes
+    function populateSwiper(urls, type) {
         const swiperWrapper = document.querySelector('.swiper-wrapper');
         if (!swiperWrapper) {
             console.error('Swiper wrapper not found.');
             return;
         }
-        images.forEach(image => {
+        urls.forEach(url => {
             const slide = document.createElement('div');
             slide.className = 'swiper-slide';
             const img = document.createElement('img');
-            img.src = `/movie_images/${encodeURIComponent(folderName)}/${type}/${encodeURIComponent(image)}`;
+            img.src = `${url}${url.includes('?') ? '&' : '?'}w=1280`;
             img.alt = `${type.charAt(0).toUpperCase() + type.slice(1)} Image`;
             slide.appendChild(img);
             swiperWrapper.appendChild(slide);
@@ -0,0 +1,83 @@
+"""
+SRT to WebVTT conversion for the movie player, cached on local disk.
+
+The converter streams line by line and only touches the cue timing lines
+("00:01:02,500 --> 00:01:04,000" becomes "00:01:02.500 --> 00:01:04.000"), so
+commas in the dialogue survive and memory use doesn't depend on the file size.
+SRT files come as UTF-8 or, older ones, as Windows-1252; the output is UTF-8.
+
+A converted file is stored under a hash of the source path, mtime and size.
+An edited or replaced .srt therefore gets a new cache file, and the old one is
+never served again.
+"""
+import hashlib
+import os
+import re
+import threading
+
+SOURCE_ENCODINGS = ('utf-8-sig', 'cp1252', 'latin-1')  # Tried in this order; latin-1 decodes anything
+
+_TIMING_LINE = re.compile(
+    r"^\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})(.*)$")
+
+
+def _timestamp(hours, minutes, seconds, millis):
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}.{millis.ljust(3, '0')}"
+
+
+def srt_to_vtt(lines):
+    """Convert an iterable of SRT lines into WebVTT lines (with line endings)."""
+    yield "WEBVTT\n\n"
+    for line in lines:
+        line = line.rstrip('\r\n')
+        match = _TIMING_LINE.match(line)
+        if match:
+            groups = match.groups()
+            # Cue settings after the end time (rare in SRT) are kept as they are
+            line = f"{_timestamp(*groups[0:4])} --> {_timestamp(*groups[4:8])}{groups[8]}"
+        yield line + "\n"
+
+
+class SubtitleCache:
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.conversions = 0
+
+    def cache_path(self, source_path):
+        stat = os.stat(source_path)
+        key = hashlib.sha1(f"{os.path.abspath(source_path)}|{stat.st_mtime_ns}|{stat.st_size}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.vtt")
+
+    def vtt_path(self, source_path):
+        """Path of the cached WebVTT version of an .srt file, converting it on first use."""
+        path = self.cache_path(source_path)
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+            return path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            for encoding in SOURCE_ENCODINGS:
+                try:
+                    with open(source_path, 'r', encoding=encoding, newline='') as srt_file, \
+                            open(tmp_path, 'w', encoding='utf-8', newline='\n') as vtt_file:
+                        vtt_file.writelines(srt_to_vtt(srt_file))
+                    break
+                except UnicodeDecodeError:
+                    continue  # Start over with the next encoding
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self.conversions += 1
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'conversions': self.conversions}
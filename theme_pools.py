@@ -0,0 +1,130 @@
+"""
+Precomputed movie pools for the featured carousels of /catalog.
+
+The `sql_condition` strings of `vars.themes` are compiled once into structured
+predicates (genre, country, director, year range, rating, awards), which are
+rendered as parameterized semi-joins on `movies`. The index keeps the
+qualifying movie_ids of every theme, so a carousel is a random sample of a
+pool instead of an ORDER BY RAND() over all matching movies.
+"""
+import logging
+import re
+
+from memory_index import MemoryIndex
+from vars import IS_PRIVATE
+
+FEATURED_MIN_RATING = 6.7  # Only well-rated movies are featured
+
+# One pattern per kind of condition used in vars.themes
+_PREDICATE_PATTERNS = (
+    ('genre', re.compile(r"^\w+\.genre\s*=\s*'([^']*)'$", re.I)),
+    ('country', re.compile(r"^\w+\.country\s*=\s*'([^']*)'$", re.I)),
+    ('director', re.compile(r"^\w+\.name\s*=\s*'([^']*)'$", re.I)),
+    ('year_between', re.compile(r"^m\.release_date\s+BETWEEN\s+(\d+)\s+AND\s+(\d+)$", re.I)),
+    ('year_before', re.compile(r"^m\.release_date\s*<\s*(\d+)$", re.I)),
+    ('min_rating', re.compile(r"^m\.rating\s*>\s*([\d.]+)$", re.I)),
+    ('awards_like', re.compile(r"^m\.wiki_awards\s+LIKE\s+'([^']*)'$", re.I)),
+)
+_DIRECTOR_JOB = re.compile(r"^\w+\.job\s*=\s*'Director'$", re.I)
+
+_PREDICATE_SQL = {
+    'genre': "m.movie_id IN (SELECT movie_id FROM genres WHERE genre = %s)",
+    'country': "m.movie_id IN (SELECT movie_id FROM countries WHERE country = %s)",
+    'director': "m.movie_id IN (SELECT movie_id FROM crew WHERE job = 'Director' AND name = %s)",
+    'year_between': "m.release_date BETWEEN %s AND %s",
+    'year_before': "m.release_date < %s",
+    'min_rating': "m.rating > %s",
+    'awards_like': "m.wiki_awards LIKE %s",
+}
+
+
+def _split_conditions(where_part):
+    """Split a WHERE expression into its AND-ed conditions, keeping BETWEEN x AND y together."""
+    conditions = []
+    parts = re.split(r"\s+AND\s+", where_part.strip(), flags=re.I)
+    while parts:
+        part = parts.pop(0)
+        if re.search(r"\bBETWEEN\s+\S+$", part, re.I) and parts:
+            part = f"{part} AND {parts.pop(0)}"
+        conditions.append(part.strip())
+    return conditions
+
+
+def compile_theme(theme):
+    """
+    Compile a theme's sql_condition into [(kind, values)] predicates.
+    Raises ValueError for conditions outside the known shapes.
+    """
+    condition = theme['sql_condition']
+    match = re.search(r"\bWHERE\b(.*)$", condition, re.I | re.S)
+    if not match:
+        raise ValueError(f"Theme '{theme['name']}' has no WHERE condition")
+
+    predicates = []
+    for part in _split_conditions(match.group(1)):
+        if _DIRECTOR_JOB.match(part):
+            continue
+        for kind, pattern in _PREDICATE_PATTERNS:
+            part_match = pattern.match(part)
+            if part_match:
+                predicates.append((kind, part_match.groups()))
+                break
+        else:
+            raise ValueError(f"Theme '{theme['name']}': unsupported condition '{part}'")
+    return predicates
+
+
+def _featured_conditions():
+    """The rules every featured movie has to meet, whatever the theme."""
+    conditions = ["m.rating > %s"]
+    if IS_PRIVATE:
+        conditions.append("m.standort IN ('extern', 'local')")
+    return conditions, [FEATURED_MIN_RATING]
+
+
+def predicates_to_sql(predicates):
+    """Render compiled predicates plus the featured rules as (where_clause, params)."""
+    conditions, params = _featured_conditions()
+    for kind, values in predicates:
+        conditions.append(_PREDICATE_SQL[kind])
+        params.extend(values)
+    return " AND ".join(conditions), params
+
+
+class ThemePoolIndex(MemoryIndex):
+    """Theme name -> list of the movie_ids that qualify for its carousel."""
+    name = 'Theme pools'
+
+    def __init__(self, themes):
+        super().__init__()
+        self.themes = themes
+        self.queries = {theme['name']: self._pool_query(theme) for theme in themes}
+
+    @staticmethod
+    def _pool_query(theme):
+        """Compile a theme into its (pool query, params)."""
+        try:
+            where_clause, params = predicates_to_sql(compile_theme(theme))
+            return f"SELECT m.movie_id FROM movies m WHERE {where_clause}", params
+        except ValueError as e:
+            # Unknown shape: run the raw condition, as the carousel query used to
+            logging.warning(f"{e}, using its raw SQL")
+            conditions, params = _featured_conditions()
+            raw_condition = theme['sql_condition'].replace('%', '%%')
+            keyword = 'AND' if re.search(r'\bWHERE\b', raw_condition, re.I) else 'WHERE'
+            return f"SELECT DISTINCT m.movie_id FROM movies m {raw_condition} {keyword} {' AND '.join(conditions)}", params
+
+    def load(self, connection):
+        pools = {}
+        cursor = connection.cursor(dictionary=True)
+        try:
+            for name, (query, params) in self.queries.items():
+                cursor.execute(query, tuple(params))
+                pools[name] = [row['movie_id'] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+        return pools
+
+    def pool(self, theme):
+        """The movie_ids of a theme's pool, or None if the theme is unknown to the index."""
+        return self._state.get(theme['name'])
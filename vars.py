@@ -4,6 +4,13 @@ db_name ="formatdb"  # Your MySQL database name
 
 IS_PRIVATE = False
 
+# Drives with the movie folders, searched in this order
+MOVIES_BASE_DIRS = [
+    r"E:\Movies\Katalog",
+    r"F:\Katalog",
+    r"e:\Format_FV\_Movies\_Movies_Fertig",
+]
+
 
 themes = [
     # Genre-based themes